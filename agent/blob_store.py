@@ -0,0 +1,45 @@
+import os
+import re
+from pathlib import Path
+from typing import Iterator
+
+SHA256_HEX = re.compile(r"^[0-9a-f]{64}$")
+
+
+class BlobStore:
+    """Content-addressed file storage: <root>/<first two hex digits>/<sha256>.
+
+    Blobs are immutable once stored. Reference counting lives in the
+    shared file catalog, which decides when a blob can go.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256
+
+    def contains(self, sha256: str) -> bool:
+        return self.path(sha256).is_file()
+
+    def put(self, source: Path, sha256: str) -> Path:
+        """Move an already-hashed file into the store (same filesystem, so a rename)."""
+        target = self.path(sha256)
+        target.parent.mkdir(exist_ok=True)
+        os.replace(source, target)
+        return target
+
+    def delete(self, sha256: str):
+        try:
+            self.path(sha256).unlink()
+        except FileNotFoundError:
+            pass
+
+    def __iter__(self) -> Iterator[str]:
+        for prefix in self.root.iterdir():
+            if not prefix.is_dir():
+                continue
+            for blob in prefix.iterdir():
+                if SHA256_HEX.match(blob.name):
+                    yield blob.name
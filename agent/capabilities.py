@@ -0,0 +1,100 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+AVAILABLE = "available"
+UNAVAILABLE = "unavailable"
+UNKNOWN = "unknown"
+
+
+class SensorSource:
+    """One way of reading temperatures, with what we've learned about it on this host."""
+
+    def __init__(self, name: str, probe: Callable[[], Awaitable[Dict[str, dict]]]):
+        self.name = name
+        self.probe = probe
+        self.state = UNKNOWN
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self.last_probe_at: Optional[float] = None
+        self.next_probe_at = 0.0
+        self.skipped = 0
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "state": self.state,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "last_probe_at": self.last_probe_at,
+            "next_probe_in": round(max(0.0, self.next_probe_at - time.monotonic()), 1) if self.state == UNAVAILABLE else None,
+            "skipped": self.skipped,
+        }
+
+
+class SensorCapabilities:
+    """Remember which temperature sources work on this host.
+
+    A source that fails or returns no sensors is marked unavailable and
+    skipped until its re-probe time, which backs off exponentially from
+    min_backoff to max_backoff. A source that works is used on every call.
+    """
+
+    def __init__(self, min_backoff: float = 60.0, max_backoff: float = 3600.0):
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.sources: Dict[str, SensorSource] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    def add(self, name: str, probe: Callable[[], Awaitable[Dict[str, dict]]]):
+        self.sources[name] = SensorSource(name, probe)
+
+    async def read(self, name: str) -> Dict[str, dict]:
+        """Read a source, or return nothing if it is known to be absent."""
+        source = self.sources[name]
+        if source.state == UNAVAILABLE and time.monotonic() < source.next_probe_at:
+            source.skipped += 1
+            return {}
+
+        # The startup probe may already be running this source
+        task = self._inflight.get(name)
+        if task is None:
+            task = asyncio.ensure_future(self._probe(source))
+            self._inflight[name] = task
+        return await asyncio.shield(task)
+
+    async def _probe(self, source: SensorSource) -> Dict[str, dict]:
+        try:
+            temperatures = await source.probe()
+            error = None if temperatures else "no sensors reported"
+        except Exception as e:
+            temperatures = {}
+            error = f"{type(e).__name__}: {e}"
+        finally:
+            del self._inflight[source.name]
+
+        source.last_probe_at = time.time()
+        if error is None:
+            source.state = AVAILABLE
+            source.failures = 0
+            source.last_error = None
+        else:
+            source.state = UNAVAILABLE
+            source.last_error = error
+            backoff = min(self.max_backoff, self.min_backoff * (2 ** source.failures))
+            source.failures += 1
+            source.next_probe_at = time.monotonic() + backoff
+        return temperatures
+
+    async def probe_all(self):
+        """Probe every source once, used at startup."""
+        await asyncio.gather(*(self.read(name) for name in self.sources))
+
+    def available(self) -> List[str]:
+        return [source.name for source in self.sources.values() if source.state == AVAILABLE]
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "available": self.available(),
+            "sources": [source.info() for source in self.sources.values()],
+        }
@@ -0,0 +1,198 @@
+import asyncio
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # Optional, gzip is always available
+    zstandard = None
+
+GZIP = "gzip"
+ZSTD = "zstd"
+
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 6))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", 3))
+
+# Not worth compressing below this size
+MIN_SIZE = 4096
+SAMPLE_SIZE = 64 * 1024
+# Raw/compressed ratio the samples must reach for compression to pay off
+MIN_RATIO = 1.2
+
+# Formats that are already compressed; compressing them again only costs CPU
+COMPRESSED_EXTENSIONS = {
+    ".7z", ".aac", ".apk", ".avi", ".br", ".bz2", ".cab", ".deb", ".dmg", ".docx", ".flac", ".gif",
+    ".gz", ".heic", ".jar", ".jpeg", ".jpg", ".lz4", ".lzma", ".m4a", ".mkv", ".mov", ".mp3", ".mp4",
+    ".msi", ".ogg", ".png", ".pptx", ".rar", ".rpm", ".tgz", ".txz", ".webm", ".webp", ".whl",
+    ".woff2", ".xlsx", ".xz", ".zip", ".zst",
+}
+
+
+def content_encodings() -> List[str]:
+    """Content codings this agent can produce and accept, most preferred first."""
+    return [ZSTD, GZIP] if zstandard is not None else [GZIP]
+
+
+def negotiate_content_encoding(accept_encoding: Optional[str], offered: Optional[List[str]] = None) -> Optional[str]:
+    """Pick a coding from an Accept-Encoding header, preferring ours on ties. None means identity."""
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding.strip().lower()] = q
+    best, best_q = None, 0.0
+    for coding in offered or content_encodings():
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def choose_encoding(offered: Optional[List[str]]) -> Optional[str]:
+    """Our most preferred coding among those a peer accepts, None if there is none."""
+    for coding in content_encodings():
+        if coding in (offered or []):
+            return coding
+    return None
+
+
+_verdicts: "OrderedDict[Tuple[str, int, int], bool]" = OrderedDict()
+# Called from executor threads; the samples are read outside the lock
+_verdicts_lock = threading.Lock()
+
+
+def is_compressible(path: str, name: Optional[str] = None, max_cached: int = 4096) -> bool:
+    """Whether compressing a file is likely to pay off.
+
+    Skips small files and known compressed formats (by the extension of
+    `name`, defaulting to the path), then compresses up to three
+    SAMPLE_SIZE samples (start, middle, end) with fast zlib and checks the
+    ratio. Verdicts are cached per path, size and mtime.
+    """
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    with _verdicts_lock:
+        cached = _verdicts.get(key)
+        if cached is not None:
+            _verdicts.move_to_end(key)
+            return cached
+
+    size = stat.st_size
+    if size < MIN_SIZE or os.path.splitext(name or path)[1].lower() in COMPRESSED_EXTENSIONS:
+        verdict = False
+    else:
+        raw = compressed = 0
+        with open(path, "rb") as f:
+            for offset in sorted({0, max(0, size // 2 - SAMPLE_SIZE // 2), max(0, size - SAMPLE_SIZE)}):
+                f.seek(offset)
+                sample = f.read(SAMPLE_SIZE)
+                raw += len(sample)
+                compressed += len(zlib.compress(sample, 1))
+        verdict = raw / max(compressed, 1) >= MIN_RATIO
+
+    with _verdicts_lock:
+        _verdicts[key] = verdict
+        while len(_verdicts) > max_cached:
+            _verdicts.popitem(last=False)
+    return verdict
+
+
+def compressor(encoding: str):
+    """A streaming compressor with compress(data) and flush()."""
+    if encoding == GZIP:
+        return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    if encoding == ZSTD and zstandard is not None:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+class _GzipDecompressor:
+    """zlib decompressor handing out at most max_length bytes at a time."""
+
+    def __init__(self, max_length: int):
+        self._decompressor = zlib.decompressobj(31)
+        self.max_length = max_length
+
+    def decompress(self, data: bytes):
+        output = self._decompressor.decompress(data, self.max_length)
+        while output:
+            yield output
+            output = self._decompressor.decompress(self._decompressor.unconsumed_tail, self.max_length)
+
+    def flush(self) -> bytes:
+        return self._decompressor.flush()
+
+
+class _ZstdDecompressor:
+    """Same interface as _GzipDecompressor.
+
+    zstandard's decompressobj has no output limit, so input is fed in small
+    slices to bound what one call can expand to.
+    """
+
+    INPUT_SLICE = 1024
+
+    def __init__(self):
+        self._decompressor = zstandard.ZstdDecompressor().decompressobj()
+
+    def decompress(self, data: bytes):
+        view = memoryview(data)
+        for start in range(0, len(view), self.INPUT_SLICE):
+            output = self._decompressor.decompress(view[start:start + self.INPUT_SLICE])
+            if output:
+                yield output
+
+    def flush(self) -> bytes:
+        return b""
+
+
+def compress_bytes(data: bytes, encoding: str) -> bytes:
+    c = compressor(encoding)
+    return c.compress(data) + c.flush()
+
+
+async def compress_stream(chunks: AsyncIterator[bytes], encoding: str) -> AsyncIterator[bytes]:
+    """Compress a byte stream chunk by chunk in the default executor (zlib and zstd release the GIL)."""
+    loop = asyncio.get_running_loop()
+    c = compressor(encoding)
+    async for chunk in chunks:
+        data = await loop.run_in_executor(None, c.compress, chunk)
+        if data:
+            yield data
+    data = c.flush()
+    if data:
+        yield data
+
+
+async def decompress_stream(chunks: AsyncIterator[bytes], encoding: str,
+                            max_length: int = 1024 * 1024) -> AsyncIterator[bytes]:
+    """Decompress a request body as it arrives; corrupt input raises ValueError."""
+    if encoding == GZIP:
+        d = _GzipDecompressor(max_length)
+        errors = (zlib.error,)
+    elif encoding == ZSTD and zstandard is not None:
+        d = _ZstdDecompressor()
+        errors = (zstandard.ZstdError,)
+    else:
+        raise ValueError(f"Unsupported encoding: {encoding}")
+    try:
+        async for chunk in chunks:
+            for data in d.decompress(chunk):
+                yield data
+        data = d.flush()
+        if data:
+            yield data
+    except errors as e:
+        raise ValueError(f"Corrupt {encoding} body: {e}")
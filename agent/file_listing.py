@@ -0,0 +1,88 @@
+import fnmatch
+import json
+import os
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+SORT_KEYS = {
+    "name": lambda item: item["name"].lower(),
+    "size": lambda item: item["size"],
+    "modified": lambda item: item["modified"],
+    "type": lambda item: (item["type"], item["name"].lower()),
+}
+
+
+def entry_info(entry: os.DirEntry) -> Dict[str, Any]:
+    """Describe a directory entry using the data scandir already fetched.
+
+    is_dir() comes from the directory read itself (d_type on Linux,
+    FindNextFile on Windows); stat() is free on Windows and one call on Linux.
+    """
+    is_dir = entry.is_dir()
+    stat = entry.stat()
+    return {
+        "name": entry.name,
+        "path": entry.path,
+        "is_directory": is_dir,
+        "size": stat.st_size if not is_dir else 0,
+        "modified": stat.st_mtime,
+        "type": "folder" if is_dir else os.path.splitext(entry.name)[1].lower()
+    }
+
+
+def iter_directory(path: str) -> Iterator[Dict[str, Any]]:
+    """Iterate entries in directory order, skipping ones we can't access.
+
+    The directory is opened right away so PermissionError and friends are
+    raised here rather than from the middle of a streamed response.
+    """
+    return _iter_entries(os.scandir(path))
+
+
+def _iter_entries(entries) -> Iterator[Dict[str, Any]]:
+    with entries:
+        for entry in entries:
+            try:
+                yield entry_info(entry)
+            except (PermissionError, OSError):
+                # Skip files we can't access
+                continue
+
+
+def matches_filter(name: str, pattern: Optional[str]) -> bool:
+    """Glob match when the pattern has wildcards, case-insensitive substring otherwise."""
+    if not pattern:
+        return True
+    if any(char in pattern for char in "*?["):
+        return fnmatch.fnmatch(name.lower(), pattern.lower())
+    return pattern.lower() in name.lower()
+
+
+def sort_items(items: List[Dict[str, Any]], sort: str = "name", order: str = "asc") -> List[Dict[str, Any]]:
+    """Sort with directories first, like the file browser shows them."""
+    if sort == "none":
+        return items
+    key = SORT_KEYS[sort]
+    items = sorted(items, key=key, reverse=(order == "desc"))
+    # Stable, so the order within directories and files is kept
+    return sorted(items, key=lambda item: not item["is_directory"])
+
+
+def paginate(items: List[Dict[str, Any]], cursor: Optional[str], limit: Optional[int]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Return one page and the cursor of the next one (None on the last page)."""
+    offset = int(cursor) if cursor else 0
+    if limit is None:
+        return items[offset:], None
+    end = offset + limit
+    return items[offset:end], (str(end) if end < len(items) else None)
+
+
+def stream_ndjson(items: Iterator[Dict[str, Any]], batch_size: int = 500) -> Iterator[str]:
+    """Serialize entries as NDJSON, several lines per chunk to keep writes large."""
+    lines = []
+    for item in items:
+        lines.append(json.dumps(item))
+        if len(lines) >= batch_size:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
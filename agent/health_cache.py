@@ -0,0 +1,89 @@
+import asyncio
+import os
+import platform
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+def physical_disk(device: str) -> str:
+    """Map a partition device to the physical disk it lives on.
+
+    /dev/sda1 -> /dev/sda, /dev/nvme0n1p2 -> /dev/nvme0n1, /dev/disk1s1 ->
+    /dev/disk1. Windows drive letters can't be mapped without a WMI query,
+    so they are returned unchanged.
+    """
+    system = platform.system()
+    if system == "Linux" and device.startswith("/dev/"):
+        name = os.path.basename(os.path.realpath(device))
+        sys_path = os.path.realpath(f"/sys/class/block/{name}")
+        if os.path.exists(os.path.join(sys_path, "partition")):
+            return f"/dev/{os.path.basename(os.path.dirname(sys_path))}"
+        return f"/dev/{name}" if os.path.exists(sys_path) else device
+    if system == "Darwin":
+        match = re.match(r"^(/dev/disk\d+)s\d+", device)
+        if match:
+            return match.group(1)
+    return device
+
+
+class DriveHealthCache:
+    """TTL cache of drive health results keyed by physical disk.
+
+    Partitions on the same disk share one entry, and concurrent callers for
+    the same disk await a single in-flight probe instead of each spawning
+    their own smartctl/PowerShell process.
+    """
+
+    def __init__(self, probe: Callable[[str], Awaitable[dict]], ttl: float = 300.0):
+        self.probe = probe
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[float, dict]] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get(self, device: str) -> dict:
+        key = physical_disk(device)
+        entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._load(key))
+            self._inflight[key] = task
+        else:
+            self.coalesced += 1
+        # Shielded so one cancelled caller doesn't abort the probe for the others
+        return await asyncio.shield(task)
+
+    async def _load(self, key: str) -> dict:
+        try:
+            # Probe the physical disk so all its partitions share the answer.
+            # Windows keeps the drive letter, which is what its probes expect.
+            value = await self.probe(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            return value
+        finally:
+            del self._inflight[key]
+
+    def invalidate(self, device: Optional[str] = None):
+        if device is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(physical_disk(device), None)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
@@ -0,0 +1,111 @@
+import math
+import time
+from array import array
+from typing import Dict, List, Optional
+
+
+class RingBuffer:
+    """Fixed-capacity (timestamp, value) series backed by two float64 arrays.
+
+    Memory is allocated once up front (16 bytes per slot) and old samples are
+    overwritten in place, so the agent's history never grows.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.timestamps = array('d', bytes(8 * capacity))
+        self.values = array('d', bytes(8 * capacity))
+        self.start = 0
+        self.count = 0
+
+    def append(self, timestamp: float, value: float):
+        if self.count and timestamp < self.timestamps[(self.start + self.count - 1) % self.capacity]:
+            return  # Keep timestamps sorted so lookups can bisect
+        if self.count < self.capacity:
+            index = (self.start + self.count) % self.capacity
+            self.count += 1
+        else:
+            index = self.start
+            self.start = (self.start + 1) % self.capacity
+        self.timestamps[index] = timestamp
+        self.values[index] = value
+
+    def _bisect(self, timestamp: float) -> int:
+        """Logical index of the first sample at or after timestamp."""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.timestamps[(self.start + middle) % self.capacity] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def since(self, timestamp: float):
+        """Yield (timestamp, value) pairs at or after timestamp, oldest first."""
+        for i in range(self._bisect(timestamp), self.count):
+            index = (self.start + i) % self.capacity
+            yield self.timestamps[index], self.values[index]
+
+    def nbytes(self) -> int:
+        return (self.timestamps.itemsize + self.values.itemsize) * self.capacity
+
+
+class MetricHistory:
+    """High-resolution history of every numeric metric the agent collects.
+
+    Each metric gets a ring buffer sized to hold `seconds` of samples at the
+    interval it is collected at, and the number of metrics is capped, so
+    the total footprint is known up front.
+    """
+
+    def __init__(self, seconds: float = 3600, max_metrics: int = 64):
+        self.seconds = seconds
+        self.max_metrics = max_metrics
+        self.buffers: Dict[str, RingBuffer] = {}
+        self.dropped_metrics = 0
+
+    def record(self, metrics: Dict[str, float], interval: float, timestamp: Optional[float] = None):
+        timestamp = time.time() if timestamp is None else timestamp
+        for name, value in metrics.items():
+            buffer = self.buffers.get(name)
+            if buffer is None:
+                if len(self.buffers) >= self.max_metrics:
+                    self.dropped_metrics += 1
+                    continue
+                buffer = RingBuffer(max(1, math.ceil(self.seconds / max(interval, 0.001))))
+                self.buffers[name] = buffer
+            buffer.append(timestamp, float(value))
+
+    def query(self, metric: str, since: float, step: float = 0) -> List[List[float]]:
+        """Samples since a timestamp, or [bucket_start, avg, min, max] per step-second bucket."""
+        samples = self.buffers[metric].since(since)
+        if step <= 0:
+            return [[timestamp, value] for timestamp, value in samples]
+
+        points = []
+        bucket = None
+        total = low = high = 0.0
+        count = 0
+        for timestamp, value in samples:
+            start = math.floor(timestamp / step) * step
+            if start != bucket:
+                if count:
+                    points.append([bucket, total / count, low, high])
+                bucket, total, low, high, count = start, 0.0, value, value, 0
+            total += value
+            low = min(low, value)
+            high = max(high, value)
+            count += 1
+        if count:
+            points.append([bucket, total / count, low, high])
+        return points
+
+    def info(self) -> Dict[str, object]:
+        return {
+            "seconds": self.seconds,
+            "max_metrics": self.max_metrics,
+            "dropped_metrics": self.dropped_metrics,
+            "memory_bytes": sum(buffer.nbytes() for buffer in self.buffers.values()),
+            "metrics": {name: buffer.count for name, buffer in sorted(self.buffers.items())},
+        }
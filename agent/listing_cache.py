@@ -0,0 +1,256 @@
+import ctypes
+import ctypes.util
+import errno
+import itertools
+import os
+import platform
+import struct
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from file_listing import iter_directory, sort_items
+
+# Directory timestamps can be this coarse (FAT); a listing scanned within
+# this window of the directory's mtime can't be trusted on mtime alone.
+RACY_WINDOW = 2.0
+
+
+class InotifyWatcher:
+    """Minimal non-blocking inotify wrapper (Linux only) built on ctypes.
+
+    Watches only directories the cache holds. Events are drained with a
+    non-blocking read on each lookup, so no background thread is needed.
+    """
+
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    MASK = (IN_MODIFY | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE |
+            IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+    EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._paths: Dict[int, str] = {}
+        self._watches: Dict[str, int] = {}
+
+    @classmethod
+    def create(cls) -> Optional["InotifyWatcher"]:
+        if platform.system() != "Linux":
+            return None
+        try:
+            return cls()
+        except (OSError, AttributeError):
+            return None
+
+    def add(self, path: str) -> bool:
+        """Watch a directory; False when out of watches (mtime checks still apply)."""
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), self.MASK)
+        if wd < 0:
+            return False
+        self._paths[wd] = path
+        self._watches[path] = wd
+        return True
+
+    def remove(self, path: str):
+        wd = self._watches.pop(path, None)
+        if wd is not None:
+            self._paths.pop(wd, None)
+            self._libc.inotify_rm_watch(self.fd, wd)
+
+    def watching(self, path: str) -> bool:
+        return path in self._watches
+
+    def poll(self) -> Tuple[Set[str], bool]:
+        """Return (changed directories, overflowed) for all pending events."""
+        changed: Set[str] = set()
+        overflow = False
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            offset = 0
+            while offset < len(data):
+                wd, mask, _cookie, length = self.EVENT_HEADER.unpack_from(data, offset)
+                offset += self.EVENT_HEADER.size + length
+                if mask & self.IN_Q_OVERFLOW:
+                    overflow = True
+                path = self._paths.get(wd)
+                if path is not None:
+                    changed.add(path)
+                    if mask & self.IN_IGNORED:
+                        # The kernel dropped the watch (directory deleted or unmounted)
+                        self._paths.pop(wd, None)
+                        self._watches.pop(path, None)
+        return changed, overflow
+
+
+class CachedListing:
+    """One scanned directory plus the sorted views requested so far."""
+
+    _generations = itertools.count(1)
+    # Makes ETags from a previous agent process never match
+    _instance = uuid.uuid4().hex[:8]
+
+    def __init__(self, path: str, items: List[Dict[str, Any]], signature: Tuple[int, int, int], scanned_at: float):
+        self.path = path
+        self.items = items
+        self.signature = signature
+        self.racy = scanned_at - signature[0] / 1e9 < RACY_WINDOW
+        self.etag = f'"{self._instance}-{next(self._generations)}"'
+        self._sorted: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+
+    def sorted(self, sort: str, order: str) -> List[Dict[str, Any]]:
+        key = (sort, order)
+        if key not in self._sorted:
+            self._sorted[key] = sort_items(self.items, sort, order)
+        return self._sorted[key]
+
+
+def directory_signature(path: str) -> Tuple[int, int, int]:
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_ino, stat.st_dev
+
+
+class DirectoryListingCache:
+    """LRU cache of directory listings bounded by the total number of entries.
+
+    A listing is reused while the directory is unchanged: on Linux an
+    inotify watch reports any change to the directory or its entries
+    (including file sizes and mtimes); elsewhere, or when out of watches,
+    the directory's mtime/inode is compared, which catches added, removed
+    and renamed entries.
+    """
+
+    def __init__(self, max_entries: int = 200000, use_inotify: bool = True):
+        self.max_entries = max_entries
+        self.watcher = InotifyWatcher.create() if use_inotify else None
+        self._listings: "OrderedDict[str, CachedListing]" = OrderedDict()
+        self._total_entries = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _drain_events(self):
+        if self.watcher is None:
+            return
+        changed, overflow = self.watcher.poll()
+        if overflow:
+            for path in list(self._listings):
+                self._drop(path)
+        for path in changed:
+            self._drop(path)
+
+    def _drop(self, path: str):
+        listing = self._listings.pop(path, None)
+        if listing is not None:
+            self._total_entries -= len(listing.items)
+        if self.watcher is not None:
+            self.watcher.remove(path)
+
+    def _lookup(self, path: str) -> Optional[CachedListing]:
+        """Return a still-valid cached listing, or None. Caller holds the lock."""
+        self._drain_events()
+        listing = self._listings.get(path)
+        if listing is None:
+            return None
+        watched = self.watcher is not None and self.watcher.watching(path)
+        if listing.racy or (not watched and directory_signature(path) != listing.signature):
+            self._drop(path)
+            return None
+        self._listings.move_to_end(path)
+        return listing
+
+    def get(self, path: str) -> CachedListing:
+        """Return the listing of path, scanning it if the cache can't answer."""
+        path = os.path.abspath(path)
+        with self._lock:
+            listing = self._lookup(path)
+            if listing is not None:
+                self.hits += 1
+                return listing
+            self.misses += 1
+
+        # Scan outside the lock so other directories stay served meanwhile
+        signature = directory_signature(path)
+        scanned_at = time.time()
+        items = list(iter_directory(path))
+        return self.put(path, items, signature, scanned_at)
+
+    def iter_and_store(self, path: str) -> Iterator[Dict[str, Any]]:
+        """Stream a directory's entries while scanning, caching them once complete.
+
+        Uses the cached listing when there is one.
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            listing = self._lookup(path)
+            if listing is not None:
+                self.hits += 1
+                return iter(listing.items)
+            self.misses += 1
+        signature = directory_signature(path)
+        scanned_at = time.time()
+        return self._stream(path, iter_directory(path), signature, scanned_at)
+
+    def _stream(self, path: str, entries: Iterator[Dict[str, Any]], signature: Tuple[int, int, int], scanned_at: float):
+        items = []
+        for item in entries:
+            items.append(item)
+            yield item
+        self.put(path, items, signature, scanned_at)
+
+    def put(self, path: str, items: List[Dict[str, Any]], signature: Tuple[int, int, int], scanned_at: float) -> CachedListing:
+        listing = CachedListing(path, items, signature, scanned_at)
+        if len(items) > self.max_entries:
+            return listing  # Too big to cache at all
+        with self._lock:
+            self._drop(path)
+            if self.watcher is not None and self.watcher.add(path):
+                # Changes between the scan and the watch would be missed
+                if directory_signature(path) != signature:
+                    self.watcher.remove(path)
+                    return listing
+            self._listings[path] = listing
+            self._total_entries += len(items)
+            while self._total_entries > self.max_entries:
+                oldest = next(iter(self._listings))
+                self._drop(oldest)
+                self.evictions += 1
+        return listing
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "directories": len(self._listings),
+                "entries": self._total_entries,
+                "max_entries": self.max_entries,
+                "inotify": self.watcher is not None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            }
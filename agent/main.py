@@ -1,26 +1,47 @@
 import asyncio
+import hashlib
 import json
 import os
 import platform
+import re
 import socket
-import subprocess
 import shutil
+import tarfile
 import time
 import psutil
 import websockets
 import sys
 from pathlib import Path
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, UploadFile, File, Form
+from fastapi import FastAPI, Header, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.concurrency import iterate_in_threadpool
 from pydantic import BaseModel
 from typing import Optional, Dict, Any, List
-import aiofiles
+import httpx
 import uuid
 
 # Add utils directory to path
 sys.path.append(str(Path(__file__).parent.parent / "utils"))
 from network_utils import get_local_ip, find_best_ip_for_network
+from status_delta import DeltaEncoder
+from status_metrics import extract_metrics
+from wire_format import JSON, decode_message, encode_message, supported_encodings
+from sampler import Collector, CollectorScheduler, CHEAP, EXPENSIVE
+from health_cache import DriveHealthCache
+from probes import ProbeExecutor
+from capabilities import SensorCapabilities
+from sysfs_sensors import HwmonReader
+from history import MetricHistory
+from file_listing import SORT_KEYS, matches_filter, paginate, stream_ndjson
+from listing_cache import DirectoryListingCache
+from range_response import RangeFileResponse
+from blob_store import SHA256_HEX
+from compression import ZSTD, choose_encoding, compress_stream, content_encodings, decompress_stream, is_compressible, negotiate_content_encoding
+from shared_catalog import SharedFileCatalog
+from tar_stream import extract_stream, iter_tar, tree_size
+from transfers import Transfer, TransferRegistry, send_directory, send_file, send_file_parallel
+from uploads import CHUNK_SIZE, OffsetMismatch, UploadManager, safe_filename, write_stream
 
 app = FastAPI(title="Server Monitor Agent")
 
@@ -55,6 +76,27 @@ class FileTransferRequest(BaseModel):
     source_path: str
     target_agent_id: str
     target_path: str
+    streams: Optional[int] = None
+    chunk_size: Optional[int] = None
+    compress: Optional[bool] = None
+
+class DirectoryTransferRequest(BaseModel):
+    source_path: str
+    target_agent_id: str
+    target_path: str
+    compress: bool = False
+
+class UploadSessionRequest(BaseModel):
+    filename: str
+    size: Optional[int] = None
+    chunk_size: Optional[int] = None
+
+class UploadCompleteRequest(BaseModel):
+    sha256: Optional[str] = None
+
+class LinkSharedFileRequest(BaseModel):
+    filename: str
+    sha256: str
 
 class FileShareInfo(BaseModel):
     file_id: str
@@ -63,12 +105,39 @@ class FileShareInfo(BaseModel):
     shared_by: str
     created_at: str
 
-def get_temperature_info():
-    """Get comprehensive system temperature information from all available sensors."""
+probe_executor = ProbeExecutor(max_concurrency=int(os.getenv("PROBE_CONCURRENCY", 4)))
+
+def parse_wmi_sensor_list(output: str) -> List[Dict[str, Any]]:
+    """Parse PowerShell `Select-Object Name, Value, ...` list output into sensor dicts."""
+    sensors = []
+    current_sensor = {}
+
+    for line in output.strip().split('\n'):
+        line = line.strip()
+        if line.startswith('Name'):
+            if current_sensor and 'name' in current_sensor and 'value' in current_sensor:
+                sensors.append(current_sensor)
+            current_sensor = {'name': line.split(':', 1)[1].strip() if ':' in line else line}
+        elif line.startswith('Value') and ':' in line:
+            try:
+                current_sensor['value'] = float(line.split(':', 1)[1].strip())
+            except ValueError:
+                pass
+        elif line.startswith('Max') and ':' in line:
+            try:
+                current_sensor['max'] = float(line.split(':', 1)[1].strip())
+            except ValueError:
+                pass
+
+    # Don't forget the last sensor
+    if current_sensor and 'name' in current_sensor and 'value' in current_sensor:
+        sensors.append(current_sensor)
+    return sensors
+
+def read_psutil_temperatures() -> Dict[str, dict]:
+    """Read temperatures through psutil (Linux/some Windows systems)."""
     temperatures = {}
-    
     try:
-        # Try to get temperature from psutil (Linux/some Windows systems)
         if hasattr(psutil, 'sensors_temperatures'):
             temps = psutil.sensors_temperatures()
             if temps:
@@ -82,190 +151,195 @@ def get_temperature_info():
                         }
     except Exception as e:
         print(f"Error getting temperature from psutil: {e}")
-    
-    # Windows-specific comprehensive temperature monitoring
-    if platform.system() == "Windows":
-        # Method 1: Try OpenHardwareMonitor/LibreHardwareMonitor WMI
-        for namespace in ['OpenHardwareMonitor', 'LibreHardwareMonitor']:
-            try:
-                cmd = f'Get-WmiObject -Namespace "root/{namespace}" -Class Sensor | Where-Object {{ $_.SensorType -eq "Temperature" }} | Select-Object Name, Value, Min, Max'
-                result = subprocess.run(['powershell', '-Command', cmd], 
-                                      capture_output=True, text=True, timeout=15)
-                
-                if result.returncode == 0 and result.stdout.strip():
-                    lines = result.stdout.strip().split('\n')
-                    current_sensor = {}
-                    
-                    for line in lines:
-                        line = line.strip()
-                        if line.startswith('Name'):
-                            if current_sensor and 'name' in current_sensor and 'value' in current_sensor:
-                                sensor_name = current_sensor['name'].replace('/', '_').replace(' ', '_')
-                                temperatures[sensor_name] = {
-                                    'current': current_sensor['value'],
-                                    'high': current_sensor.get('max', 85.0),
-                                    'critical': current_sensor.get('max', 95.0) if current_sensor.get('max') else 95.0
-                                }
-                            current_sensor = {'name': line.split(':', 1)[1].strip() if ':' in line else line}
-                        elif line.startswith('Value') and ':' in line:
-                            try:
-                                value = float(line.split(':', 1)[1].strip())
-                                current_sensor['value'] = value
-                            except ValueError:
-                                pass
-                        elif line.startswith('Max') and ':' in line:
-                            try:
-                                max_val = float(line.split(':', 1)[1].strip())
-                                current_sensor['max'] = max_val
-                            except ValueError:
-                                pass
-                    
-                    # Don't forget the last sensor
-                    if current_sensor and 'name' in current_sensor and 'value' in current_sensor:
-                        sensor_name = current_sensor['name'].replace('/', '_').replace(' ', '_')
-                        temperatures[sensor_name] = {
-                            'current': current_sensor['value'],
-                            'high': current_sensor.get('max', 85.0),
-                            'critical': current_sensor.get('max', 95.0) if current_sensor.get('max') else 95.0
+    return temperatures
+
+async def probe_hardware_monitor(namespace: str) -> Dict[str, dict]:
+    """Method 1: OpenHardwareMonitor/LibreHardwareMonitor WMI sensors."""
+    temperatures = {}
+    cmd = f'Get-WmiObject -Namespace "root/{namespace}" -Class Sensor | Where-Object {{ $_.SensorType -eq "Temperature" }} | Select-Object Name, Value, Min, Max'
+    result = await probe_executor.run(['powershell', '-Command', cmd], timeout=15)
+
+    if result.ok and result.stdout.strip():
+        for sensor in parse_wmi_sensor_list(result.stdout):
+            sensor_name = sensor['name'].replace('/', '_').replace(' ', '_')
+            temperatures[sensor_name] = {
+                'current': sensor['value'],
+                'high': sensor.get('max', 85.0),
+                'critical': sensor.get('max', 95.0) if sensor.get('max') else 95.0
+            }
+    return temperatures
+
+async def probe_wmi_thermal_zone() -> Dict[str, dict]:
+    """Method 2: WMI Thermal Zone."""
+    temperatures = {}
+    cmd = 'Get-WmiObject -Namespace "root/wmi" -Class MSAcpi_ThermalZoneTemperature | ForEach-Object { [math]::Round(($_.CurrentTemperature / 10) - 273.15, 1) }'
+    result = await probe_executor.run(['powershell', '-Command', cmd], timeout=10)
+
+    if result.ok and result.stdout.strip():
+        lines = result.stdout.strip().split('\n')
+        for i, line in enumerate(lines):
+            if line.strip():
+                try:
+                    temp_celsius = float(line.strip())
+                    if 0 < temp_celsius < 150:  # Sanity check
+                        temperatures[f'Thermal_Zone_{i}'] = {
+                            'current': temp_celsius,
+                            'high': 80.0,
+                            'critical': 95.0
+                        }
+                except ValueError:
+                    continue
+    return temperatures
+
+async def probe_wmic_thermal_zone() -> Dict[str, dict]:
+    """Method 3: WMIC thermal zone."""
+    temperatures = {}
+    result = await probe_executor.run([
+        'wmic', '/namespace:\\\\root\\wmi', 'PATH', 'MSAcpi_ThermalZoneTemperature',
+        'get', 'CurrentTemperature', '/value'
+    ], timeout=10)
+
+    if result.ok:
+        for line in result.stdout.split('\n'):
+            if 'CurrentTemperature=' in line:
+                temp_raw = line.split('=')[1].strip()
+                if temp_raw.isdigit():
+                    temp_celsius = (int(temp_raw) / 10) - 273.15
+                    if 0 < temp_celsius < 150:
+                        temperatures['CPU_Thermal_Zone'] = {
+                            'current': round(temp_celsius, 1),
+                            'high': 80.0,
+                            'critical': 95.0
                         }
-                    
-                    if temperatures:  # If we found sensors, break
                         break
-                        
-            except Exception as e:
-                continue
-        
-        # Method 2: WMI Thermal Zone (fallback)
-        if not temperatures:
-            try:
-                cmd = 'Get-WmiObject -Namespace "root/wmi" -Class MSAcpi_ThermalZoneTemperature | ForEach-Object { [math]::Round(($_.CurrentTemperature / 10) - 273.15, 1) }'
-                result = subprocess.run(['powershell', '-Command', cmd], 
-                                      capture_output=True, text=True, timeout=10)
-                
-                if result.returncode == 0 and result.stdout.strip():
-                    lines = result.stdout.strip().split('\n')
-                    for i, line in enumerate(lines):
-                        if line.strip():
-                            try:
-                                temp_celsius = float(line.strip())
-                                if 0 < temp_celsius < 150:  # Sanity check
-                                    temperatures[f'Thermal_Zone_{i}'] = {
-                                        'current': temp_celsius,
-                                        'high': 80.0,
-                                        'critical': 95.0
-                                    }
-                            except ValueError:
-                                continue
-            except Exception:
-                pass
-        
-        # Method 3: WMIC fallback
-        if not temperatures:
-            try:
-                result = subprocess.run([
-                    'wmic', '/namespace:\\\\root\\wmi', 'PATH', 'MSAcpi_ThermalZoneTemperature', 
-                    'get', 'CurrentTemperature', '/value'
-                ], capture_output=True, text=True, timeout=10)
-                
-                if result.returncode == 0:
-                    for line in result.stdout.split('\n'):
-                        if 'CurrentTemperature=' in line:
-                            temp_raw = line.split('=')[1].strip()
-                            if temp_raw.isdigit():
-                                temp_celsius = (int(temp_raw) / 10) - 273.15
-                                if 0 < temp_celsius < 150:
-                                    temperatures['CPU_Thermal_Zone'] = {
-                                        'current': round(temp_celsius, 1),
-                                        'high': 80.0,
-                                        'critical': 95.0
-                                    }
-                                    break
-            except Exception:
-                pass
-        
-        # Method 4: GPU temperature (NVIDIA)
-        try:
-            result = subprocess.run([
-                'nvidia-smi', '--query-gpu=temperature.gpu,name,memory.total,memory.used', '--format=csv,noheader,nounits'
-            ], capture_output=True, text=True, timeout=5)
-            
-            if result.returncode == 0 and result.stdout.strip():
-                lines = result.stdout.strip().split('\n')
-                for i, line in enumerate(lines):
-                    parts = line.split(',')
-                    if len(parts) >= 2:
-                        try:
-                            gpu_temp = float(parts[0].strip())
-                            gpu_name = parts[1].strip().replace(' ', '_').replace('NVIDIA_', '')
-                            temperatures[f'GPU_{gpu_name}'] = {
-                                'current': gpu_temp,
-                                'high': 83.0,
-                                'critical': 95.0
-                            }
-                        except ValueError:
-                            pass
-        except Exception:
-            pass
-        
-        # Method 5: AMD GPU temperature via WMI
-        try:
-            cmd = 'Get-WmiObject -Namespace "root/OpenHardwareMonitor" -Class Sensor | Where-Object { $_.SensorType -eq "Temperature" -and $_.Name -like "*GPU*" } | Select-Object Name, Value'
-            result = subprocess.run(['powershell', '-Command', cmd], 
-                                  capture_output=True, text=True, timeout=10)
-            
-            if result.returncode == 0 and result.stdout.strip():
-                lines = result.stdout.strip().split('\n')
-                current_sensor = {}
-                
-                for line in lines:
-                    line = line.strip()
-                    if line.startswith('Name') and ':' in line:
-                        if current_sensor and 'name' in current_sensor and 'value' in current_sensor:
-                            sensor_name = current_sensor['name'].replace('/', '_').replace(' ', '_')
-                            temperatures[sensor_name] = {
-                                'current': current_sensor['value'],
-                                'high': 90.0,
-                                'critical': 105.0
-                            }
-                        current_sensor = {'name': line.split(':', 1)[1].strip()}
-                    elif line.startswith('Value') and ':' in line:
-                        try:
-                            value = float(line.split(':', 1)[1].strip())
-                            current_sensor['value'] = value
-                        except ValueError:
-                            pass
-                
-                # Don't forget the last sensor
-                if current_sensor and 'name' in current_sensor and 'value' in current_sensor:
-                    sensor_name = current_sensor['name'].replace('/', '_').replace(' ', '_')
-                    temperatures[sensor_name] = {
-                        'current': current_sensor['value'],
-                        'high': 90.0,
-                        'critical': 105.0
+    return temperatures
+
+async def probe_nvidia_gpu() -> Dict[str, dict]:
+    """Method 4: GPU temperature (NVIDIA)."""
+    temperatures = {}
+    result = await probe_executor.run([
+        'nvidia-smi', '--query-gpu=temperature.gpu,name,memory.total,memory.used', '--format=csv,noheader,nounits'
+    ], timeout=5)
+
+    if result.ok and result.stdout.strip():
+        lines = result.stdout.strip().split('\n')
+        for i, line in enumerate(lines):
+            parts = line.split(',')
+            if len(parts) >= 2:
+                try:
+                    gpu_temp = float(parts[0].strip())
+                    gpu_name = parts[1].strip().replace(' ', '_').replace('NVIDIA_', '')
+                    temperatures[f'GPU_{gpu_name}'] = {
+                        'current': gpu_temp,
+                        'high': 83.0,
+                        'critical': 95.0
                     }
-        except Exception:
-            pass
-        
-        # Method 6: Disk temperatures from all drives
-        try:
-            for partition in psutil.disk_partitions():
-                if os.path.exists(partition.mountpoint):
-                    health = get_drive_health(partition.device)
-                    if health.get('temperature') is not None:
-                        drive_name = partition.device.replace('\\', '').replace(':', '')
-                        temperatures[f'Drive_{drive_name}'] = {
-                            'current': float(health['temperature']),
-                            'high': 50.0,  # Typical HDD warning temp
-                            'critical': 60.0  # Typical HDD critical temp
-                        }
-        except Exception:
-            pass
-    
+                except ValueError:
+                    pass
+    return temperatures
+
+async def probe_amd_gpu() -> Dict[str, dict]:
+    """Method 5: AMD GPU temperature via WMI."""
+    temperatures = {}
+    cmd = 'Get-WmiObject -Namespace "root/OpenHardwareMonitor" -Class Sensor | Where-Object { $_.SensorType -eq "Temperature" -and $_.Name -like "*GPU*" } | Select-Object Name, Value'
+    result = await probe_executor.run(['powershell', '-Command', cmd], timeout=10)
+
+    if result.ok and result.stdout.strip():
+        for sensor in parse_wmi_sensor_list(result.stdout):
+            sensor_name = sensor['name'].replace('/', '_').replace(' ', '_')
+            temperatures[sensor_name] = {
+                'current': sensor['value'],
+                'high': 90.0,
+                'critical': 105.0
+            }
+    return temperatures
+
+async def probe_drive_temperatures() -> Dict[str, dict]:
+    """Method 6: Disk temperatures from all drives."""
+    temperatures = {}
+    partitions = [p for p in psutil.disk_partitions() if os.path.exists(p.mountpoint)]
+    healths = await asyncio.gather(*(get_drive_health(p.device) for p in partitions))
+    for partition, health in zip(partitions, healths):
+        if health.get('temperature') is not None:
+            drive_name = partition.device.replace('\\', '').replace(':', '')
+            temperatures[f'Drive_{drive_name}'] = {
+                'current': float(health['temperature']),
+                'high': 50.0,  # Typical HDD warning temp
+                'critical': 60.0  # Typical HDD critical temp
+            }
+    return temperatures
+
+async def probe_psutil_temperatures() -> Dict[str, dict]:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, read_psutil_temperatures)
+
+# On Linux read hwmon directly with file descriptors kept open, same sensors as psutil
+hwmon_reader = HwmonReader() if platform.system() == "Linux" else None
+
+async def probe_sysfs_temperatures() -> Dict[str, dict]:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, hwmon_reader.read)
+
+PRIMARY_TEMPERATURE_SOURCE = "sysfs" if hwmon_reader else "psutil"
+
+# Windows sources in the order get_temperature_info() merges them
+WINDOWS_TEMPERATURE_SOURCES = [
+    "open_hardware_monitor",
+    "libre_hardware_monitor",
+    "wmi_thermal_zone",
+    "wmic_thermal_zone",
+    "nvidia_gpu",
+    "amd_gpu",
+    "drive_smart",
+]
+
+capabilities = SensorCapabilities(
+    min_backoff=float(os.getenv("SENSOR_REPROBE_MIN", 60)),
+    max_backoff=float(os.getenv("SENSOR_REPROBE_MAX", 3600))
+)
+if hwmon_reader:
+    capabilities.add("sysfs", probe_sysfs_temperatures)
+else:
+    capabilities.add("psutil", probe_psutil_temperatures)
+if platform.system() == "Windows":
+    capabilities.add("open_hardware_monitor", lambda: probe_hardware_monitor('OpenHardwareMonitor'))
+    capabilities.add("libre_hardware_monitor", lambda: probe_hardware_monitor('LibreHardwareMonitor'))
+    capabilities.add("wmi_thermal_zone", probe_wmi_thermal_zone)
+    capabilities.add("wmic_thermal_zone", probe_wmic_thermal_zone)
+    capabilities.add("nvidia_gpu", probe_nvidia_gpu)
+    capabilities.add("amd_gpu", probe_amd_gpu)
+    capabilities.add("drive_smart", probe_drive_temperatures)
+
+async def get_temperature_info(cpu_percent: Optional[float] = None):
+    """Get comprehensive system temperature information from all available sensors.
+
+    Independent probes run concurrently through the probe executor, so the
+    call takes as long as the slowest probe rather than the sum of all of them.
+    Sources known to be absent on this host are skipped until their re-probe time.
+    """
+    temperatures = dict(await capabilities.read(PRIMARY_TEMPERATURE_SOURCE))
+
+    # Windows-specific comprehensive temperature monitoring
+    if platform.system() == "Windows":
+        ohm, lhm, thermal_zone, wmic, nvidia, amd, drives = await asyncio.gather(
+            *(capabilities.read(name) for name in WINDOWS_TEMPERATURE_SOURCES)
+        )
+
+        # Methods 1-3 are fallbacks for each other, first one with sensors wins
+        if not temperatures:
+            temperatures.update(ohm or lhm or thermal_zone or wmic)
+        else:
+            temperatures.update(ohm or lhm)
+        temperatures.update(nvidia)
+        temperatures.update(amd)
+        temperatures.update(drives)
+
     # If still no temperatures found, add a mock sensor for testing
     if not temperatures:
         # Try to get CPU usage as a proxy for temperature estimation
         try:
-            cpu_percent = psutil.cpu_percent(interval=1)
+            if cpu_percent is None:
+                cpu_percent = psutil.cpu_percent(interval=None)
             estimated_temp = 30 + (cpu_percent * 0.5)  # Very rough estimation
             temperatures['CPU_Estimated'] = {
                 'current': round(estimated_temp, 1),
@@ -274,10 +348,10 @@ def get_temperature_info():
             }
         except Exception:
             pass
-    
+
     return temperatures
 
-def get_drive_health(drive_path: str) -> dict:
+async def probe_drive_health(drive_path: str) -> dict:
     """Get drive health information using SMART data."""
     health_info = {
         "status": "unknown",
@@ -286,15 +360,15 @@ def get_drive_health(drive_path: str) -> dict:
         "power_on_hours": None,
         "error_count": None
     }
-    
+
     # Try to get drive temperature using multiple methods
     try:
         # Method 1: Try smartctl if available
-        result = subprocess.run([
+        result = await probe_executor.run([
             'smartctl', '-A', drive_path
-        ], capture_output=True, text=True, timeout=10)
-        
-        if result.returncode == 0:
+        ], timeout=10)
+
+        if result.ok:
             for line in result.stdout.split('\n'):
                 if 'Temperature_Celsius' in line or 'Airflow_Temperature_Cel' in line:
                     parts = line.split()
@@ -308,7 +382,7 @@ def get_drive_health(drive_path: str) -> dict:
                             pass
     except Exception:
         pass
-    
+
     # Method 2: Try PowerShell for drive temperature
     if health_info["temperature"] is None and platform.system() == "Windows":
         try:
@@ -330,17 +404,16 @@ def get_drive_health(drive_path: str) -> dict:
                 }}
             }}
             '''
-            result = subprocess.run(['powershell', '-Command', cmd], 
-                                  capture_output=True, text=True, timeout=15)
-            
-            if result.returncode == 0 and result.stdout.strip():
+            result = await probe_executor.run(['powershell', '-Command', cmd], timeout=15)
+
+            if result.ok and result.stdout.strip():
                 try:
                     return {"output": result.stdout, "error": result.stderr}
                 except ValueError:
                     pass
         except Exception:
             pass
-    
+
     if platform.system() == "Windows":
         try:
             # Simple fallback - if we can get disk usage, assume it's working
@@ -350,28 +423,34 @@ def get_drive_health(drive_path: str) -> dict:
                 health_info["smart_available"] = False
         except Exception:
             health_info["status"] = "unknown"
-    
+
     return health_info
 
-def get_system_info() -> SystemInfo:
+drive_health_cache = DriveHealthCache(probe_drive_health, ttl=float(os.getenv("DRIVE_HEALTH_TTL", 300)))
+
+async def get_drive_health(drive_path: str) -> dict:
+    """Get drive health for a partition, shared per physical disk and cached for DRIVE_HEALTH_TTL seconds."""
+    return await drive_health_cache.get(drive_path)
+
+async def get_system_info() -> SystemInfo:
     """Gather system information."""
     hostname = socket.gethostname()
     system = platform.system()
     version = platform.version()
-    
+
     # Get CPU count
     cpu_count = psutil.cpu_count()
-    
+
     # Get total RAM in MB
     total_ram = psutil.virtual_memory().total // (1024 * 1024)
-    
+
     # Get detailed disk information
     disks = []
     for partition in psutil.disk_partitions():
         try:
             usage = psutil.disk_usage(partition.mountpoint)
-            health = get_drive_health(partition.device)
-            
+            health = await get_drive_health(partition.device)
+
             disks.append({
                 'device': partition.device,
                 'mountpoint': partition.mountpoint,
@@ -385,7 +464,7 @@ def get_system_info() -> SystemInfo:
             })
         except Exception as e:
             print(f"Error getting disk info for {partition.mountpoint}: {e}")
-    
+
     return SystemInfo(
         hostname=hostname,
         os=system,
@@ -409,19 +488,42 @@ async def health_check():
 @app.get("/api/system-info")
 async def system_info():
     """Get system information."""
-    return get_system_info()
+    return await get_system_info()
 
-@app.get("/api/status")
-async def status():
-    """Get current system status (CPU, memory, disk usage, temperature)."""
-    cpu_percent = psutil.cpu_percent(interval=1)
+def collect_cpu() -> Dict[str, Any]:
+    """CPU usage averaged since the previous run of this collector."""
+    return {"cpu_percent": psutil.cpu_percent(interval=None)}
+
+def collect_memory() -> Dict[str, Any]:
     memory = psutil.virtual_memory()
-    system_name = platform.system()
-    
-    # Get temperature information
-    temperatures = get_temperature_info()
-    
-    # Get all drives information
+    return {
+        "memory_percent": memory.percent,
+        "memory_used_mb": memory.used // (1024 * 1024),
+        "memory_total_mb": memory.total // (1024 * 1024),
+    }
+
+_last_net_io: Dict[str, Any] = {}
+
+def collect_network() -> Dict[str, Any]:
+    """Network throughput since the previous run of this collector."""
+    counters = psutil.net_io_counters()
+    now = time.monotonic()
+    network = {
+        "bytes_sent": counters.bytes_sent,
+        "bytes_recv": counters.bytes_recv,
+        "bytes_sent_per_sec": None,
+        "bytes_recv_per_sec": None,
+    }
+    if _last_net_io:
+        elapsed = now - _last_net_io["time"]
+        if elapsed > 0:
+            network["bytes_sent_per_sec"] = round(max(0, counters.bytes_sent - _last_net_io["bytes_sent"]) / elapsed, 1)
+            network["bytes_recv_per_sec"] = round(max(0, counters.bytes_recv - _last_net_io["bytes_recv"]) / elapsed, 1)
+    _last_net_io.update(time=now, bytes_sent=counters.bytes_sent, bytes_recv=counters.bytes_recv)
+    return {"network": network}
+
+def collect_disk_usage() -> Dict[str, Any]:
+    """Usage of every ready drive plus the primary disk."""
     drives = []
     for partition in psutil.disk_partitions():
         try:
@@ -430,7 +532,6 @@ async def status():
                 continue
                 
             usage = psutil.disk_usage(partition.mountpoint)
-            health = get_drive_health(partition.device)
             drives.append({
                 "device": partition.device,
                 "mountpoint": partition.mountpoint,
@@ -438,9 +539,7 @@ async def status():
                 "total_gb": round(usage.total / (1024**3), 2),
                 "used_gb": round(usage.used / (1024**3), 2),
                 "free_gb": round(usage.free / (1024**3), 2),
-                "percent_used": usage.percent,
-                "health_status": health.get('status', 'Unknown'),
-                "smart_available": health.get('smart_available', False)
+                "percent_used": usage.percent
             })
         except (OSError, PermissionError) as e:
             # Skip drives that are not ready or accessible
@@ -451,89 +550,187 @@ async def status():
             print(f"Error getting drive info for {partition.mountpoint}: {e}")
     
     # Primary disk for backward compatibility
-    primary_disk = psutil.disk_usage('/' if system_name == 'Linux' else 'C:\\')
+    primary_disk = psutil.disk_usage('/' if platform.system() == 'Linux' else 'C:\\')
     
     return {
-        "cpu_percent": cpu_percent,
-        "memory_percent": memory.percent,
-        "memory_used_mb": memory.used // (1024 * 1024),
-        "memory_total_mb": memory.total // (1024 * 1024),
         "disk_percent": primary_disk.percent,
         "disk_used_gb": round(primary_disk.used / (1024**3), 2),
         "disk_total_gb": round(primary_disk.total / (1024**3), 2),
-        "uptime_seconds": int(time.time() - psutil.boot_time()),
-        "drives": drives,
-        "temperatures": temperatures
+        "drives": drives
+    }
+
+async def collect_drive_health() -> Dict[str, Any]:
+    """SMART health for every ready drive, keyed by device."""
+    devices = [p.device for p in psutil.disk_partitions() if os.path.exists(p.mountpoint)]
+    healths = await asyncio.gather(*(get_drive_health(device) for device in devices))
+    return {"drive_health": dict(zip(devices, healths))}
+
+async def collect_temperatures() -> Dict[str, Any]:
+    return {"temperatures": await get_temperature_info(scheduler.data.get("cpu_percent"))}
+
+def _interval(name: str, default: float) -> float:
+    return float(os.getenv(f"{name.upper()}_INTERVAL", default))
+
+scheduler = CollectorScheduler()
+scheduler.add(Collector("cpu", collect_cpu, _interval("cpu", 1), CHEAP))
+scheduler.add(Collector("memory", collect_memory, _interval("memory", 2), CHEAP))
+scheduler.add(Collector("network", collect_network, _interval("network", 1), EXPENSIVE))
+scheduler.add(Collector("disk_usage", collect_disk_usage, _interval("disk_usage", 30), EXPENSIVE))
+scheduler.add(Collector("temperatures", collect_temperatures, _interval("temperatures", 10), EXPENSIVE))
+scheduler.add(Collector("drive_health", collect_drive_health, _interval("drive_health", 600), EXPENSIVE))
+
+history = MetricHistory(
+    seconds=float(os.getenv("HISTORY_SECONDS", 3600)),
+    max_metrics=int(os.getenv("HISTORY_MAX_METRICS", 64))
+)
+
+def record_history(collector: Collector, result: Dict[str, Any]):
+    history.record(extract_metrics(result), collector.interval, collector.collected_at)
+
+scheduler.add_listener(record_history)
+
+def merge_drive_health(drives: List[Dict[str, Any]], drive_health: Dict[str, dict]) -> List[Dict[str, Any]]:
+    """Attach the (slower) health results to the (faster) usage results."""
+    merged = []
+    for drive in drives:
+        health = drive_health.get(drive["device"], {})
+        merged.append({
+            **drive,
+            "health_status": health.get('status', 'Unknown'),
+            "smart_available": health.get('smart_available', False)
+        })
+    return merged
+
+async def current_status() -> Dict[str, Any]:
+    """Build the status payload from the collector snapshot."""
+    snapshot = await scheduler.snapshot()
+    snapshot["drives"] = merge_drive_health(snapshot.get("drives", []), snapshot.pop("drive_health", {}))
+    snapshot["uptime_seconds"] = int(time.time() - psutil.boot_time())
+    return snapshot
+
+@app.get("/api/status")
+async def status():
+    """Get current system status (CPU, memory, disk usage, temperature)."""
+    return await current_status()
+
+@app.get("/api/collectors")
+async def list_collectors():
+    """Show each collector's interval, cost and timing."""
+    return {"collectors": scheduler.info(), "probes": probe_executor.stats()}
+
+@app.get("/api/history")
+async def get_history(metric: Optional[str] = None, since: Optional[float] = None, step: float = 0):
+    """Recent samples of one metric, optionally averaged into step-second buckets.
+
+    `since` is a unix timestamp, or seconds before now when negative.
+    Without `metric`, lists the metrics that have history.
+    """
+    if metric is None:
+        return history.info()
+    if metric not in history.buffers:
+        raise HTTPException(status_code=404, detail=f"No history for metric: {metric}")
+    if since is None:
+        since = time.time() - history.seconds
+    elif since < 0:
+        since = time.time() + since
+    return {
+        "metric": metric,
+        "since": since,
+        "step": step,
+        "columns": ["timestamp", "avg", "min", "max"] if step > 0 else ["timestamp", "value"],
+        "points": history.query(metric, since, step)
+    }
+
+@app.get("/api/capabilities")
+async def get_capabilities():
+    """Temperature sources detected on this host and their re-probe state."""
+    return {"temperature_sources": capabilities.info()}
+
+@app.get("/api/cache-stats")
+async def cache_stats():
+    """Hit/miss counters of the agent's caches."""
+    return {
+        "drive_health": drive_health_cache.stats(),
+        "directory_listing": listing_cache.stats()
     }
 
+listing_cache = DirectoryListingCache(max_entries=int(os.getenv("LISTING_CACHE_ENTRIES", 200000)))
+
 @app.get("/api/files")
-async def list_files(path: str = "C:\\"):
-    """List files and directories in the specified path."""
+def list_files(
+    path: str = "C:\\",
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    sort: Optional[str] = None,
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    name_filter: Optional[str] = Query(None, alias="filter"),
+    stream: bool = False,
+    if_none_match: Optional[str] = Header(None)
+):
+    """List files and directories in the specified path.
+
+    Entries come from os.scandir, reusing the type and stat data it already
+    fetched. Supports cursor pagination (`cursor`, `limit`), sorting (`sort`
+    = name, size, modified, type or none; directories first) and filtering
+    by name (substring or glob). With `stream=true` the entries are sent as
+    NDJSON while the directory is still being read, unsorted unless `sort`
+    is given.
+
+    Listings are cached until the directory changes. Responses carry an
+    ETag; a matching If-None-Match gets 304 Not Modified.
+    """
+    if sort is not None and sort != "none" and sort not in SORT_KEYS:
+        raise HTTPException(status_code=400, detail=f"Unknown sort key: {sort}")
+    if cursor is not None and not cursor.isdigit():
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     try:
         if not os.path.exists(path):
             raise HTTPException(status_code=404, detail="Path not found")
         
-        items = []
+        if stream and (sort is None or sort == "none"):
+            try:
+                entries = listing_cache.iter_and_store(path)
+            except PermissionError:
+                raise HTTPException(status_code=403, detail="Permission denied")
+            items = (item for item in entries if matches_filter(item["name"], name_filter))
+            return StreamingResponse(stream_ndjson(items), media_type="application/x-ndjson")
+        
         try:
-            for item in os.listdir(path):
-                item_path = os.path.join(path, item)
-                try:
-                    stat = os.stat(item_path)
-                    is_dir = os.path.isdir(item_path)
-                    items.append({
-                        "name": item,
-                        "path": item_path,
-                        "is_directory": is_dir,
-                        "size": stat.st_size if not is_dir else 0,
-                        "modified": stat.st_mtime,
-                        "type": "folder" if is_dir else os.path.splitext(item)[1].lower()
-                    })
-                except (PermissionError, OSError):
-                    # Skip files we can't access
-                    continue
+            listing = listing_cache.get(path)
         except PermissionError:
             raise HTTPException(status_code=403, detail="Permission denied")
+        headers = {"ETag": listing.etag, "Cache-Control": "no-cache"}
+        if if_none_match is not None and listing.etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers=headers)
         
-        return {
+        items = listing.sorted(sort or "name", order)
+        if name_filter:
+            items = [item for item in items if matches_filter(item["name"], name_filter)]
+        
+        if stream:
+            return StreamingResponse(stream_ndjson(iter(items)), media_type="application/x-ndjson", headers=headers)
+        
+        page, next_cursor = paginate(items, cursor, limit)
+        return JSONResponse({
             "path": path,
-            "items": sorted(items, key=lambda x: (not x["is_directory"], x["name"].lower()))
-        }
+            "items": page,
+            "total": len(items),
+            "next_cursor": next_cursor
+        }, headers=headers)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/drives")
 async def get_drives():
     """Get all available drives with detailed information."""
-    drives = []
-    for partition in psutil.disk_partitions():
-        try:
-            # Skip if device is not ready (like empty CD/DVD drives)
-            if not os.path.exists(partition.mountpoint):
-                continue
-                
-            usage = psutil.disk_usage(partition.mountpoint)
-            health = get_drive_health(partition.device)
-            
-            drives.append({
-                "device": partition.device,
-                "mountpoint": partition.mountpoint,
-                "fstype": partition.fstype,
-                "total_gb": round(usage.total / (1024**3), 2),
-                "used_gb": round(usage.used / (1024**3), 2),
-                "free_gb": round(usage.free / (1024**3), 2),
-                "percent_used": usage.percent,
-                "health_status": health.get('status', 'Unknown'),
-                "smart_available": health.get('smart_available', False)
-            })
-        except (OSError, PermissionError) as e:
-            # Skip drives that are not ready or accessible
-            if "device is not ready" in str(e).lower() or "access is denied" in str(e).lower():
-                continue
-            print(f"Error getting drive info for {partition.mountpoint}: {e}")
-        except Exception as e:
-            print(f"Error getting drive info for {partition.mountpoint}: {e}")
-    
-    return {"drives": drives}
+    snapshot = await current_status()
+    return {
+        "drives": snapshot["drives"],
+        "collected_at": snapshot["collected_at"],
+        "snapshot_age_seconds": snapshot["snapshot_age_seconds"]
+    }
 
 @app.post("/api/command")
 async def execute_command(command_req: CommandRequest) -> CommandResponse:
@@ -558,154 +755,523 @@ async def execute_command(command_req: CommandRequest) -> CommandResponse:
 SHARED_FILES_DIR = Path("shared_files")
 SHARED_FILES_DIR.mkdir(exist_ok=True)
 
+shared_catalog = SharedFileCatalog(SHARED_FILES_DIR, owner=socket.gethostname())
+upload_manager = UploadManager(SHARED_FILES_DIR, commit=shared_catalog.add, session_ttl=float(os.getenv("UPLOAD_SESSION_TTL", 86400)))
+
+async def iter_upload(file: UploadFile):
+    while True:
+        chunk = await file.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+async def store_stream(filename: str, chunks) -> Dict[str, Any]:
+    """Hash a byte stream into a temporary file and add it to the shared files.
+
+    Content the agent already holds isn't stored twice.
+    """
+    file_id = str(uuid.uuid4())
+    temp_path = upload_manager.directory / f"{file_id}.tmp"
+    sha256 = hashlib.sha256()
+    try:
+        with open(temp_path, 'wb') as f:
+            await write_stream(f, chunks, sha256)
+        return shared_catalog.add(file_id, filename, temp_path, sha256.hexdigest())
+    finally:
+        temp_path.unlink(missing_ok=True)
+
 @app.post("/api/upload")
 async def upload_file(file: UploadFile = File(...)):
-    """Upload a file to be shared with other agents."""
+    """Upload a file to be shared with other agents.
+
+    The file is copied to disk in CHUNK_SIZE pieces while its SHA-256 is
+    computed. Large transfers should use the resumable /api/uploads
+    sessions instead, which also avoid multipart spooling. Clients can
+    skip uploading content the agent already has: check
+    /api/blobs/{sha256} and use /api/shared-files/link.
+    """
     try:
-        file_id = str(uuid.uuid4())
-        file_path = SHARED_FILES_DIR / f"{file_id}_{file.filename}"
-        
-        async with aiofiles.open(file_path, 'wb') as f:
-            content = await file.read()
-            await f.write(content)
-        
+        entry = await store_stream(safe_filename(file.filename), iter_upload(file))
         return {
             "success": True,
-            "file_id": file_id,
-            "filename": file.filename,
-            "size": len(content),
-            "message": f"File uploaded successfully as {file_id}_{file.filename}"
+            "file_id": entry["file_id"],
+            "filename": entry["filename"],
+            "size": entry["size"],
+            "sha256": entry["sha256"],
+            "message": f"File uploaded successfully as {entry['file_id']}"
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
-@app.get("/api/download/{file_id}")
-async def download_file(file_id: str):
-    """Download a shared file by ID."""
+@app.post("/api/uploads")
+async def create_upload(request: UploadSessionRequest):
+    """Start a resumable upload; the body is then PUT to /api/uploads/{upload_id}.
+
+    With `chunk_size` (and `size`) the file is instead sent as chunks to
+    /api/uploads/{upload_id}/chunks/{index}, in any order and in parallel.
+    """
     try:
-        # Find file with matching ID
-        for file_path in SHARED_FILES_DIR.glob(f"{file_id}_*"):
-            if file_path.is_file():
-                original_filename = file_path.name.split('_', 1)[1]
-                return FileResponse(
-                    path=str(file_path),
-                    filename=original_filename,
-                    media_type='application/octet-stream'
-                )
-        
-        raise HTTPException(status_code=404, detail="File not found")
+        session = upload_manager.create(request.filename, request.size, request.chunk_size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Content-Encodings the PUT bodies may use
+    return {**session.info(), "encodings": content_encodings()}
+
+def request_body(request: Request):
+    """The request body stream, decompressed if it has a Content-Encoding we accept."""
+    encoding = request.headers.get("content-encoding", "identity").lower()
+    if encoding == "identity":
+        return request.stream()
+    if encoding not in content_encodings():
+        raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding: {encoding}")
+    return decompress_stream(request.stream(), encoding)
+
+@app.get("/api/uploads/{upload_id}")
+async def get_upload(upload_id: str):
+    """Where an upload stands; resume by PUTting from `offset`."""
+    try:
+        return (await upload_manager.get(upload_id)).info()
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+@app.put("/api/uploads/{upload_id}")
+async def put_upload(upload_id: str, request: Request, offset: int = Query(..., ge=0)):
+    """Append the raw request body at `offset`, streamed straight to disk.
+
+    A mismatched offset gets 409 with the current offset. If the connection
+    drops, the bytes received so far are kept. The body may be gzip or
+    zstd encoded; offsets always count decompressed bytes.
+    """
+    try:
+        session = await upload_manager.write(upload_id, offset, request_body(request))
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except OffsetMismatch as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "offset": e.offset})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return session.info()
+
+@app.put("/api/uploads/{upload_id}/chunks/{index}")
+async def put_upload_chunk(upload_id: str, index: int, request: Request,
+                           chunk_sha256: Optional[str] = Header(None, alias="X-Chunk-SHA256")):
+    """Write one chunk of a chunked upload, verified against X-Chunk-SHA256 when given."""
+    try:
+        session = await upload_manager.write_chunk(upload_id, index, request_body(request), chunk_sha256)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"upload_id": upload_id, "index": index, "received": len(session.received), "chunks": session.chunk_count}
+
+@app.post("/api/uploads/{upload_id}/complete")
+async def complete_upload(upload_id: str, request: UploadCompleteRequest):
+    """Finish an upload, checking the expected size and optional SHA-256."""
+    try:
+        result = await upload_manager.complete(upload_id, request.sha256)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "success": True,
+        "file_id": result["file_id"],
+        "filename": result["filename"],
+        "size": result["size"],
+        "sha256": result["sha256"],
+        "message": f"File uploaded successfully as {result['file_id']}"
+    }
+
+@app.delete("/api/uploads/{upload_id}")
+async def abort_upload(upload_id: str):
+    """Abandon an upload and delete what was received."""
+    try:
+        await upload_manager.abort(upload_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return {"success": True, "message": "Upload aborted"}
+
+@app.api_route("/api/download/{file_id}", methods=["GET", "HEAD"])
+async def download_file(file_id: str, accept_encoding: Optional[str] = Header(None)):
+    """Download a shared file by ID.
+
+    Supports single and multi-range requests and If-Range, so interrupted
+    downloads can resume with `Range: bytes=<received>-`. Whole-file
+    downloads are compressed (zstd or gzip, per Accept-Encoding) unless
+    the file is already compressed or a sample of it doesn't shrink.
+    """
+    try:
+        entry = shared_catalog.get(file_id)
+        if entry is None or not os.path.isfile(entry["path"]):
+            raise HTTPException(status_code=404, detail="File not found")
+        encoding = negotiate_content_encoding(accept_encoding)
+        if encoding is not None:
+            # The blob has no extension, judge the format by the shared name
+            compressible = await asyncio.get_running_loop().run_in_executor(
+                None, is_compressible, entry["path"], entry["filename"])
+            if not compressible:
+                encoding = None
+        return RangeFileResponse(
+            path=entry["path"],
+            filename=entry["filename"],
+            media_type='application/octet-stream',
+            encoding=encoding
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Download failed: {str(e)}")
 
+@app.get("/api/archive")
+async def download_archive(path: str, accept_encoding: Optional[str] = Header(None)):
+    """Download a directory tree as a tar stream, generated while it is sent.
+
+    Nothing is staged on disk and memory stays at one chunk. The archive
+    holds the directory itself (`<name>/...`). With `Accept-Encoding: zstd`
+    the stream is compressed; gzip isn't offered here, as its CPU cost on a
+    tree of mixed content would cap the transfer rate.
+    """
+    try:
+        if not os.path.isdir(path):
+            raise HTTPException(status_code=404, detail="Directory not found")
+        name = os.path.basename(os.path.normpath(path)) or "root"
+        headers = {"Content-Disposition": f'attachment; filename="{name}.tar"', "Vary": "Accept-Encoding"}
+        body = iterate_in_threadpool(iter_tar(path, name))
+        encoding = negotiate_content_encoding(accept_encoding, offered=[ZSTD]) if ZSTD in content_encodings() else None
+        if encoding is not None:
+            body = compress_stream(body, encoding)
+            headers["Content-Encoding"] = encoding
+        return StreamingResponse(body, media_type="application/x-tar", headers=headers)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Archive failed: {str(e)}")
+
+@app.put("/api/archive")
+async def extract_archive(path: str, request: Request):
+    """Extract a tar stream into the directory `path` while it is received.
+
+    Like `tar -x -C path`: the directory is created if needed and existing
+    files are replaced. Unsafe members (absolute paths, `..`, links leading
+    outside `path`) are skipped and listed in `skipped`. The body may be
+    gzip or zstd encoded, or a .tar.gz/.tar.bz2/.tar.xz.
+    """
+    try:
+        if os.path.exists(path) and not os.path.isdir(path):
+            raise HTTPException(status_code=409, detail="Destination is not a directory")
+        result = await extract_stream(request_body(request), path)
+        return {"success": True, **result}
+    except HTTPException:
+        raise
+    except (ValueError, tarfile.TarError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid archive: {e}")
+    except PermissionError:
+        raise HTTPException(status_code=403, detail="Permission denied")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Extract failed: {str(e)}")
+
 @app.get("/api/shared-files")
-async def list_shared_files():
-    """List all shared files available for download."""
+async def list_shared_files(cursor: Optional[str] = None, limit: Optional[int] = Query(None, ge=1)):
+    """List shared files available for download, newest first.
+
+    Served from the catalog; pass `limit` (and the returned `next_cursor`)
+    to page through large collections.
+    """
     try:
-        files = []
-        for file_path in SHARED_FILES_DIR.glob("*"):
-            if file_path.is_file():
-                parts = file_path.name.split('_', 1)
-                if len(parts) == 2:
-                    file_id, filename = parts
-                    stat = file_path.stat()
-                    files.append({
-                        "file_id": file_id,
-                        "filename": filename,
-                        "size": stat.st_size,
-                        "created_at": stat.st_ctime,
-                        "shared_by": socket.gethostname()
-                    })
-        
-        return {"files": files}
+        entries, next_cursor = shared_catalog.list(cursor, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    try:
+        files = [
+            {
+                "file_id": entry["file_id"],
+                "filename": entry["filename"],
+                "size": entry["size"],
+                "sha256": entry["sha256"],
+                "created_at": entry["created_at"],
+                "shared_by": entry["owner"]
+            }
+            for entry in entries
+        ]
+        return {"files": files, "total": shared_catalog.count(), "next_cursor": next_cursor}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list files: {str(e)}")
 
+@app.api_route("/api/blobs/{sha256}", methods=["GET", "HEAD"])
+async def get_blob(sha256: str):
+    """Whether the agent already stores content with this SHA-256 (404 if not)."""
+    blob = shared_catalog.has_blob(sha256.lower())
+    if blob is None:
+        raise HTTPException(status_code=404, detail="Blob not found")
+    return {"sha256": blob["sha256"], "size": blob["size"], "references": blob["refcount"]}
+
+@app.post("/api/shared-files/link")
+async def link_shared_file(request: LinkSharedFileRequest):
+    """Share content the agent already stores under a new file_id, without uploading it."""
+    sha256 = request.sha256.lower()
+    if not SHA256_HEX.match(sha256):
+        raise HTTPException(status_code=400, detail="Invalid SHA-256")
+    entry = shared_catalog.link(str(uuid.uuid4()), safe_filename(request.filename), sha256)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Blob not found")
+    return {
+        "success": True,
+        "file_id": entry["file_id"],
+        "filename": entry["filename"],
+        "size": entry["size"],
+        "sha256": entry["sha256"],
+        "message": f"File linked successfully as {entry['file_id']}"
+    }
+
+@app.get("/api/storage-stats")
+async def storage_stats():
+    """Shared file storage: logical vs. stored bytes after deduplication."""
+    return shared_catalog.stats()
+
+http_client = httpx.AsyncClient(timeout=httpx.Timeout(60.0))
+transfers = TransferRegistry()
+TRANSFER_STREAMS = int(os.getenv("TRANSFER_STREAMS", 4))
+TRANSFER_CHUNK_SIZE = int(os.getenv("TRANSFER_CHUNK_SIZE", 8 * 1024 * 1024))
+
+def central_server_url() -> str:
+    """Websocket URL of the central server, from CENTRAL_SERVER_URL or auto-detected."""
+    # Auto-detect central server URL using the best network IP
+    return os.getenv("CENTRAL_SERVER_URL") or f"ws://{find_best_ip_for_network()}:8080"
+
+async def resolve_agent_url(agent_id: str) -> str:
+    """Base URL of another agent's API, looked up in the central server's registry."""
+    api_url = re.sub(r"^ws", "http", central_server_url())
+    response = await http_client.get(f"{api_url}/api/agents/{agent_id}")
+    if response.status_code == 404:
+        raise LookupError(f"Agent {agent_id} is not registered")
+    response.raise_for_status()
+    agent = response.json()
+    if agent["status"] != "online":
+        raise LookupError(f"Agent {agent_id} is offline")
+    return f"http://{agent['ip']}:{agent.get('port', 3000)}"
+
 @app.post("/api/transfer-file")
 async def transfer_file_to_agent(request: FileTransferRequest):
-    """Transfer a file from this agent to another agent."""
+    """Transfer a file from this agent to another agent.
+
+    The target is looked up through the central server and the file is
+    streamed into its resumable upload endpoint in the background, in
+    constant memory. Files larger than one chunk go over `streams`
+    concurrent connections as `chunk_size` ranges (defaults
+    TRANSFER_STREAMS and TRANSFER_CHUNK_SIZE). Compressible files are sent
+    gzip/zstd encoded when the target accepts it (`compress` forces it on
+    or off). The file is shared there under the name from `target_path`.
+    Poll /api/transfers/{transfer_id} for progress.
+    """
+    if request.streams is not None and not 1 <= request.streams <= 32:
+        raise HTTPException(status_code=400, detail="streams must be between 1 and 32")
+    if request.chunk_size is not None and not 64 * 1024 <= request.chunk_size <= 256 * 1024 * 1024:
+        raise HTTPException(status_code=400, detail="chunk_size must be between 64 KiB and 256 MiB")
     try:
         # Check if source file exists
-        if not os.path.exists(request.source_path):
+        if not os.path.isfile(request.source_path):
             raise HTTPException(status_code=404, detail="Source file not found")
         
-        # Read the file
-        async with aiofiles.open(request.source_path, 'rb') as f:
-            file_content = await f.read()
+        try:
+            target_url = await resolve_agent_url(request.target_agent_id)
+        except LookupError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except httpx.HTTPError as e:
+            raise HTTPException(status_code=502, detail=f"Central server unreachable: {e}")
         
-        filename = os.path.basename(request.source_path)
+        filename = safe_filename(request.target_path or os.path.basename(request.source_path))
+        transfer = Transfer(request.source_path, filename, os.path.getsize(request.source_path),
+                            request.target_agent_id, target_url)
+        streams = request.streams or TRANSFER_STREAMS
+        chunk_size = request.chunk_size or TRANSFER_CHUNK_SIZE
+        compress = request.compress
+        if compress is None:
+            compress = await asyncio.get_running_loop().run_in_executor(None, is_compressible, request.source_path)
+        if streams > 1 and transfer.size > chunk_size:
+            transfers.start(transfer, lambda t: send_file_parallel(http_client, t, streams, chunk_size,
+                                                                   compress=compress))
+        else:
+            transfers.start(transfer, lambda t: send_file(http_client, t, compress=compress))
         
-        # Here you would typically send the file to the target agent
-        # For now, we'll simulate by uploading to our own shared directory
-        file_id = str(uuid.uuid4())
-        target_path = SHARED_FILES_DIR / f"{file_id}_{filename}"
+        return {
+            "success": True,
+            "message": f"Transfer to {request.target_agent_id} started",
+            **transfer.info()
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Transfer failed: {str(e)}")
+
+@app.post("/api/transfer-directory")
+async def transfer_directory_to_agent(request: DirectoryTransferRequest):
+    """Copy a directory tree to another agent as a tar stream.
+
+    The tree is archived on the fly and extracted on the target under
+    `target_path` while it arrives (as `target_path/<directory name>`).
+    With `compress`, the stream is zstd or gzip encoded. Progress counts
+    file bytes; poll /api/transfers/{transfer_id}.
+    """
+    try:
+        if not os.path.isdir(request.source_path):
+            raise HTTPException(status_code=404, detail="Source directory not found")
         
-        async with aiofiles.open(target_path, 'wb') as f:
-            await f.write(file_content)
+        try:
+            target_url = await resolve_agent_url(request.target_agent_id)
+        except LookupError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except httpx.HTTPError as e:
+            raise HTTPException(status_code=502, detail=f"Central server unreachable: {e}")
+        
+        loop = asyncio.get_running_loop()
+        size = await loop.run_in_executor(None, tree_size, request.source_path)
+        transfer = Transfer(request.source_path, request.target_path, size, request.target_agent_id, target_url)
+        encoding = choose_encoding(content_encodings()) if request.compress else None
+        transfers.start(transfer, lambda t: send_directory(http_client, t, encoding))
         
         return {
             "success": True,
-            "message": f"File transferred successfully",
-            "file_id": file_id,
-            "filename": filename,
-            "size": len(file_content)
+            "message": f"Directory transfer to {request.target_agent_id} started",
+            **transfer.info()
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Transfer failed: {str(e)}")
 
+@app.get("/api/transfers")
+async def list_transfers():
+    """Transfers started by this agent, running and recently finished."""
+    return {"transfers": [transfer.info() for transfer in transfers.list()]}
+
+@app.get("/api/transfers/{transfer_id}")
+async def get_transfer(transfer_id: str):
+    """Progress of one transfer."""
+    transfer = transfers.get(transfer_id)
+    if transfer is None:
+        raise HTTPException(status_code=404, detail="Transfer not found")
+    return transfer.info()
+
 @app.delete("/api/shared-files/{file_id}")
 async def delete_shared_file(file_id: str):
     """Delete a shared file."""
     try:
-        for file_path in SHARED_FILES_DIR.glob(f"{file_id}_*"):
-            if file_path.is_file():
-                file_path.unlink()
-                return {"success": True, "message": "File deleted successfully"}
-        
-        raise HTTPException(status_code=404, detail="File not found")
+        # The content itself goes with its last reference
+        if not shared_catalog.remove(file_id):
+            raise HTTPException(status_code=404, detail="File not found")
+        return {"success": True, "message": "File deleted successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Delete failed: {str(e)}")
 
+async def status_sample() -> Dict[str, Any]:
+    """Current status as pushed to the central server."""
+    status_data = await current_status()
+    # Only meaningful at request time, central uses collected_at
+    status_data.pop("snapshot_age_seconds", None)
+    status_data.pop("collector_ages", None)
+    return status_data
+
+async def send_batched_updates(websocket, agent_id: str, encoder: DeltaEncoder, encoding: str,
+                               sample_interval: float, update_interval: float):
+    """Sample every sample_interval seconds, ship all samples every update_interval seconds.
+
+    Each sample is delta-encoded against the previous one, so a batch costs
+    about one keyframe plus small deltas in a single websocket frame.
+    """
+    loop = asyncio.get_running_loop()
+    batch = []
+    next_sample = next_send = loop.time()
+    while True:
+        batch.append(encoder.encode(await status_sample()))
+        if loop.time() >= next_send:
+            await websocket.send(encode_message({
+                "type": "status_update",
+                "agent_id": agent_id,
+                "batch": batch
+            }, encoding))
+            batch = []
+            next_send += update_interval
+        # Don't try to catch up on samples missed while the loop was busy
+        next_sample = max(next_sample + sample_interval, loop.time())
+        await asyncio.sleep(next_sample - loop.time())
+
+async def listen_to_central_server(websocket, encoder: DeltaEncoder):
+    """Handle control messages sent back by the central server."""
+    async for data in websocket:
+        message = decode_message(data)
+        if message.get("type") == "resync":
+            # The central server lost track of our deltas, send a keyframe next
+            encoder.force_keyframe()
+
 async def register_with_central_server():
     """Register this agent with the central server."""
-    # Get dynamic IP address
-    local_ip = get_local_ip()
+    # Get dynamic IP address, unless AGENT_IP says how other machines reach us
+    local_ip = os.getenv("AGENT_IP") or get_local_ip()
     best_ip = find_best_ip_for_network()
     
     # Use environment variable or auto-detect central server
-    central_server_url = os.getenv("CENTRAL_SERVER_URL")
-    if not central_server_url:
-        # Auto-detect central server URL using the best network IP
-        central_server_url = f"ws://{best_ip}:8080"
+    server_url = central_server_url()
     
     agent_id = os.getenv("AGENT_ID", socket.gethostname())
     agent_port = os.getenv("AGENT_PORT", 3000)
+    update_interval = float(os.getenv("STATUS_UPDATE_INTERVAL", 30))
+    sample_interval = float(os.getenv("STATUS_SAMPLE_INTERVAL", 1))
+    keyframe_interval = int(os.getenv("KEYFRAME_INTERVAL", 60))
     
     print(f"Agent starting with IP: {local_ip}")
     print(f"Best network IP detected: {best_ip}")
-    print(f"Connecting to central server: {central_server_url}")
+    print(f"Connecting to central server: {server_url}")
     
     while True:
         try:
-            async with websockets.connect(f"{central_server_url}/ws/register") as websocket:
+            async with websockets.connect(f"{server_url}/ws/register") as websocket:
                 # Register with the central server
                 await websocket.send(json.dumps({
                     "type": "register",
                     "agent_id": agent_id,
                     "hostname": socket.gethostname(),
-                    "ip": local_ip
+                    "ip": local_ip,
+                    "port": int(agent_port),
+                    "encodings": supported_encodings()
                 }))
                 
-                print(f"Agent {agent_id} registered successfully")
+                # Older central servers don't answer, keep JSON, single updates and
+                # full snapshots for them (they take each update's "data" as the status)
+                encoding = JSON
+                batching = False
+                deltas = False
+                try:
+                    reply = decode_message(await asyncio.wait_for(websocket.recv(), timeout=5))
+                    if reply.get("type") == "registered":
+                        encoding = reply.get("encoding", JSON)
+                        batching = reply.get("batching", False)
+                        deltas = reply.get("deltas", False)
+                except asyncio.TimeoutError:
+                    pass
+                
+                print(f"Agent {agent_id} registered successfully using {encoding}")
                 
-                # Keep the connection open and send periodic updates
-                while True:
-                    status_data = await status()
-                    await websocket.send(json.dumps({
-                        "type": "status_update",
-                        "agent_id": agent_id,
-                        "data": status_data
-                    }))
-                    await asyncio.sleep(30)  # Send update every 30 seconds
+                # A new connection always starts with a full snapshot; without
+                # delta support every update is one
+                encoder = DeltaEncoder(keyframe_interval=keyframe_interval if deltas else 1)
+                listener = asyncio.create_task(listen_to_central_server(websocket, encoder))
+                try:
+                    if batching:
+                        await send_batched_updates(websocket, agent_id, encoder, encoding,
+                                                   sample_interval, update_interval)
+                    else:
+                        # Keep the connection open and send periodic updates
+                        while True:
+                            await websocket.send(encode_message({
+                                "type": "status_update",
+                                "agent_id": agent_id,
+                                **encoder.encode(await status_sample())
+                            }, encoding))
+                            await asyncio.sleep(update_interval)  # Send update every 30 seconds by default
+                finally:
+                    listener.cancel()
                     
         except Exception as e:
             print(f"Error connecting to central server: {e}. Retrying in 10 seconds...")
@@ -714,8 +1280,22 @@ async def register_with_central_server():
 @app.on_event("startup")
 async def startup_event():
     """Start background tasks when the application starts."""
+    psutil.cpu_percent(interval=None)  # Prime the CPU counters for the first sample
+    await asyncio.get_running_loop().run_in_executor(None, shared_catalog.rebuild)
+    asyncio.create_task(capabilities.probe_all())
+    scheduler.start()
     asyncio.create_task(register_with_central_server())
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background tasks when the application shuts down."""
+    await scheduler.stop()
+    await transfers.stop()
+    await http_client.aclose()
+    if hwmon_reader:
+        hwmon_reader.close()
+    shared_catalog.close()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=3000)
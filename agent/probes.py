@@ -0,0 +1,113 @@
+import asyncio
+import locale
+import subprocess
+import time
+from typing import Any, Dict, List, Optional
+
+
+class ProbeResult:
+    """Outcome of one external probe command."""
+
+    def __init__(self, returncode: Optional[int], stdout: str, stderr: str,
+                 timed_out: bool = False, duration: float = 0.0):
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.timed_out = timed_out
+        self.duration = duration
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0 and not self.timed_out
+
+
+class ProbeExecutor:
+    """Run sensor probes (smartctl, nvidia-smi, powershell, wmic) as async subprocesses.
+
+    A semaphore caps how many probes run at once across the whole agent, and a
+    probe that overruns its timeout is killed rather than left running in the
+    background. A missing executable raises FileNotFoundError like
+    subprocess.run does.
+    """
+
+    def __init__(self, max_concurrency: int = 4):
+        self.max_concurrency = max_concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.spawned = 0
+        self.running = 0
+        self.timeouts = 0
+        self.not_found = 0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so it belongs to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def run(self, args: List[str], timeout: float = 10) -> ProbeResult:
+        async with self._get_semaphore():
+            self.running += 1
+            started = time.perf_counter()
+            try:
+                return await self._run(args, timeout, started)
+            except FileNotFoundError:
+                self.not_found += 1
+                raise
+            finally:
+                self.running -= 1
+
+    async def _run(self, args: List[str], timeout: float, started: float) -> ProbeResult:
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+            )
+        except NotImplementedError:
+            # Selector event loops on Windows can't spawn subprocesses,
+            # fall back to a blocking call in a worker thread.
+            return await self._run_in_thread(args, timeout, started)
+        self.spawned += 1
+
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            process.kill()
+            await process.wait()
+            return ProbeResult(None, "", "", timed_out=True, duration=time.perf_counter() - started)
+        except asyncio.CancelledError:
+            process.kill()
+            raise
+
+        return ProbeResult(
+            process.returncode, _decode(stdout), _decode(stderr),
+            duration=time.perf_counter() - started
+        )
+
+    async def _run_in_thread(self, args: List[str], timeout: float, started: float) -> ProbeResult:
+        loop = asyncio.get_running_loop()
+        self.spawned += 1
+        try:
+            result = await loop.run_in_executor(None, lambda: subprocess.run(
+                args, capture_output=True, text=True, timeout=timeout
+            ))
+        except subprocess.TimeoutExpired:
+            # subprocess.run kills the child before raising
+            self.timeouts += 1
+            return ProbeResult(None, "", "", timed_out=True, duration=time.perf_counter() - started)
+        return ProbeResult(
+            result.returncode, result.stdout, result.stderr,
+            duration=time.perf_counter() - started
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "running": self.running,
+            "spawned": self.spawned,
+            "timeouts": self.timeouts,
+            "not_found": self.not_found,
+        }
+
+
+def _decode(data: bytes) -> str:
+    return data.decode(locale.getpreferredencoding(False), errors="replace")
@@ -0,0 +1,211 @@
+import asyncio
+import os
+import re
+import uuid
+from email.utils import formatdate
+from typing import List, Optional, Tuple
+from urllib.parse import quote
+
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from compression import compress_stream
+
+CHUNK_SIZE = 1024 * 1024
+MAX_RANGES = 100
+
+RANGE_SPEC = re.compile(r"^\s*(\d*)\s*-\s*(\d*)\s*$")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range_header(value: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """Parse a Range header into sorted, merged [start, end) pairs.
+
+    Returns None when the header is malformed or uses another unit, in
+    which case it must be ignored and the whole file sent. Raises
+    RangeNotSatisfiable when no range overlaps the file.
+    """
+    unit, _, specs = value.partition("=")
+    if unit.strip().lower() != "bytes" or not specs:
+        return None
+    ranges = []
+    for spec in specs.split(","):
+        match = RANGE_SPEC.match(spec)
+        if not match or match.group(1) == match.group(2) == "":
+            return None
+        first, last = match.groups()
+        if first == "":
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length == 0:
+                continue
+            start, end = max(size - length, 0), size
+        else:
+            start = int(first)
+            end = min(int(last) + 1, size) if last else size
+            if last and int(last) < start:
+                return None
+            if start >= size:
+                continue
+        ranges.append((start, end))
+    if not ranges:
+        raise RangeNotSatisfiable()
+    if len(ranges) > MAX_RANGES:
+        return None
+
+    # Overlapping or adjacent ranges are served once
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        if start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def read_at(f, offset: int, count: int) -> bytes:
+    if hasattr(os, "pread"):
+        return os.pread(f.fileno(), count, offset)
+    f.seek(offset)
+    return f.read(count)
+
+
+class RangeFileResponse(Response):
+    """File response with byte ranges, If-Range and zero-copy sending.
+
+    Serves 200 for the whole file, 206 for one range, 206
+    multipart/byteranges for several and 416 when nothing overlaps the
+    file. When the server offers the ASGI `http.response.zerocopy`
+    extension, file segments are handed to it (sendfile on Linux);
+    otherwise they are read with pread in the default executor, in
+    CHUNK_SIZE pieces.
+
+    With an `encoding` (gzip/zstd), whole-file responses are compressed on
+    the fly and sent chunked; range requests are always served unencoded.
+    """
+
+    def __init__(self, path: str, filename: str, media_type: str = "application/octet-stream",
+                 stat_result: Optional[os.stat_result] = None, encoding: Optional[str] = None):
+        self.path = path
+        self.filename = filename
+        self.media_type = media_type
+        self.encoding = encoding
+        self.stat_result = stat_result or os.stat(path)
+        self.status_code = 200
+        self.background = None
+        self.body = b""
+        self.init_headers({
+            "accept-ranges": "bytes",
+            "etag": self.etag(self.stat_result),
+            "last-modified": formatdate(self.stat_result.st_mtime, usegmt=True),
+            "content-disposition": self.content_disposition(filename),
+            "vary": "Accept-Encoding",
+        })
+
+    @staticmethod
+    def etag(stat_result: os.stat_result) -> str:
+        return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+    @staticmethod
+    def content_disposition(filename: str) -> str:
+        quoted = quote(filename)
+        if quoted != filename:
+            return f"attachment; filename*=utf-8''{quoted}"
+        return f'attachment; filename="{filename}"'
+
+    def if_range_matches(self, if_range: Optional[str]) -> bool:
+        """A Range only applies if the client's validator still matches (weak ETags never do)."""
+        if if_range is None:
+            return True
+        return if_range in (self.headers["etag"], self.headers["last-modified"])
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        request_headers = Headers(scope=scope)
+        send_body = scope.get("method", "GET") != "HEAD"
+        zerocopy = "http.response.zerocopy" in scope.get("extensions", {})
+        size = self.stat_result.st_size
+
+        ranges = None
+        range_header = request_headers.get("range")
+        if self.encoding is not None and range_header is None:
+            await self.send_encoded(send, send_body)
+            return
+
+        if range_header is not None and self.if_range_matches(request_headers.get("if-range")):
+            try:
+                ranges = parse_range_header(range_header, size)
+            except RangeNotSatisfiable:
+                response = Response(status_code=416, headers={"content-range": f"bytes */{size}"})
+                await response(scope, receive, send)
+                return
+
+        if ranges is None:
+            parts = [(b"", 0, size)]
+        elif len(ranges) == 1:
+            start, end = ranges[0]
+            self.status_code = 206
+            self.headers["content-range"] = f"bytes {start}-{end - 1}/{size}"
+            parts = [(b"", start, end)]
+        else:
+            self.status_code = 206
+            boundary = uuid.uuid4().hex
+            self.headers["content-type"] = f"multipart/byteranges; boundary={boundary}"
+            parts = []
+            for start, end in ranges:
+                # Each part after the first begins on a new line
+                separator = "\r\n" if parts else ""
+                header = (f"{separator}--{boundary}\r\n"
+                          f"Content-Type: {self.media_type}\r\n"
+                          f"Content-Range: bytes {start}-{end - 1}/{size}\r\n\r\n")
+                parts.append((header.encode("latin-1"), start, end))
+            trailer = f"\r\n--{boundary}--\r\n".encode("latin-1")
+
+        length = sum(len(header) + end - start for header, start, end in parts)
+        if len(parts) > 1:
+            length += len(trailer)
+        self.headers["content-length"] = str(length)
+
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not send_body:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        with open(self.path, "rb") as f:
+            for header, start, end in parts:
+                if header:
+                    await send({"type": "http.response.body", "body": header, "more_body": True})
+                if zerocopy:
+                    await send({"type": "http.response.zerocopy", "file": f, "offset": start,
+                                "count": end - start, "more_body": True})
+                else:
+                    async for chunk in self.iter_segment(f, start, end):
+                        await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": trailer if len(parts) > 1 else b"", "more_body": False})
+
+    async def send_encoded(self, send: Send, send_body: bool):
+        """Send the whole file compressed; the length isn't known up front."""
+        del self.headers["content-length"]
+        self.headers["content-encoding"] = self.encoding
+        # A different representation needs its own validator
+        self.headers["etag"] = self.headers["etag"][:-1] + f'-{self.encoding}"'
+        await send({"type": "http.response.start", "status": 200, "headers": self.raw_headers})
+        if send_body:
+            with open(self.path, "rb") as f:
+                async for chunk in compress_stream(self.iter_segment(f, 0, self.stat_result.st_size), self.encoding):
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def iter_segment(self, f, start: int, end: int):
+        loop = asyncio.get_running_loop()
+        offset = start
+        while offset < end:
+            chunk = await loop.run_in_executor(None, read_at, f, offset, min(CHUNK_SIZE, end - offset))
+            if not chunk:
+                raise OSError(f"{self.path} shrank while being sent")
+            offset += len(chunk)
+            yield chunk
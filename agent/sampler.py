@@ -0,0 +1,130 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Cheap collectors are plain psutil reads that return in microseconds and run
+# directly on the event loop. Expensive ones (subprocess probes, filesystem
+# calls that can hang on network drives) run in a worker thread, unless they
+# are coroutines that already await their slow parts.
+CHEAP = "cheap"
+EXPENSIVE = "expensive"
+
+
+class Collector:
+    """A single metric source sampled on its own cadence."""
+
+    def __init__(self, name: str, collect: Callable[[], Dict[str, Any]],
+                 interval: float, cost: str = CHEAP):
+        if cost not in (CHEAP, EXPENSIVE):
+            raise ValueError(f"Unknown collector cost: {cost}")
+        self.name = name
+        self.collect = collect
+        self.interval = interval
+        self.cost = cost
+        self.collected_at: Optional[float] = None
+        self.last_duration: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.runs = 0
+        self.total_duration = 0.0
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "interval": self.interval,
+            "cost": self.cost,
+            "runs": self.runs,
+            "last_duration_ms": round(self.last_duration * 1000, 3) if self.last_duration is not None else None,
+            "avg_duration_ms": round(self.total_duration / self.runs * 1000, 3) if self.runs else None,
+            "age_seconds": round(time.time() - self.collected_at, 3) if self.collected_at else None,
+            "last_error": self.last_error,
+        }
+
+
+class CollectorScheduler:
+    """Run every collector on its own interval and merge results into one snapshot.
+
+    Each collector returns a dict of top-level snapshot keys. Request handlers
+    only read the merged snapshot, so serving a request never triggers a
+    collection.
+    """
+
+    def __init__(self):
+        self.collectors: Dict[str, Collector] = {}
+        self.data: Dict[str, Any] = {}
+        self._pending: set = set()
+        self._ready = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._listeners: List[Callable[[Collector, Dict[str, Any]], None]] = []
+
+    def add(self, collector: Collector):
+        self.collectors[collector.name] = collector
+        self._pending.add(collector.name)
+
+    def add_listener(self, listener: Callable[[Collector, Dict[str, Any]], None]):
+        """Call listener(collector, result) after every successful collection."""
+        self._listeners.append(listener)
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._run(collector))
+                for collector in self.collectors.values()
+            ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def run_once(self, collector: Collector):
+        started = time.perf_counter()
+        try:
+            if asyncio.iscoroutinefunction(collector.collect):
+                result = await collector.collect()
+            elif collector.cost == EXPENSIVE:
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(None, collector.collect)
+            else:
+                result = collector.collect()
+            self.data.update(result)
+            collector.collected_at = time.time()
+            collector.last_error = None
+            for listener in self._listeners:
+                listener(collector, result)
+        except Exception as e:
+            collector.last_error = str(e)
+            print(f"Error running collector {collector.name}: {e}")
+        finally:
+            collector.last_duration = time.perf_counter() - started
+            collector.total_duration += collector.last_duration
+            collector.runs += 1
+            # A failing collector must not hold back the first snapshot forever
+            self._pending.discard(collector.name)
+            if not self._pending:
+                self._ready.set()
+
+    async def _run(self, collector: Collector):
+        while True:
+            started = time.monotonic()
+            await self.run_once(collector)
+            elapsed = time.monotonic() - started
+            await asyncio.sleep(max(0.0, collector.interval - elapsed))
+
+    async def snapshot(self) -> Dict[str, Any]:
+        """Return the merged snapshot, waiting for the first round of collection if needed."""
+        await self._ready.wait()
+        collected = [c.collected_at for c in self.collectors.values() if c.collected_at]
+        collected_at = max(collected) if collected else None
+        return {
+            **self.data,
+            "collected_at": collected_at,
+            "snapshot_age_seconds": round(max(0.0, time.time() - collected_at), 3) if collected_at else None,
+            "collector_ages": {
+                c.name: round(time.time() - c.collected_at, 3) if c.collected_at else None
+                for c in self.collectors.values()
+            },
+        }
+
+    def info(self) -> List[Dict[str, Any]]:
+        return [collector.info() for collector in self.collectors.values()]
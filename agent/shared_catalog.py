@@ -0,0 +1,196 @@
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from blob_store import BlobStore
+from uploads import hash_file
+
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    refcount INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    file_id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    sha256 TEXT NOT NULL REFERENCES blobs (sha256),
+    size INTEGER NOT NULL,
+    owner TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_created ON files (created_at DESC, file_id);
+CREATE INDEX IF NOT EXISTS files_sha256 ON files (sha256);
+"""
+
+COLUMNS = ("file_id", "filename", "sha256", "size", "owner", "created_at")
+
+
+class SharedFileCatalog:
+    """SQLite index of shared files, keyed by file_id, over a content-addressed store.
+
+    Each file_id is a named reference to a blob; identical content is
+    stored once and a blob is deleted when its last reference goes.
+    Lookups are a primary-key read and listings page through an index.
+    rebuild() reconciles the catalog with the blob store on startup and
+    imports any `{file_id}_{filename}` files left in the shared directory.
+    """
+
+    def __init__(self, shared_dir: Path, owner: str, db_path: Optional[Path] = None):
+        self.shared_dir = shared_dir
+        self.owner = owner
+        self.store = BlobStore(shared_dir / ".blobs")
+        self.db_path = db_path or shared_dir / ".catalog.db"
+        self._db = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        if self._db.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            # Older catalogs indexed files in place; those files are still on
+            # disk and get imported by rebuild()
+            self._db.execute("DROP TABLE IF EXISTS files")
+            self._db.execute("DROP TABLE IF EXISTS blobs")
+            self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def rebuild(self) -> Dict[str, int]:
+        """Reconcile the catalog with the blob store and import loose files."""
+        imported = 0
+        with os.scandir(self.shared_dir) as entries:
+            loose = [entry for entry in entries
+                     if not entry.name.startswith(".") and entry.is_file() and "_" in entry.name]
+        for entry in loose:
+            file_id, filename = entry.name.split("_", 1)
+            if self.get(file_id) is None:
+                self.add(file_id, filename, Path(entry.path), hash_file(Path(entry.path)))
+                imported += 1
+
+        on_disk = set(self.store)
+        with self._lock:
+            self._db.execute("BEGIN")
+            known = {row[0] for row in self._db.execute("SELECT sha256 FROM blobs")}
+            missing = known - on_disk
+            for sha256 in missing:
+                self._db.execute("DELETE FROM files WHERE sha256 = ?", (sha256,))
+                self._db.execute("DELETE FROM blobs WHERE sha256 = ?", (sha256,))
+            self._db.execute(
+                "UPDATE blobs SET refcount = (SELECT COUNT(*) FROM files WHERE files.sha256 = blobs.sha256)"
+            )
+            orphans = [row[0] for row in self._db.execute("SELECT sha256 FROM blobs WHERE refcount = 0")]
+            # Blobs stored just before a crash, never committed to the catalog
+            orphans += list(on_disk - known)
+            self._db.execute("DELETE FROM blobs WHERE refcount = 0")
+            self._db.execute("COMMIT")
+        for sha256 in orphans:
+            self.store.delete(sha256)
+        return {"files": self.count(), "imported": imported, "missing_blobs": len(missing), "orphans": len(orphans)}
+
+    def add(self, file_id: str, filename: str, source: Path, sha256: str) -> Dict[str, Any]:
+        """Register a hashed file, moving it into the store or dropping it as a duplicate."""
+        size = os.stat(source).st_size
+        row = (file_id, filename, sha256, size, self.owner, time.time())
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                if self._db.execute("UPDATE blobs SET refcount = refcount + 1 WHERE sha256 = ?", (sha256,)).rowcount:
+                    os.unlink(source)
+                else:
+                    self.store.put(source, sha256)
+                    self._db.execute("INSERT INTO blobs VALUES (?, ?, 1)", (sha256, size))
+                self._db.execute("INSERT INTO files VALUES (?, ?, ?, ?, ?, ?)", row)
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+        return dict(zip(COLUMNS, row))
+
+    def link(self, file_id: str, filename: str, sha256: str) -> Optional[Dict[str, Any]]:
+        """Share content the agent already holds under a new file_id, None if it doesn't."""
+        with self._lock:
+            self._db.execute("BEGIN")
+            blob = self._db.execute("SELECT size FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+            if blob is None:
+                self._db.execute("ROLLBACK")
+                return None
+            row = (file_id, filename, sha256, blob["size"], self.owner, time.time())
+            self._db.execute("UPDATE blobs SET refcount = refcount + 1 WHERE sha256 = ?", (sha256,))
+            self._db.execute("INSERT INTO files VALUES (?, ?, ?, ?, ?, ?)", row)
+            self._db.execute("COMMIT")
+        return dict(zip(COLUMNS, row))
+
+    def has_blob(self, sha256: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def get(self, file_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM files WHERE file_id = ?", (file_id,)).fetchone()
+        if row is None:
+            return None
+        return {**dict(row), "path": str(self.store.path(row["sha256"]))}
+
+    def remove(self, file_id: str) -> bool:
+        """Drop a reference, deleting the blob when it was the last one."""
+        with self._lock:
+            self._db.execute("BEGIN")
+            row = self._db.execute("SELECT sha256 FROM files WHERE file_id = ?", (file_id,)).fetchone()
+            if row is None:
+                self._db.execute("ROLLBACK")
+                return False
+            sha256 = row["sha256"]
+            self._db.execute("DELETE FROM files WHERE file_id = ?", (file_id,))
+            self._db.execute("UPDATE blobs SET refcount = refcount - 1 WHERE sha256 = ?", (sha256,))
+            unreferenced = self._db.execute(
+                "DELETE FROM blobs WHERE sha256 = ? AND refcount <= 0", (sha256,)
+            ).rowcount
+            self._db.execute("COMMIT")
+            if unreferenced:
+                # Under the lock, so a concurrent add() can't revive it meanwhile
+                self.store.delete(sha256)
+        return True
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            files, logical = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files").fetchone()
+            blobs, stored = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        return {
+            "files": files,
+            "blobs": blobs,
+            "logical_bytes": logical,
+            "stored_bytes": stored,
+            "saved_bytes": logical - stored,
+        }
+
+    def list(self, cursor: Optional[str] = None, limit: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Newest first. The cursor is the (created_at, file_id) of the last row seen."""
+        query = "SELECT * FROM files"
+        params: list = []
+        if cursor:
+            created_at, file_id = cursor.split("|", 1)
+            query += " WHERE (created_at < ?) OR (created_at = ? AND file_id > ?)"
+            params += [float(created_at), float(created_at), file_id]
+        query += " ORDER BY created_at DESC, file_id"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit + 1)
+        with self._lock:
+            rows = [dict(row) for row in self._db.execute(query, params)]
+        if limit is None or len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, f"{rows[-1]['created_at']!r}|{rows[-1]['file_id']}"
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,143 @@
+import glob
+import os
+import re
+import time
+from typing import Dict, List, Optional
+
+
+def _read_text(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except (OSError, ValueError):
+        return None
+
+
+def _sensor_base(path: str) -> str:
+    """/sys/class/hwmon/hwmon0/temp1_input -> /sys/class/hwmon/hwmon0/temp1"""
+    directory, filename = os.path.split(path)
+    return os.path.join(directory, filename.split('_')[0])
+
+
+def _read_millidegrees(path: str) -> Optional[float]:
+    value = _read_text(path)
+    try:
+        return float(value) / 1000.0 if value is not None else None
+    except ValueError:
+        return None
+
+
+class SensorInput:
+    """An open *_input (or thermal_zone temp) file plus its static metadata."""
+
+    def __init__(self, unit: str, label: str, path: str, high: Optional[float], critical: Optional[float]):
+        self.unit = unit
+        self.label = label
+        self.path = path
+        self.high = high
+        self.critical = critical
+        self.fd = os.open(path, os.O_RDONLY)
+
+    def read(self) -> float:
+        # sysfs regenerates the value on every read from offset 0
+        return int(os.pread(self.fd, 32, 0)) / 1000.0
+
+    def close(self):
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+class HwmonReader:
+    """Linux temperature fast path reading /sys/class/hwmon directly.
+
+    Discovery (globbing hwmon directories, reading names, labels and
+    thresholds) happens once; afterwards each read is one pread() per sensor
+    on a file descriptor kept open. Sensor naming matches
+    psutil.sensors_temperatures(), including its thermal_zone fallback when
+    no hwmon sensors exist, so results are interchangeable with the psutil path.
+    """
+
+    def __init__(self, root: str = "/sys", rediscover_interval: float = 300.0):
+        self.root = root
+        self.rediscover_interval = rediscover_interval
+        self.inputs: List[SensorInput] = []
+        self._discovered_at: Optional[float] = None
+
+    def discover(self):
+        self.close()
+        basenames = glob.glob(f'{self.root}/class/hwmon/hwmon*/temp*_*')
+        # CentOS has an intermediate /device directory
+        basenames.extend(glob.glob(f'{self.root}/class/hwmon/hwmon*/device/temp*_*'))
+        basenames = sorted({_sensor_base(x) for x in basenames})
+
+        # Only add the coretemp hwmon entries if they're not already in /sys/class/hwmon/
+        repl = re.compile(rf"{re.escape(self.root)}/devices/platform/coretemp.*/hwmon/")
+        coretemp = glob.glob(f'{self.root}/devices/platform/coretemp.*/hwmon/hwmon*/temp*_*')
+        for base in sorted({_sensor_base(x) for x in coretemp}):
+            if repl.sub(f'{self.root}/class/hwmon/', base) not in basenames:
+                basenames.append(base)
+
+        for base in basenames:
+            unit = _read_text(os.path.join(os.path.dirname(base), 'name'))
+            if unit is None or _read_millidegrees(base + '_input') is None:
+                continue
+            self._add(unit, _read_text(base + '_label') or '', base + '_input',
+                      _read_millidegrees(base + '_max'), _read_millidegrees(base + '_crit'))
+
+        # Indication that no sensors were detected in /sys/class/hwmon/
+        if not basenames:
+            for base in sorted(set(glob.glob(f'{self.root}/class/thermal/thermal_zone*'))):
+                unit = _read_text(os.path.join(base, 'type'))
+                if unit is None or _read_millidegrees(os.path.join(base, 'temp')) is None:
+                    continue
+                high = critical = None
+                for type_path in glob.glob(os.path.join(base, 'trip_point_*_type')):
+                    trip_type = _read_text(type_path)
+                    trip_temp = _read_millidegrees(type_path[:-len('_type')] + '_temp')
+                    if trip_type == 'critical':
+                        critical = trip_temp
+                    elif trip_type == 'high':
+                        high = trip_temp
+                self._add(unit, '', os.path.join(base, 'temp'), high, critical)
+
+        self._discovered_at = time.monotonic()
+
+    def _add(self, unit: str, label: str, path: str, high: Optional[float], critical: Optional[float]):
+        try:
+            self.inputs.append(SensorInput(unit, label, path, high, critical))
+        except OSError:
+            pass
+
+    def read(self) -> Dict[str, dict]:
+        """Read every sensor, in the same shape as read_psutil_temperatures()."""
+        if self._discovered_at is None or time.monotonic() - self._discovered_at > self.rediscover_interval:
+            self.discover()
+
+        temperatures = {}
+        unit_index: Dict[str, int] = {}
+        stale = False
+        for sensor in self.inputs:
+            i = unit_index.get(sensor.unit, 0)
+            unit_index[sensor.unit] = i + 1
+            try:
+                current = sensor.read()
+            except (OSError, ValueError):
+                # The device went away (hot-unplug, driver reload)
+                stale = True
+                continue
+            temp_name = f"{sensor.unit}_{sensor.label}" if sensor.label else f"{sensor.unit}_{i}"
+            temperatures[temp_name] = {
+                'current': current,
+                'high': sensor.high if sensor.high else None,
+                'critical': sensor.critical if sensor.critical else None
+            }
+        if stale:
+            self._discovered_at = None
+        return temperatures
+
+    def close(self):
+        for sensor in self.inputs:
+            sensor.close()
+        self.inputs = []
@@ -0,0 +1,334 @@
+import asyncio
+import os
+import shutil
+import stat
+import tarfile
+import tempfile
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+CHUNK_SIZE = 1024 * 1024
+# tarfile's stream mode joins its 10 KiB reads into each read we ask for;
+# past ~64 KiB that copying costs more than the calls it saves
+EXTRACT_READ_SIZE = 64 * 1024
+
+BLOCK = tarfile.BLOCKSIZE
+RECORD = tarfile.RECORDSIZE
+
+
+def tree_size(root: str) -> int:
+    """Total size of the regular files under root, without following symlinks."""
+    total = 0
+    stack = [root]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            total += entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return total
+
+
+def _walk(path: str, arcname: str) -> Iterator[tuple]:
+    """(path, arcname, lstat) for path and everything below it, parents first."""
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return
+    yield path, arcname, st
+    if stat.S_ISDIR(st.st_mode):
+        try:
+            with os.scandir(path) as entries:
+                names = sorted(entry.name for entry in entries)
+        except OSError:
+            return
+        for name in names:
+            yield from _walk(os.path.join(path, name), f"{arcname}/{name}")
+
+
+def iter_tar(root: str, arcname: Optional[str] = None, chunk_size: int = CHUNK_SIZE,
+             progress: Optional[Callable[[int], None]] = None) -> Iterator[bytes]:
+    """Generate a PAX tar archive of a directory tree as it is read.
+
+    Headers come from tarfile and file data is copied in chunk_size reads,
+    so memory stays at one chunk whatever the tree holds and nothing is
+    written to disk. Symlinks are stored as links; sockets, devices and
+    unreadable entries are skipped. Hard-linked files are sent in full each
+    time rather than as links, so no inode table grows with the tree. A
+    file that changes size while being read is cut or zero-padded to the
+    size in its header. progress, if
+    given, is called with the number of file bytes sent.
+    """
+    if arcname is None:
+        arcname = os.path.basename(os.path.normpath(root)) or "root"
+    archive = tarfile.TarFile(fileobj=_NullWriter(), mode="w", format=tarfile.PAX_FORMAT)
+    total = 0
+    for path, name, st in _walk(root, arcname):
+        if not (stat.S_ISREG(st.st_mode) or stat.S_ISDIR(st.st_mode) or stat.S_ISLNK(st.st_mode)):
+            continue
+        try:
+            info = archive.gettarinfo(path, name)
+        except OSError:
+            continue
+        finally:
+            # gettarinfo remembers every inode to turn later hard links into LNKTYPE
+            archive.inodes.clear()
+        if not info.isreg():
+            header = info.tobuf(archive.format, archive.encoding, archive.errors)
+            total += len(header)
+            yield header
+            continue
+        try:
+            f = open(path, "rb")
+        except OSError:
+            continue
+        with f:
+            header = info.tobuf(archive.format, archive.encoding, archive.errors)
+            total += len(header)
+            yield header
+            remaining = info.size
+            while remaining > 0:
+                data = f.read(min(chunk_size, remaining))
+                if not data:
+                    # Shrunk since stat, keep the archive consistent with the header
+                    data = bytes(min(chunk_size, remaining))
+                remaining -= len(data)
+                total += len(data)
+                if progress is not None:
+                    progress(len(data))
+                yield data
+        padding = -info.size % BLOCK
+        if padding:
+            total += padding
+            yield bytes(padding)
+    # Two zero blocks end the archive, then pad to a full record as tar does
+    end = 2 * BLOCK
+    yield bytes(end + -(total + end) % RECORD)
+
+
+class _NullWriter:
+    """tarfile insists on a file object even though only its header encoding is used."""
+
+    def write(self, data: bytes):
+        pass
+
+    def tell(self) -> int:
+        return 0
+
+
+class _StreamReader:
+    """Blocking file-like view of an async byte stream, for tarfile running in a worker thread.
+
+    Each read pulls the next chunks from the event loop, batched up to
+    about batch_size bytes to save thread hand-offs, so only that much is
+    held in memory.
+    """
+
+    def __init__(self, chunks: AsyncIterator[bytes], loop: asyncio.AbstractEventLoop, batch_size: int = 256 * 1024):
+        self._chunks = chunks.__aiter__()
+        self._loop = loop
+        self._batch_size = batch_size
+        self._chunk = b""
+        self._pos = 0
+        self._eof = False
+
+    async def _pull(self) -> bytes:
+        parts = []
+        size = 0
+        while size < self._batch_size:
+            try:
+                chunk = await self._chunks.__anext__()
+            except StopAsyncIteration:
+                self._eof = True
+                break
+            parts.append(chunk)
+            size += len(chunk)
+        return b"".join(parts)
+
+    def _next(self) -> bool:
+        if self._eof:
+            return False
+        self._chunk = asyncio.run_coroutine_threadsafe(self._pull(), self._loop).result()
+        self._pos = 0
+        return bool(self._chunk)
+
+    def read(self, size: int = -1) -> bytes:
+        # tarfile reads in small pieces; slice the current chunk rather than
+        # re-buffering it on every call
+        parts = []
+        while size != 0:
+            if self._pos >= len(self._chunk) and not self._next():
+                break
+            end = len(self._chunk) if size < 0 else min(len(self._chunk), self._pos + size)
+            parts.append(self._chunk[self._pos:end])
+            if size > 0:
+                size -= end - self._pos
+            self._pos = end
+        return b"".join(parts)
+
+
+def _inside(root: str, path: str) -> bool:
+    return path == root or path.startswith(root + os.sep)
+
+
+class TarExtractor:
+    """Extract a tar stream (read sequentially, "r|" mode) under a destination directory.
+
+    Only directories, regular files, symlinks and hard links (to files
+    already extracted) are created. Members with absolute paths or `..`
+    components, links pointing outside the destination, and anything that
+    would be written through such a link are skipped and reported. Files are written to a temporary name and
+    renamed into place when complete, with permission bits masked to
+    0o777 (no setuid/setgid).
+    """
+
+    def __init__(self, destination: str, chunk_size: int = EXTRACT_READ_SIZE):
+        self.destination = os.path.realpath(destination)
+        self.chunk_size = chunk_size
+        self.files = 0
+        self.directories = 0
+        self.symlinks = 0
+        self.bytes = 0
+        self.skipped: List[Dict[str, str]] = []
+
+    def _target(self, name: str) -> Optional[str]:
+        parts = name.replace("\\", "/").split("/")
+        if name.startswith(("/", "\\")) or ".." in parts or (parts[0].endswith(":") and os.name == "nt"):
+            return None
+        parts = [part for part in parts if part not in ("", ".")]
+        if not parts:
+            return self.destination
+        path = os.path.join(self.destination, *parts)
+        # Resolve the parent so a symlink extracted earlier can't redirect a write
+        if not _inside(self.destination, os.path.realpath(os.path.dirname(path))):
+            return None
+        return path
+
+    def _skip(self, member: tarfile.TarInfo, reason: str):
+        self.skipped.append({"name": member.name, "reason": reason})
+
+    def extract(self, fileobj) -> Dict[str, Any]:
+        """Extract everything read from fileobj; blocking, run it in an executor."""
+        os.makedirs(self.destination, exist_ok=True)
+        directories = []
+        with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+            while True:
+                member = archive.next()
+                if member is None:
+                    break
+                # tarfile keeps every member it read; a large tree shouldn't grow memory
+                archive.members.clear()
+                path = self._target(member.name)
+                if path is None:
+                    self._skip(member, "path outside destination")
+                elif member.isdir():
+                    if os.path.islink(path) or (os.path.lexists(path) and not os.path.isdir(path)):
+                        self._skip(member, "not a directory on disk")
+                        continue
+                    os.makedirs(path, exist_ok=True)
+                    directories.append((path, member))
+                    self.directories += 1
+                elif member.isreg():
+                    self._extract_file(archive, member, path)
+                elif member.issym():
+                    target = os.path.realpath(os.path.join(os.path.realpath(os.path.dirname(path)), member.linkname))
+                    if os.path.isabs(member.linkname) or not _inside(self.destination, target):
+                        self._skip(member, "link outside destination")
+                        continue
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    if os.path.lexists(path):
+                        if os.path.isdir(path) and not os.path.islink(path):
+                            self._skip(member, "directory on disk")
+                            continue
+                        os.unlink(path)
+                    os.symlink(member.linkname, path)
+                    self.symlinks += 1
+                elif member.islnk():
+                    self._extract_hardlink(member, path)
+                else:
+                    self._skip(member, "unsupported member type")
+        # Directory times last, since extracting into them changes their mtime
+        for path, member in reversed(directories):
+            try:
+                os.chmod(path, (member.mode & 0o777) | 0o700)
+                os.utime(path, (member.mtime, member.mtime))
+            except OSError:
+                pass
+        return self.summary()
+
+    def _extract_file(self, archive: tarfile.TarFile, member: tarfile.TarInfo, path: str):
+        if os.path.isdir(path) and not os.path.islink(path):
+            self._skip(member, "directory on disk")
+            return
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        source = archive.extractfile(member)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".extract-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for block in iter(lambda: source.read(self.chunk_size), b""):
+                    f.write(block)
+                    self.bytes += len(block)
+            os.chmod(temp_path, member.mode & 0o777)
+            os.utime(temp_path, (member.mtime, member.mtime))
+            # Replaces a symlink at path itself rather than writing through it
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        self.files += 1
+
+    def _extract_hardlink(self, member: tarfile.TarInfo, path: str):
+        # The link names an earlier member, checked like any other path
+        source = self._target(member.linkname)
+        if source is None or os.path.islink(source) or not os.path.isfile(source) \
+                or not _inside(self.destination, os.path.realpath(source)):
+            self._skip(member, "link outside destination")
+            return
+        if os.path.isdir(path) and not os.path.islink(path):
+            self._skip(member, "directory on disk")
+            return
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        temp_path = os.path.join(directory, f".extract-{os.urandom(6).hex()}")
+        try:
+            try:
+                os.link(source, temp_path)
+            except OSError:
+                # No hard links on this filesystem
+                shutil.copy2(source, temp_path)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        self.files += 1
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "path": self.destination,
+            "files": self.files,
+            "directories": self.directories,
+            "symlinks": self.symlinks,
+            "bytes": self.bytes,
+            "skipped": self.skipped,
+        }
+
+
+async def extract_stream(chunks: AsyncIterator[bytes], destination: str,
+                         chunk_size: int = EXTRACT_READ_SIZE) -> Dict[str, Any]:
+    """Extract a tar stream while it arrives; tarfile runs in the default executor."""
+    loop = asyncio.get_running_loop()
+    extractor = TarExtractor(destination, chunk_size)
+    return await loop.run_in_executor(None, extractor.extract, _StreamReader(chunks, loop))
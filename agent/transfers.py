@@ -0,0 +1,303 @@
+import asyncio
+import hashlib
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import aiofiles
+import httpx
+from starlette.concurrency import iterate_in_threadpool
+
+from compression import choose_encoding, compress_bytes, compress_stream
+from range_response import read_at
+from tar_stream import iter_tar
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class Transfer:
+    """Progress of one file being sent to another agent."""
+
+    def __init__(self, source_path: str, filename: str, size: int, target_agent_id: str, target_url: str):
+        self.transfer_id = str(uuid.uuid4())
+        self.source_path = source_path
+        self.filename = filename
+        self.size = size
+        self.target_agent_id = target_agent_id
+        self.target_url = target_url
+        self.status = "pending"
+        self.sent = 0
+        # Bytes on the wire, smaller than sent when compressed
+        self.wire_bytes = 0
+        self.encoding: Optional[str] = None
+        self.retries = 0
+        self.error: Optional[str] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def info(self) -> Dict[str, Any]:
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            "transfer_id": self.transfer_id,
+            "source_path": self.source_path,
+            "filename": self.filename,
+            "target_agent_id": self.target_agent_id,
+            "status": self.status,
+            "size": self.size,
+            "sent": self.sent,
+            "wire_bytes": self.wire_bytes,
+            "encoding": self.encoding,
+            "progress": round(self.sent / self.size, 4) if self.size else 1.0,
+            "bytes_per_sec": round(self.sent / elapsed) if elapsed else None,
+            "retries": self.retries,
+            "error": self.error,
+            "result": self.result,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class TransferRegistry:
+    """Transfers started by this agent, keeping the most recent finished ones."""
+
+    def __init__(self, keep: int = 100):
+        self.keep = keep
+        self._transfers: "OrderedDict[str, Transfer]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def start(self, transfer: Transfer, run) -> Transfer:
+        """Register a transfer and run `run(transfer)` in the background."""
+        self._transfers[transfer.transfer_id] = transfer
+        task = asyncio.ensure_future(self._run(transfer, run))
+        self._tasks[transfer.transfer_id] = task
+        self._trim()
+        return transfer
+
+    async def _run(self, transfer: Transfer, run):
+        transfer.status = "running"
+        transfer.started_at = time.time()
+        try:
+            transfer.result = await run(transfer)
+            transfer.status = "completed"
+        except asyncio.CancelledError:
+            transfer.status = "cancelled"
+            raise
+        except Exception as e:
+            transfer.status = "failed"
+            transfer.error = str(e) or type(e).__name__
+        finally:
+            transfer.finished_at = time.time()
+            self._tasks.pop(transfer.transfer_id, None)
+
+    def _trim(self):
+        finished = [tid for tid, t in self._transfers.items() if tid not in self._tasks]
+        for transfer_id in finished[:max(0, len(finished) - self.keep)]:
+            del self._transfers[transfer_id]
+
+    def get(self, transfer_id: str) -> Optional[Transfer]:
+        return self._transfers.get(transfer_id)
+
+    def list(self) -> List[Transfer]:
+        return list(self._transfers.values())
+
+    async def stop(self):
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+
+async def read_chunks(path: str, offset: int, sha256, transfer: Transfer,
+                      chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Yield a file from offset, hashing and counting each chunk once it has been sent.
+
+    httpx pulls the next chunk only after writing the previous one to the
+    socket, so a slow receiver slows reading down and memory stays at one
+    chunk.
+    """
+    loop = asyncio.get_running_loop()
+    async with aiofiles.open(path, "rb") as f:
+        await f.seek(offset)
+        while True:
+            chunk = await f.read(chunk_size)
+            if not chunk:
+                break
+            await loop.run_in_executor(None, sha256.update, chunk)
+            yield chunk
+            transfer.sent += len(chunk)
+
+
+async def count_bytes(chunks: AsyncIterator[bytes], transfer: Transfer) -> AsyncIterator[bytes]:
+    async for chunk in chunks:
+        transfer.wire_bytes += len(chunk)
+        yield chunk
+
+
+def hash_prefix(path: str, length: int, chunk_size: int = CHUNK_SIZE):
+    """SHA-256 state over the first length bytes of a file, to resume hashing from there."""
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        while length > 0:
+            block = f.read(min(chunk_size, length))
+            if not block:
+                break
+            sha256.update(block)
+            length -= len(block)
+    return sha256
+
+
+async def send_file(client: httpx.AsyncClient, transfer: Transfer, retries: int = 5,
+                    chunk_size: int = CHUNK_SIZE, compress: bool = False) -> Dict[str, Any]:
+    """Stream a file into the target agent's resumable upload endpoint.
+
+    A dropped connection resumes at the offset the target reports, the
+    hash being rebuilt up to that point; the target verifies size and
+    SHA-256 on completion. With compress, each PUT body is compressed
+    with the best coding the target accepts.
+    """
+    base = transfer.target_url
+    response = await client.post(f"{base}/api/uploads", json={"filename": transfer.filename, "size": transfer.size})
+    response.raise_for_status()
+    upload = response.json()
+    upload_url = f"{base}/api/uploads/{upload['upload_id']}"
+    transfer.encoding = choose_encoding(upload.get("encodings")) if compress else None
+
+    loop = asyncio.get_running_loop()
+    offset = 0
+    sha256 = hashlib.sha256()
+    for attempt in range(retries + 1):
+        try:
+            body = read_chunks(transfer.source_path, offset, sha256, transfer, chunk_size)
+            headers = {}
+            if transfer.encoding:
+                # Every PUT is a complete compressed stream of its own
+                body = compress_stream(body, transfer.encoding)
+                headers["Content-Encoding"] = transfer.encoding
+            response = await client.put(upload_url, params={"offset": offset}, headers=headers,
+                                        content=count_bytes(body, transfer))
+            response.raise_for_status()
+            break
+        except (httpx.TransportError, httpx.HTTPStatusError) as e:
+            if (isinstance(e, httpx.HTTPStatusError) and e.response.status_code != 409) or attempt == retries:
+                raise
+            transfer.retries += 1
+            await asyncio.sleep(min(2 ** attempt, 30))
+            response = await client.get(upload_url)
+            response.raise_for_status()
+            offset = response.json()["offset"]
+            sha256 = await loop.run_in_executor(None, hash_prefix, transfer.source_path, offset)
+            transfer.sent = offset
+
+    response = await client.post(f"{upload_url}/complete", json={"sha256": sha256.hexdigest()})
+    response.raise_for_status()
+    return response.json()
+
+
+def read_chunk(f, offset: int, length: int, encoding: Optional[str]):
+    """Read a chunk, returning the body to send and the SHA-256 of the raw bytes."""
+    data = read_at(f, offset, length)
+    digest = hashlib.sha256(data).hexdigest()
+    return (compress_bytes(data, encoding) if encoding else data), digest
+
+
+async def send_file_parallel(client: httpx.AsyncClient, transfer: Transfer, streams: int = 4,
+                             chunk_size: int = 8 * 1024 * 1024, retries: int = 5,
+                             compress: bool = False) -> Dict[str, Any]:
+    """Send a file as chunk_size ranges over `streams` concurrent connections.
+
+    The target writes each chunk at its offset and checks it against the
+    SHA-256 sent along; a failed chunk is retried on its own. Once every
+    chunk is through, a whole-file SHA-256 is taken in one sequential pass
+    and checked when the upload completes, so a failed transfer doesn't
+    also read the file a second time. Every stream reads through its own file object,
+    since read_at falls back to seek+read where pread is missing. Memory
+    is bounded by streams * chunk_size. With compress, chunks are compressed
+    independently, in the executor, so streams also compress in parallel.
+    """
+    base = transfer.target_url
+    response = await client.post(f"{base}/api/uploads", json={
+        "filename": transfer.filename, "size": transfer.size, "chunk_size": chunk_size
+    })
+    response.raise_for_status()
+    upload = response.json()
+    upload_url = f"{base}/api/uploads/{upload['upload_id']}"
+    transfer.encoding = choose_encoding(upload.get("encodings")) if compress else None
+    headers = {"Content-Encoding": transfer.encoding} if transfer.encoding else {}
+    pending = asyncio.Queue()
+    for index in range(upload["chunks"]):
+        pending.put_nowait(index)
+
+    loop = asyncio.get_running_loop()
+
+    async def send_chunks():
+        with open(transfer.source_path, "rb") as f:
+            await send_chunks_from(f)
+
+    async def send_chunks_from(f):
+        while not pending.empty():
+            index = pending.get_nowait()
+            offset = index * chunk_size
+            length = min(chunk_size, transfer.size - offset)
+            for attempt in range(retries + 1):
+                data, digest = await loop.run_in_executor(None, read_chunk, f, offset, length, transfer.encoding)
+                try:
+                    response = await client.put(f"{upload_url}/chunks/{index}", content=data,
+                                                headers={**headers, "X-Chunk-SHA256": digest})
+                    response.raise_for_status()
+                    break
+                except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                    # 400 is a short or corrupted chunk, worth sending again
+                    retryable = not isinstance(e, httpx.HTTPStatusError) or e.response.status_code in (400, 500, 502, 503, 504)
+                    if not retryable or attempt == retries:
+                        raise
+                    transfer.retries += 1
+                    await asyncio.sleep(min(2 ** attempt, 30))
+            transfer.sent += length
+            transfer.wire_bytes += len(data)
+
+    tasks = [asyncio.ensure_future(send_chunks()) for _ in range(min(streams, upload["chunks"]))]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    sha256 = await loop.run_in_executor(None, hash_prefix, transfer.source_path, transfer.size)
+
+    response = await client.post(f"{upload_url}/complete", json={"sha256": sha256.hexdigest()})
+    response.raise_for_status()
+    return response.json()
+
+
+async def send_directory(client: httpx.AsyncClient, transfer: Transfer, encoding: Optional[str] = None) -> Dict[str, Any]:
+    """Stream a directory tree as tar into the target agent's /api/archive endpoint.
+
+    The archive is generated while it is sent and extracted while it
+    arrives, so neither side holds more than a chunk. A tar stream can't
+    resume; a failed transfer is started again.
+    """
+    def progress(n: int):
+        transfer.sent += n
+
+    while True:
+        headers = {"Content-Type": "application/x-tar"}
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        transfer.encoding = encoding
+        body = iterate_in_threadpool(iter_tar(transfer.source_path, progress=progress))
+        if encoding:
+            body = compress_stream(body, encoding)
+        response = await client.put(f"{transfer.target_url}/api/archive", params={"path": transfer.filename},
+                                    headers=headers, content=count_bytes(body, transfer))
+        if response.status_code == 415 and encoding:
+            # The target can't decode it (no zstandard there); nothing was extracted yet
+            encoding = None
+            transfer.sent = transfer.wire_bytes = 0
+            continue
+        response.raise_for_status()
+        return response.json()
@@ -0,0 +1,314 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Optional, Tuple
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def safe_filename(filename: str) -> str:
+    """Strip any directory part a client put in the filename."""
+    name = Path(filename.replace("\\", "/")).name
+    return name or "upload"
+
+
+class OffsetMismatch(Exception):
+    """A chunk was sent for an offset other than where the upload stands."""
+
+    def __init__(self, offset: int):
+        super().__init__(f"Upload is at offset {offset}")
+        self.offset = offset
+
+
+def hash_state(path: Path, chunk_size: int = CHUNK_SIZE) -> Tuple[Any, int]:
+    """A SHA-256 object fed a file's contents, to keep appending to, and the length hashed."""
+    sha256 = hashlib.sha256()
+    length = 0
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            sha256.update(block)
+            length += len(block)
+    return sha256, length
+
+
+def hash_file(path: Path, chunk_size: int = CHUNK_SIZE) -> str:
+    return hash_state(path, chunk_size)[0].hexdigest()
+
+
+class UploadSession:
+    """A partially uploaded file: <dir>/<id>.part plus <id>.json metadata.
+
+    Sequential sessions are appended to at `offset` and keep the hash
+    incrementally; after an agent restart it is rebuilt once from the part
+    file, off the event loop. Chunked sessions (created with a chunk_size) accept fixed-size
+    chunks in any order, possibly concurrently, and track which arrived.
+    """
+
+    def __init__(self, upload_id: str, filename: str, size: Optional[int], part_path: Path, created_at: float,
+                 chunk_size: Optional[int] = None, received: Iterable[int] = ()):
+        self.upload_id = upload_id
+        self.filename = filename
+        self.size = size
+        self.part_path = part_path
+        self.created_at = created_at
+        self.updated_at = created_at
+        self.offset = 0
+        self.sha256 = hashlib.sha256()
+        self.lock = asyncio.Lock()
+        self.chunk_size = chunk_size
+        self.received = set(received)
+
+    @property
+    def chunk_count(self) -> int:
+        return -(-self.size // self.chunk_size) if self.chunk_size else 0
+
+    def chunk_length(self, index: int) -> int:
+        return min(self.chunk_size, self.size - index * self.chunk_size)
+
+    def meta(self) -> Dict[str, Any]:
+        meta = {"filename": self.filename, "size": self.size, "created_at": self.created_at}
+        if self.chunk_size:
+            meta.update(chunk_size=self.chunk_size, received=sorted(self.received))
+        return meta
+
+    def info(self) -> Dict[str, Any]:
+        info = {
+            "upload_id": self.upload_id,
+            "filename": self.filename,
+            "size": self.size,
+            "offset": self.offset,
+            "chunk_size": self.chunk_size or CHUNK_SIZE,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+        if self.chunk_size:
+            info["offset"] = sum(self.chunk_length(index) for index in self.received)
+            info["chunks"] = self.chunk_count
+            info["missing_chunks"] = [i for i in range(self.chunk_count) if i not in self.received]
+        return info
+
+
+class OffsetWriter:
+    """File-like writer for one region of a file, so concurrent chunks don't share a position."""
+
+    def __init__(self, fd: int, offset: int):
+        self.fd = fd
+        self.offset = offset
+
+    def write(self, data: bytes):
+        if hasattr(os, "pwrite"):
+            written = os.pwrite(self.fd, data, self.offset)
+        else:
+            os.lseek(self.fd, self.offset, os.SEEK_SET)
+            written = os.write(self.fd, data)
+        if written != len(data):
+            raise OSError(f"Short write at offset {self.offset}")
+        self.offset += written
+
+    def flush(self):
+        pass
+
+
+async def limit_stream(chunks: AsyncIterator[bytes], limit: int) -> AsyncIterator[bytes]:
+    """Pass a byte stream through, failing before it exceeds limit bytes."""
+    total = 0
+    async for chunk in chunks:
+        total += len(chunk)
+        if total > limit:
+            raise ValueError(f"Body is longer than the {limit} bytes expected")
+        yield chunk
+
+
+async def write_stream(f, chunks: AsyncIterator[bytes], sha256, chunk_size: int = CHUNK_SIZE) -> int:
+    """Write an async byte stream to f in chunk_size writes, hashing as it goes.
+
+    At most one chunk is held in memory. Writing and hashing happen in the
+    default executor (hashlib releases the GIL for large buffers). Returns
+    the number of bytes written; on error everything written so far is
+    flushed, so the caller can tell how far it got.
+    """
+    loop = asyncio.get_running_loop()
+    buffer = bytearray()
+    written = 0
+
+    def flush(data: bytes):
+        f.write(data)
+        sha256.update(data)
+
+    try:
+        async for chunk in chunks:
+            buffer += chunk
+            if len(buffer) >= chunk_size:
+                data = bytes(buffer)
+                buffer.clear()
+                await loop.run_in_executor(None, flush, data)
+                written += len(data)
+    finally:
+        if buffer:
+            await loop.run_in_executor(None, flush, bytes(buffer))
+            written += len(buffer)
+        await loop.run_in_executor(None, f.flush)
+    return written
+
+
+class UploadManager:
+    """Resumable uploads into the shared files directory.
+
+    A client creates a session, sends the body in one or more PUTs at the
+    session's current offset, and completes it. An interrupted PUT keeps
+    every byte that reached the disk; the client asks for the offset and
+    continues from there. Completed files are handed to
+    commit(file_id, filename, path, sha256), which takes ownership of them.
+    """
+
+    def __init__(self, shared_dir: Path, commit: Callable[[str, str, Path, str], Dict[str, Any]],
+                 session_ttl: float = 86400.0):
+        self.commit = commit
+        self.directory = shared_dir / ".uploads"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.session_ttl = session_ttl
+        self._sessions: Dict[str, UploadSession] = {}
+
+    def create(self, filename: str, size: Optional[int] = None, chunk_size: Optional[int] = None) -> UploadSession:
+        """Start a session; with chunk_size, the file is received as independent chunks."""
+        if chunk_size is not None and (size is None or chunk_size <= 0):
+            raise ValueError("Chunked uploads need a size and a positive chunk_size")
+        self.expire()
+        upload_id = str(uuid.uuid4())
+        session = UploadSession(upload_id, safe_filename(filename), size,
+                                self.directory / f"{upload_id}.part", time.time(), chunk_size)
+        with open(session.part_path, "wb") as f:
+            if chunk_size:
+                # Sparse where supported; chunks are written into place
+                f.truncate(size)
+        self._save_meta(session)
+        self._sessions[upload_id] = session
+        return session
+
+    def _save_meta(self, session: UploadSession):
+        meta_path = self.directory / f"{session.upload_id}.json"
+        temp_path = meta_path.with_suffix(".json.tmp")
+        temp_path.write_text(json.dumps(session.meta()))
+        os.replace(temp_path, meta_path)
+
+    async def get(self, upload_id: str) -> UploadSession:
+        """Return a session, reloading it from disk after an agent restart."""
+        session = self._sessions.get(upload_id)
+        if session is not None:
+            return session
+        try:
+            uuid.UUID(upload_id)
+        except ValueError:
+            raise KeyError(upload_id)
+        meta_path = self.directory / f"{upload_id}.json"
+        part_path = self.directory / f"{upload_id}.part"
+        if not meta_path.is_file() or not part_path.is_file():
+            raise KeyError(upload_id)
+        meta = json.loads(meta_path.read_text())
+        session = UploadSession(upload_id, meta["filename"], meta.get("size"), part_path, meta["created_at"],
+                                meta.get("chunk_size"), meta.get("received", ()))
+        if not session.chunk_size:
+            # Rehashing a large part file takes a while, so keep it off the event loop
+            loop = asyncio.get_running_loop()
+            session.sha256, session.offset = await loop.run_in_executor(None, hash_state, part_path)
+        session.updated_at = part_path.stat().st_mtime
+        # Another request may have reloaded it meanwhile; everyone must share one session and lock
+        return self._sessions.setdefault(upload_id, session)
+
+    async def write(self, upload_id: str, offset: int, chunks: AsyncIterator[bytes]) -> UploadSession:
+        """Append a streamed body at offset, which must be the session's current offset."""
+        session = await self.get(upload_id)
+        if session.chunk_size:
+            raise ValueError("Chunked upload, send chunks instead")
+        async with session.lock:
+            if offset != session.offset:
+                raise OffsetMismatch(session.offset)
+            if session.size is not None:
+                chunks = limit_stream(chunks, session.size - offset)
+            with open(session.part_path, "ab") as f:
+                try:
+                    session.offset += await write_stream(f, chunks, session.sha256)
+                finally:
+                    # Trust the file, not our count, if a write failed midway
+                    session.offset = f.tell()
+                    session.updated_at = time.time()
+        return session
+
+    async def write_chunk(self, upload_id: str, index: int, chunks: AsyncIterator[bytes],
+                          sha256: Optional[str] = None) -> UploadSession:
+        """Write chunk `index` of a chunked session with pwrite at its offset.
+
+        The chunk only counts as received once its full length arrived and,
+        if given, its SHA-256 matched; otherwise the sender just retries it.
+        """
+        session = await self.get(upload_id)
+        if not session.chunk_size:
+            raise ValueError("Not a chunked upload")
+        if not 0 <= index < session.chunk_count:
+            raise ValueError(f"Chunk index out of range (0-{session.chunk_count - 1})")
+        expected = session.chunk_length(index)
+        digest = hashlib.sha256()
+        fd = os.open(session.part_path, os.O_WRONLY | getattr(os, "O_BINARY", 0))
+        try:
+            writer = OffsetWriter(fd, index * session.chunk_size)
+            written = await write_stream(writer, limit_stream(chunks, expected), digest)
+        finally:
+            os.close(fd)
+            session.updated_at = time.time()
+        if written != expected:
+            raise ValueError(f"Chunk {index} has {written} bytes, expected {expected}")
+        if sha256 is not None and sha256.lower() != digest.hexdigest():
+            raise ValueError(f"Chunk {index} checksum mismatch")
+        session.received.add(index)
+        self._save_meta(session)
+        return session
+
+    async def complete(self, upload_id: str, sha256: Optional[str] = None) -> Dict[str, Any]:
+        """Verify size and hash, then commit the file."""
+        session = await self.get(upload_id)
+        async with session.lock:
+            if session.chunk_size:
+                if len(session.received) != session.chunk_count:
+                    raise ValueError(f"Upload incomplete: {len(session.received)} of {session.chunk_count} chunks")
+                # Chunks arrive out of order, so the file hash can only be taken now
+                loop = asyncio.get_running_loop()
+                digest = await loop.run_in_executor(None, hash_file, session.part_path)
+            elif session.size is not None and session.offset != session.size:
+                raise ValueError(f"Upload incomplete: {session.offset} of {session.size} bytes")
+            else:
+                digest = session.sha256.hexdigest()
+            if sha256 is not None and sha256.lower() != digest:
+                raise ValueError(f"SHA-256 mismatch: expected {sha256}, got {digest}")
+            entry = self.commit(upload_id, session.filename, session.part_path, digest)
+            self._forget(upload_id)
+        return entry
+
+    async def abort(self, upload_id: str):
+        await self.get(upload_id)
+        self._forget(upload_id)
+
+    def _forget(self, upload_id: str):
+        self._sessions.pop(upload_id, None)
+        for suffix in (".part", ".json", ".json.tmp"):
+            try:
+                (self.directory / f"{upload_id}{suffix}").unlink()
+            except FileNotFoundError:
+                pass
+
+    def expire(self):
+        """Drop sessions (including ones left by earlier runs) idle for session_ttl."""
+        cutoff = time.time() - self.session_ttl
+        for meta_path in self.directory.glob("*.json"):
+            upload_id = meta_path.stem
+            part_path = self.directory / f"{upload_id}.part"
+            try:
+                last_write = part_path.stat().st_mtime if part_path.exists() else meta_path.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            session = self._sessions.get(upload_id)
+            if last_write < cutoff and (session is None or not session.lock.locked()):
+                self._forget(upload_id)
@@ -0,0 +1,116 @@
+"""Fleet-wide aggregation: /api/aggregate query latency over a day of rollups for a large fleet.
+
+Fills a temporary metric store with one metric for --agents agents: a
+day of 1-minute rollup buckets (what a one-day query reads) plus the
+last --raw-minutes of raw 1-second samples. It then times the array
+reductions behind /api/aggregate (fleet stats, per-window series, top-k
+agents) and, for comparison, the same fleet average as a Python loop
+over per-agent dicts:
+
+    python benchmarks/bench_aggregate.py --agents 10000 --hours 24 --raw-minutes 10
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent / "central-server"))
+from aggregate import aggregate, top_k
+from rollups import Rollup
+from tsdb import TimeSeriesStore
+
+METRIC = "cpu_percent"
+
+
+def timed(function, runs: int = 3) -> float:
+    started = time.perf_counter()
+    for _ in range(runs):
+        function()
+    return (time.perf_counter() - started) / runs * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agents", type=int, default=10_000)
+    parser.add_argument("--hours", type=int, default=24)
+    parser.add_argument("--raw-minutes", type=int, default=10)
+    args = parser.parse_args()
+
+    agents = [f"agent-{i:05d}" for i in range(args.agents)]
+    rng = np.random.default_rng(0)
+    # Each agent idles around its own level, so top-k has something to find
+    levels = rng.uniform(5, 80, args.agents)
+    end = time.time() // 3600 * 3600
+    start = end - args.hours * 3600
+
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        tier = Rollup("1m", 60, TimeSeriesStore(Path(directory) / "1m", value_columns=4, compact_rows=4_000_000))
+        for minute in range(args.hours * 60):
+            means = np.clip(levels + rng.normal(0, 10, args.agents), 0, 100)
+            for agent, mean in zip(agents, means.tolist()):
+                tier.store.append(agent, start + minute * 60, {METRIC: (mean - 5, mean + 5, mean * 60, 60)})
+            if minute % 60 == 59:
+                tier.store.flush()
+                tier.store.compact()
+        raw = TimeSeriesStore(Path(directory) / "raw", compact_rows=4_000_000)
+        raw_start = end - args.raw_minutes * 60
+        for second in range(args.raw_minutes * 60):
+            values = np.clip(levels + rng.normal(0, 20, args.agents), 0, 100)
+            for agent, value in zip(agents, values.tolist()):
+                raw.append(agent, raw_start + second, {METRIC: value})
+            if second % 60 == 59:
+                raw.flush()
+                raw.compact()
+        raw.flush()
+        print(f"built {args.agents} agents x {args.hours} h of 1m rollups and {args.raw_minutes} min raw "
+              f"in {time.perf_counter() - started:.0f} s")
+
+        for label, read in (
+            (f"1m rollups, {args.hours} h", lambda: tier.rows(METRIC, start, end)),
+            (f"raw, {args.raw_minutes} min", lambda: raw.query_columns(METRIC, raw_start, end, ordered=False)),
+        ):
+            read_ms = timed(read)
+            ts, sids, values = read()
+            if len(values) == 4:
+                columns = tuple(values)
+            else:
+                columns = (values[0], values[0], values[0], None)
+            n = args.agents
+            windows = ((ts - ts.min()) // 300).astype(np.intp)
+            cases = (
+                ("fleet avg/min/max", lambda: aggregate(["avg", "min", "max"], None, 1, *columns)),
+                ("fleet p50/p95/p99", lambda: aggregate(["p50", "p95", "p99"], None, 1, *columns)),
+                ("5 min windows avg/max", lambda: aggregate(["avg", "max"], windows, int(windows.max()) + 1, *columns)),
+                ("5 min windows p95", lambda: aggregate(["p95"], windows, int(windows.max()) + 1, *columns)),
+                ("top 10 agents by avg", lambda: top_k(aggregate(["avg"], sids, n, *columns)["avg"], 10)),
+                ("top 10 agents by p95", lambda: top_k(aggregate(["p95"], sids, n, *columns)["p95"], 10)),
+            )
+            print(f"{label}: {len(ts) / 1e6:.1f}M rows, read {read_ms:.0f} ms")
+            for name, case in cases:
+                print(f"  {name:22} {timed(case):8.0f} ms")
+
+            # What the same average costs walking per-agent dicts, on a sample of rows
+            sample = min(len(ts), 1_000_000)
+            rows = [{"agent": int(sid), "sum": float(total), "count": float(count)} for sid, total, count in
+                    zip(sids[:sample].tolist(), columns[2][:sample].tolist(),
+                        (columns[3][:sample] if columns[3] is not None else np.ones(sample)).tolist())]
+
+            def loop():
+                total = count = 0.0
+                for row in rows:
+                    total += row["sum"]
+                    count += row["count"]
+                return total / count
+
+            print(f"  {'python loop avg':22} {timed(loop) * len(ts) / sample:8.0f} ms (extrapolated)")
+
+        tier.store.close()
+        raw.close()
+
+
+if __name__ == "__main__":
+    main()
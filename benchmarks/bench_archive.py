@@ -0,0 +1,120 @@
+"""Directory-tree streaming: tar archive and extract-while-receiving MB/s and agent memory.
+
+Starts an agent as a subprocess, builds a tree of files in a temporary
+directory, then downloads it from /api/archive (discarding the bytes)
+and copies it back through /api/archive into another directory, piping
+the download into the upload. Reports MB/s and the agent's peak RSS,
+which should stay flat whatever the tree size:
+
+    python benchmarks/bench_archive.py --files 2000 --file-kb 512 [--zstd]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import httpx
+import psutil
+
+ROOT = Path(__file__).parent.parent
+
+
+class PeakRss:
+    """Polls a process's RSS in the background and keeps the maximum."""
+
+    def __init__(self, pid: int, interval: float = 0.02):
+        self.process = psutil.Process(pid)
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.process.memory_info().rss)
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self.peak = self.process.memory_info().rss
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def make_tree(root: str, files: int, file_kb: int):
+    block = os.urandom(file_kb * 1024)
+    for i in range(files):
+        directory = os.path.join(root, f"dir{i % 32:02d}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"file{i:06d}.bin"), "wb") as f:
+            f.write(block[i % 256:] + block[:i % 256])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--file-kb", type=int, default=512)
+    parser.add_argument("--zstd", action="store_true", help="compress the stream with zstd")
+    parser.add_argument("--port", type=int, default=18950)
+    args = parser.parse_args()
+
+    base = f"http://127.0.0.1:{args.port}"
+    headers = {"Accept-Encoding": "zstd" if args.zstd else "identity"}
+    with tempfile.TemporaryDirectory() as work:
+        source = os.path.join(work, "tree")
+        make_tree(source, args.files, args.file_kb)
+        size = args.files * args.file_kb * 1024
+        agent_dir = os.path.join(work, "agent")
+        os.mkdir(agent_dir)
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", str(ROOT / "agent"),
+             "--host", "127.0.0.1", "--port", str(args.port), "--log-level", "warning"],
+            cwd=agent_dir, env={**os.environ, "CENTRAL_SERVER_URL": "ws://127.0.0.1:9"},
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            deadline = time.monotonic() + 30
+            while True:
+                try:
+                    httpx.get(f"{base}/api/health")
+                    break
+                except httpx.HTTPError:
+                    if time.monotonic() > deadline:
+                        raise
+                    time.sleep(0.2)
+
+            with httpx.Client(base_url=base, timeout=None) as client:
+                with PeakRss(process.pid) as rss:
+                    started = time.perf_counter()
+                    wire = 0
+                    with client.stream("GET", "/api/archive", params={"path": source}, headers=headers) as response:
+                        for chunk in response.iter_raw():
+                            wire += len(chunk)
+                    elapsed = time.perf_counter() - started
+                print(f"archive: {size / 1e6:.0f} MB of files in {elapsed:.2f} s, {size / elapsed / 1e6:.1f} MB/s, "
+                      f"{wire / 1e6:.0f} MB sent, agent peak RSS {rss.peak / 2**20:.0f} MiB")
+
+                with PeakRss(process.pid) as rss:
+                    started = time.perf_counter()
+                    with client.stream("GET", "/api/archive", params={"path": source}, headers=headers) as response:
+                        put_headers = {"Content-Encoding": response.headers["content-encoding"]} \
+                            if "content-encoding" in response.headers else {}
+                        result = client.put("/api/archive", params={"path": os.path.join(work, "copy")},
+                                            content=response.iter_raw(), headers=put_headers).json()
+                    elapsed = time.perf_counter() - started
+                print(f"copy:    {result['files']} files in {elapsed:.2f} s, {size / elapsed / 1e6:.1f} MB/s, "
+                      f"agent peak RSS {rss.peak / 2**20:.0f} MiB")
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
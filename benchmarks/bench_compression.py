@@ -0,0 +1,76 @@
+"""Compression throughput and ratio per codec and level, on log-like text and random bytes.
+
+Compresses the same buffer with gzip and (if installed) zstd at several
+levels, reporting ratio, MB/s of input and CPU seconds per GB, plus the
+time and verdict of the agent's sampling check that decides whether a
+file is compressed at all:
+
+    python benchmarks/bench_compression.py --size-mb 64 --gzip-levels 1 6 9 --zstd-levels 1 3 9
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import zlib
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "agent"))
+import compression
+from compression import GZIP, ZSTD, compress_bytes, is_compressible
+
+
+def text_data(size: int) -> bytes:
+    lines = []
+    total = i = 0
+    while total < size:
+        line = b"2026-10-18 12:%02d:%02d INFO worker-%d request /api/files?path=/srv/%d served in %d ms\n" % (
+            i // 60 % 60, i % 60, i % 8, i % 1000, i % 97)
+        lines.append(line)
+        total += len(line)
+        i += 1
+    return b"".join(lines)[:size]
+
+
+def measure(data: bytes, encoding: str, level: int):
+    if encoding == GZIP:
+        compression.GZIP_LEVEL = level
+    else:
+        compression.ZSTD_LEVEL = level
+    wall, cpu = time.perf_counter(), time.process_time()
+    compressed = compress_bytes(data, encoding)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    return len(data) / len(compressed), len(data) / wall / 1e6, cpu / len(data) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--gzip-levels", type=int, nargs="+", default=[1, 6, 9])
+    parser.add_argument("--zstd-levels", type=int, nargs="+", default=[1, 3, 9])
+    args = parser.parse_args()
+
+    size = args.size_mb * 1024 * 1024
+    codecs = [(GZIP, level) for level in args.gzip_levels]
+    if ZSTD in compression.content_encodings():
+        codecs += [(ZSTD, level) for level in args.zstd_levels]
+    else:
+        print("zstandard is not installed, gzip only")
+
+    for kind, data in (("text", text_data(size)), ("random", os.urandom(size))):
+        with tempfile.NamedTemporaryFile(suffix=".dat") as f:
+            f.write(data)
+            f.flush()
+            started = time.perf_counter()
+            verdict = is_compressible(f.name)
+            print(f"{kind}: sampling check {(time.perf_counter() - started) * 1e3:.2f} ms, "
+                  f"{'compress' if verdict else 'send as is'} "
+                  f"(fast zlib on the full buffer: {len(data) / len(zlib.compress(data, 1)):.2f}x)")
+        for encoding, level in codecs:
+            ratio, mb_per_sec, cpu_per_gb = measure(data, encoding, level)
+            print(f"  {encoding:4} level {level:2}: {ratio:6.2f}x, {mb_per_sec:7.1f} MB/s, "
+                  f"{cpu_per_gb:5.2f} CPU s/GB")
+
+
+if __name__ == "__main__":
+    main()
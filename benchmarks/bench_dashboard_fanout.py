@@ -0,0 +1,134 @@
+"""Dashboard stream fan-out: delivery latency to many dashboards while some of them stall.
+
+Starts a central server as a subprocess, connects --clients dashboards
+that read everything and --stalled ones that never read, then has one
+simulated agent report --rate status updates per second (each carrying
+--payload-kb of changing data) for --seconds. Reports how many updates
+the reading dashboards got, their delivery latency, and what the server
+did with the stalled ones (coalesced backlogs, evictions):
+
+    python benchmarks/bench_dashboard_fanout.py --clients 200 --stalled 5 --rate 10 --payload-kb 4 [--deflate]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+import websockets
+
+ROOT = Path(__file__).parent.parent
+
+
+async def reader(url: str, latencies: list, counts: list, index: int, stop: asyncio.Event):
+    async with websockets.connect(url, max_size=None) as ws:
+        while not stop.is_set():
+            try:
+                message = json.loads(await asyncio.wait_for(ws.recv(), 0.5))
+            except asyncio.TimeoutError:
+                continue
+            if message["type"] == "update" and "sent_at" in message["changes"]:
+                latencies.append(time.time() - message["changes"]["sent_at"])
+                counts[index] += 1
+
+
+async def staller(url: str, stop: asyncio.Event):
+    # Takes one frame into the client library's buffer and then stops reading,
+    # so the server's sends back up into the socket buffers
+    try:
+        async with websockets.connect(url, max_size=None, max_queue=1):
+            await stop.wait()
+    except Exception:
+        pass
+
+
+async def agent(url: str, rate: float, seconds: float, payload_kb: int) -> int:
+    sent = 0
+    async with websockets.connect(url) as ws:
+        await ws.send(json.dumps({"type": "register", "agent_id": "bench-agent", "hostname": "bench",
+                                  "ip": "127.0.0.1", "encodings": ["json"]}))
+        await ws.recv()
+        ends = time.monotonic() + seconds
+        while time.monotonic() < ends:
+            data = {"cpu_percent": random.random() * 100, "padding": os.urandom(payload_kb * 512).hex(),
+                    "sent_at": time.time(), "collected_at": time.time()}
+            sent += 1
+            await ws.send(json.dumps({"type": "status_update", "agent_id": "bench-agent",
+                                      "batch": [{"mode": "full", "seq": sent, "data": data}]}))
+            await asyncio.sleep(1 / rate)
+    return sent
+
+
+async def run(args, base: str):
+    stop = asyncio.Event()
+    stream = base.replace("http", "ws") + "/ws/dashboard"
+    latencies, counts = [], [0] * args.clients
+    tasks = [asyncio.create_task(reader(stream, latencies, counts, i, stop)) for i in range(args.clients)]
+    tasks += [asyncio.create_task(staller(stream, stop)) for _ in range(args.stalled)]
+    await asyncio.sleep(2)
+    sent = await agent(base.replace("http", "ws") + "/ws/register", args.rate, args.seconds, args.payload_kb)
+    await asyncio.sleep(2)
+    async with httpx.AsyncClient() as client:
+        stats = (await client.get(f"{base}/api/dashboard-clients")).json()
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    latencies.sort()
+    print(f"{sent} updates x {args.clients} reading dashboards: got {min(counts)}-{max(counts)} each")
+    if latencies:
+        print(f"delivery latency: p50 {latencies[len(latencies) // 2] * 1e3:.0f} ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1e3:.0f} ms, max {latencies[-1] * 1e3:.0f} ms")
+    print(f"server ({stats['policy']}, queue {stats['max_queue']}): {stats['evicted']} evicted, "
+          f"{stats['coalesced']} messages coalesced, {stats['dropped']} dropped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--stalled", type=int, default=5)
+    parser.add_argument("--rate", type=float, default=10)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--payload-kb", type=int, default=4)
+    parser.add_argument("--queue", type=int, default=64)
+    parser.add_argument("--send-timeout", type=float, default=3)
+    parser.add_argument("--policy", default="coalesce", choices=["coalesce", "drop-oldest"])
+    parser.add_argument("--deflate", action="store_true",
+                        help="enable per-message deflate (off by default in the central server)")
+    parser.add_argument("--port", type=int, default=18960)
+    args = parser.parse_args()
+
+    base = f"http://127.0.0.1:{args.port}"
+    with tempfile.TemporaryDirectory() as work:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", str(ROOT / "central-server"),
+             "--host", "127.0.0.1", "--port", str(args.port), "--log-level", "warning",
+             "--ws-per-message-deflate", "true" if args.deflate else "false"],
+            cwd=work, env={**os.environ, "TSDB_DIR": os.path.join(work, "tsdb"),
+                           "DASHBOARD_QUEUE_SIZE": str(args.queue), "DASHBOARD_SLOW_POLICY": args.policy,
+                           "DASHBOARD_SEND_TIMEOUT": str(args.send_timeout)},
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            deadline = time.monotonic() + 30
+            while True:
+                try:
+                    httpx.get(f"{base}/api/agents")
+                    break
+                except httpx.HTTPError:
+                    if time.monotonic() > deadline:
+                        raise
+                    time.sleep(0.2)
+            asyncio.run(run(args, base))
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
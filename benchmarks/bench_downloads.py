@@ -0,0 +1,88 @@
+"""Download throughput of the agent's RangeFileResponse against a plain FileResponse.
+
+Serves a temporary file from a local uvicorn server and downloads it
+with httpx, whole and as a resumed second half:
+
+    python benchmarks/bench_downloads.py --size-mb 1024 --runs 3
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import FileResponse
+from starlette.routing import Route
+
+sys.path.append(str(Path(__file__).parent.parent / "agent"))
+from range_response import RangeFileResponse
+
+
+def make_app(path: str) -> Starlette:
+    async def plain(request):
+        return FileResponse(path, filename="bench.bin")
+
+    async def ranged(request):
+        return RangeFileResponse(path, filename="bench.bin")
+
+    return Starlette(routes=[Route("/plain", plain), Route("/range", ranged)])
+
+
+def start_server(app: Starlette, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def download(url: str, headers: dict) -> int:
+    received = 0
+    with httpx.stream("GET", url, headers=headers, timeout=None) as response:
+        response.raise_for_status()
+        for chunk in response.iter_raw(1024 * 1024):
+            received += len(chunk)
+    return received
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=512)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=18765)
+    args = parser.parse_args()
+
+    size = args.size_mb * 1024 * 1024
+    with tempfile.NamedTemporaryFile(delete=False) as f:
+        block = os.urandom(1024 * 1024)
+        for _ in range(args.size_mb):
+            f.write(block)
+    try:
+        server = start_server(make_app(f.name), args.port)
+        cases = [("whole", {}, size), ("resume", {"Range": f"bytes={size // 2}-"}, size - size // 2)]
+        for label, headers, expected in cases:
+            for route in ("plain", "range"):
+                best = 0.0
+                for _ in range(args.runs):
+                    started = time.perf_counter()
+                    received = download(f"http://127.0.0.1:{args.port}/{route}", headers)
+                    elapsed = time.perf_counter() - started
+                    if received != expected:
+                        # FileResponse without range support sends everything
+                        print(f"{route:<6} {label:<7} got {received} bytes, wanted {expected}")
+                        break
+                    best = max(best, received / elapsed / 1e6)
+                else:
+                    print(f"{route:<6} {label:<7} {best:8.1f} MB/s")
+        server.should_exit = True
+    finally:
+        os.unlink(f.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Compare the Linux sysfs temperature fast path with psutil.sensors_temperatures().
+
+Run on the Linux host you care about (it reads the real /sys):
+
+    python benchmarks/bench_temperature_sensors.py --iterations 2000
+"""
+import argparse
+import platform
+import sys
+import time
+from pathlib import Path
+
+import psutil
+
+sys.path.append(str(Path(__file__).parent.parent / "agent"))
+from sysfs_sensors import HwmonReader
+
+
+def bench(name, func, iterations):
+    func()  # warm up
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed = time.perf_counter() - started
+    per_call_us = elapsed / iterations * 1e6
+    print(f"{name:<28} {per_call_us:10.1f} us/call  {iterations / elapsed:10.0f} calls/s")
+    return per_call_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=1000)
+    args = parser.parse_args()
+
+    if platform.system() != "Linux":
+        print("The sysfs fast path only exists on Linux")
+        return
+
+    reader = HwmonReader()
+    sensors = reader.read()
+    if not sensors:
+        print("No hwmon or thermal_zone temperature sensors found on this host")
+        return
+
+    print(f"{len(sensors)} sensors, {args.iterations} iterations")
+    baseline = bench("psutil.sensors_temperatures", psutil.sensors_temperatures, args.iterations)
+    fast = bench("HwmonReader.read (pread)", reader.read, args.iterations)
+    print(f"speedup: {baseline / fast:.1f}x")
+    reader.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Agent-to-agent file transfer throughput on one machine.
+
+Starts a central server and two agents as subprocesses (each agent in
+its own temporary working directory), then has agent A send a file to
+agent B through /api/transfer-file and reports MB/s, over one stream
+and over several parallel ones. The payload is random bytes, or log-like
+text with --text, which agents send compressed:
+
+    python benchmarks/bench_transfer.py --size-mb 1024 --streams 1 4 8 --chunk-mb 8 [--text]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).parent.parent
+
+
+def start(app_dir: Path, port: int, cwd: str, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", str(app_dir),
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=cwd, env={**os.environ, **env}, stdout=subprocess.DEVNULL,
+    )
+
+
+def wait_for(check, timeout: float = 30.0, interval: float = 0.2):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if check():
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(interval)
+    raise TimeoutError("Timed out waiting for the benchmark services")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=512)
+    parser.add_argument("--streams", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--chunk-mb", type=int, default=8)
+    parser.add_argument("--base-port", type=int, default=18900)
+    parser.add_argument("--text", action="store_true", help="send compressible log-like text")
+    args = parser.parse_args()
+
+    central_port, port_a, port_b = args.base_port, args.base_port + 1, args.base_port + 2
+    central_url = f"http://127.0.0.1:{central_port}"
+    processes = []
+    with tempfile.TemporaryDirectory() as work:
+        try:
+            processes.append(start(ROOT / "central-server", central_port, work, {}))
+            for name, port in (("bench-a", port_a), ("bench-b", port_b)):
+                cwd = os.path.join(work, name)
+                os.mkdir(cwd)
+                processes.append(start(ROOT / "agent", port, cwd, {
+                    "AGENT_ID": name, "AGENT_PORT": str(port), "AGENT_IP": "127.0.0.1",
+                    "CENTRAL_SERVER_URL": f"ws://127.0.0.1:{central_port}",
+                }))
+            wait_for(lambda: {a["agent_id"] for a in httpx.get(f"{central_url}/api/agents").json()
+                              if a["status"] == "online"} >= {"bench-a", "bench-b"})
+
+            source = os.path.join(work, "payload.bin")
+            with open(source, "wb") as f:
+                if args.text:
+                    block = b"".join(b"2026-10-18 12:00:%02d INFO request %d served in %d ms\n" % (i % 60, i, i % 97)
+                                     for i in range(20000))[:1024 * 1024]
+                else:
+                    block = os.urandom(1024 * 1024)
+                for _ in range(args.size_mb):
+                    f.write(block)
+
+            size = args.size_mb * 1024 * 1024
+            for streams in args.streams:
+                started = time.perf_counter()
+                transfer = httpx.post(f"http://127.0.0.1:{port_a}/api/transfer-file", json={
+                    "source_path": source, "target_agent_id": "bench-b", "target_path": "payload.bin",
+                    "streams": streams, "chunk_size": args.chunk_mb * 1024 * 1024,
+                }).json()
+                url = f"http://127.0.0.1:{port_a}/api/transfers/{transfer['transfer_id']}"
+                wait_for(lambda: httpx.get(url).json()["status"] in ("completed", "failed"),
+                         timeout=3600, interval=0.05)
+                elapsed = time.perf_counter() - started
+                info = httpx.get(url).json()
+                if info["status"] != "completed":
+                    print(f"{streams} stream(s): transfer failed: {info['error']}")
+                    continue
+                print(f"{streams} stream(s): {args.size_mb} MiB in {elapsed:.2f} s, "
+                      f"{size / elapsed / 1e6:.1f} MB/s, {info['wire_bytes'] / 1e6:.1f} MB sent "
+                      f"{info['encoding'] or 'identity'} (retries: {info['retries']})")
+        finally:
+            for process in processes:
+                process.terminate()
+                process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Central server metric store: ingest rate and range query latency.
+
+Appends simulated samples (one per agent per second, --metrics metrics
+each) into a TimeSeriesStore in a temporary directory, flushing and
+compacting as the server does, then times range queries over recent and
+older data for one agent and for the whole fleet. With --rollups the
+1m/5m/1h rollups are kept up to date too and queried the same way:
+
+    python benchmarks/bench_tsdb.py --agents 2000 --metrics 20 --seconds 600 [--rollups]
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "central-server"))
+from rollups import Rollups
+from tsdb import TimeSeriesStore
+
+
+def timed(function, runs: int = 20) -> float:
+    started = time.perf_counter()
+    for _ in range(runs):
+        function()
+    return (time.perf_counter() - started) / runs * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agents", type=int, default=2000)
+    parser.add_argument("--metrics", type=int, default=20)
+    parser.add_argument("--seconds", type=int, default=600)
+    parser.add_argument("--flush-every", type=int, default=10, help="seconds of samples per flush")
+    parser.add_argument("--rollups", action="store_true", help="also maintain and query 1m/5m/1h rollups")
+    args = parser.parse_args()
+
+    agents = [f"agent-{i:05d}" for i in range(args.agents)]
+    names = [f"metric.{i}" for i in range(args.metrics)]
+    # Pre-built samples so the timing is the store's, not random()'s
+    samples = [{name: random.random() * 100 for name in names} for _ in range(64)]
+    t0 = time.time() - args.seconds
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = TimeSeriesStore(Path(directory))
+        rollups = Rollups(Path(directory) / "rollups") if args.rollups else None
+        stores = [store] + ([tier.store for tier in rollups.tiers] if rollups else [])
+        ingest = flush = 0.0
+        for second in range(args.seconds):
+            started = time.perf_counter()
+            for i, agent in enumerate(agents):
+                store.append(agent, t0 + second, samples[i % 64])
+                if rollups:
+                    rollups.add(agent, t0 + second, samples[i % 64])
+            ingest += time.perf_counter() - started
+            if second % args.flush_every == args.flush_every - 1:
+                started = time.perf_counter()
+                for each in stores:
+                    each.flush()
+                    each.compact()
+                flush += time.perf_counter() - started
+        if rollups:
+            rollups.close_all()
+        for each in stores:
+            each.flush()
+        rows = args.agents * args.metrics * args.seconds
+        print(f"ingest: {rows / ingest / 1e3:.0f}k rows/s ({args.agents} agents x {args.metrics} metrics "
+              f"= {args.agents * args.metrics / 1e3:.0f}k rows/s needed), flush+compact {flush:.2f} s total")
+        print(f"storage: {store.stats()}")
+
+        end = t0 + args.seconds
+        one = [agents[len(agents) // 2]]
+        for label, start in (("last 60 s", end - 60), ("last 10 min", end - 600), ("everything", 0)):
+            print(f"{label:12}: one agent {timed(lambda: store.query(names[0], start, end, one)):7.2f} ms, "
+                  f"fleet {timed(lambda: store.query(names[0], start, end)):7.2f} ms "
+                  f"({len(store.query(names[0], start, end)[0])} rows)")
+        for tier in rollups.tiers if rollups else []:
+            print(f"{tier.name + ' rollup':12}: one agent {timed(lambda: tier.query(names[0], 0, end, one)):7.2f} ms, "
+                  f"fleet {timed(lambda: tier.query(names[0], 0, end)):7.2f} ms "
+                  f"({len(tier.query(names[0], 0, end)[0])} rows, {tier.store.stats()['bytes'] / 1e6:.1f} MB)")
+        for each in stores:
+            each.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Encode/decode cost and bytes per update for the agent status wire formats.
+
+Uses a synthetic status shaped like the agent's /api/status payload and
+measures full snapshots and typical deltas in JSON and MessagePack:
+
+    python benchmarks/bench_wire_format.py --drives 12 --sensors 32
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "utils"))
+from status_delta import DeltaEncoder
+from wire_format import JSON, MSGPACK, decode_message, encode_message, supported_encodings
+
+
+def make_status(drives: int, sensors: int) -> dict:
+    return {
+        "cpu_percent": random.uniform(0, 100),
+        "memory_percent": random.uniform(0, 100),
+        "memory_used_mb": random.randint(1000, 60000),
+        "memory_total_mb": 65536,
+        "network": {
+            "bytes_sent": random.randint(0, 10**12),
+            "bytes_recv": random.randint(0, 10**12),
+            "bytes_sent_per_sec": random.uniform(0, 10**8),
+            "bytes_recv_per_sec": random.uniform(0, 10**8),
+        },
+        "disk_percent": random.uniform(0, 100),
+        "disk_used_gb": random.uniform(0, 2000),
+        "disk_total_gb": 2000.0,
+        "drives": [
+            {
+                "device": f"/dev/sd{chr(97 + i)}1",
+                "mountpoint": f"/mnt/disk{i}",
+                "fstype": "ext4",
+                "total_gb": 2000.0,
+                "used_gb": random.uniform(0, 2000),
+                "free_gb": random.uniform(0, 2000),
+                "percent_used": random.uniform(0, 100),
+                "health_status": "healthy",
+                "smart_available": True,
+            }
+            for i in range(drives)
+        ],
+        "temperatures": {
+            f"coretemp_Core {i}": {"current": random.uniform(30, 90), "high": 84.0, "critical": 100.0}
+            for i in range(sensors)
+        },
+        "collected_at": time.time(),
+        "uptime_seconds": random.randint(0, 10**7),
+    }
+
+
+def next_status(status: dict) -> dict:
+    """A following sample where the fast metrics moved and most else didn't."""
+    status = {**status, "collected_at": status["collected_at"] + 30}
+    status["cpu_percent"] = random.uniform(0, 100)
+    status["memory_percent"] = min(100.0, status["memory_percent"] + random.uniform(-1, 1))
+    status["network"] = {**status["network"], "bytes_sent_per_sec": random.uniform(0, 10**8)}
+    status["temperatures"] = {
+        name: {**sensor, "current": sensor["current"] + random.choice([0, 0, 0, 2])}
+        for name, sensor in status["temperatures"].items()
+    }
+    return status
+
+
+def bench(label: str, message: dict, encoding: str, iterations: int):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        frame = encode_message(message, encoding)
+    encode_us = (time.perf_counter() - started) / iterations * 1e6
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        decode_message(frame)
+    decode_us = (time.perf_counter() - started) / iterations * 1e6
+
+    size = len(frame.encode() if isinstance(frame, str) else frame)
+    print(f"{label:<8} {encoding:<8} {size:8d} B  encode {encode_us:8.1f} us  decode {decode_us:8.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--drives", type=int, default=4)
+    parser.add_argument("--sensors", type=int, default=16)
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    encoder = DeltaEncoder(keyframe_interval=1000)
+    status = make_status(args.drives, args.sensors)
+    full = {"type": "status_update", "agent_id": "bench", **encoder.encode(status)}
+    delta = {"type": "status_update", "agent_id": "bench", **encoder.encode(next_status(status))}
+
+    encodings = [e for e in (JSON, MSGPACK) if e in supported_encodings()]
+    if MSGPACK not in encodings:
+        print("msgpack is not installed, only measuring JSON")
+    for label, message in (("full", full), ("delta", delta)):
+        for encoding in encodings:
+            bench(label, message, encoding, args.iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import re
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+BASIC_STATS = ("avg", "min", "max", "sum", "count")
+PERCENTILE = re.compile(r"^p(100|\d{1,2}(\.\d+)?)$")
+
+
+def parse_stats(spec: str) -> List[str]:
+    """Comma-separated statistic names, e.g. "avg,max,p95", validated and deduplicated."""
+    stats = list(dict.fromkeys(stat.strip().lower() for stat in spec.split(",") if stat.strip()))
+    if not stats:
+        raise ValueError("no statistics requested")
+    for stat in stats:
+        if stat not in BASIC_STATS and not PERCENTILE.match(stat):
+            raise ValueError(f"unknown statistic {stat!r}: use avg, min, max, sum, count or pNN (e.g. p95)")
+    return stats
+
+
+def _sum(groups: Optional[np.ndarray], n: int, x: np.ndarray) -> np.ndarray:
+    if groups is None:
+        return np.array([x.sum()], np.float64)
+    return np.bincount(groups, weights=x, minlength=n)
+
+
+def _extreme(ufunc: np.ufunc, fill: float, groups: Optional[np.ndarray], n: int, x: np.ndarray) -> np.ndarray:
+    if groups is None:
+        return np.array([ufunc.reduce(x) if len(x) else fill])
+    out = np.full(n, fill)
+    ufunc.at(out, groups, x)
+    return out
+
+
+def grouped_percentiles(groups: Optional[np.ndarray], n: int, points: np.ndarray,
+                        qs: Sequence[float]) -> np.ndarray:
+    """Linearly interpolated percentiles of points per group, as (len(qs), n); NaN for empty groups.
+
+    Rather than lexsorting (group, value) pairs, values are scaled into
+    [0, 0.5] and added to their integer group, so a single float sort puts
+    each group's values in order next to each other.
+    """
+    if groups is None:
+        if not len(points):
+            return np.full((len(qs), 1), np.nan)
+        return np.percentile(points, qs).reshape(len(qs), 1)
+    out = np.full((len(qs), n), np.nan)
+    if not len(points):
+        return out
+    low, high = points.min(), points.max()
+    span = high - low
+    keys = groups.astype(np.float64)
+    if span > 0:
+        keys += (points - low) * (0.5 / span)
+    keys.sort()
+    ordered = low + (keys - np.floor(keys)) * (2 * span)
+    rows = np.bincount(groups, minlength=n)
+    present = rows > 0
+    starts = (np.cumsum(rows) - rows)[present]
+    rows = rows[present]
+    for i, q in enumerate(qs):
+        position = starts + (rows - 1) * (q / 100)
+        below = np.floor(position).astype(np.int64)
+        above = np.minimum(below + 1, starts + rows - 1)
+        fraction = position - below
+        out[i, present] = ordered[below] * (1 - fraction) + ordered[above] * fraction
+    return out
+
+
+def aggregate(stats: Sequence[str], groups: Optional[np.ndarray], n: int, mins: np.ndarray, maxs: np.ndarray,
+              sums: np.ndarray, counts: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """Each statistic per group, as arrays of length n.
+
+    groups holds each row's group number below n, or is None for one
+    group of every row. Rows are raw samples (pass the values as mins,
+    maxs and sums, and counts=None) or rollup buckets, in which case avg,
+    min, max, sum and count are exact and percentiles are of the bucket
+    averages. "count" is always in the result, so callers can drop empty
+    groups.
+    """
+    if groups is not None:
+        groups = groups.astype(np.intp, copy=False)
+    if counts is None:
+        count = np.array([len(sums)], np.float64) if groups is None else \
+            np.bincount(groups, minlength=n).astype(np.float64)
+    else:
+        count = _sum(groups, n, counts)
+    result = {"count": count}
+    if "sum" in stats or "avg" in stats:
+        total = _sum(groups, n, sums)
+        result["sum"] = total
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result["avg"] = total / count
+    if "min" in stats:
+        result["min"] = _extreme(np.minimum, np.inf, groups, n, mins)
+    if "max" in stats:
+        result["max"] = _extreme(np.maximum, -np.inf, groups, n, maxs)
+    percentiles = [stat for stat in stats if PERCENTILE.match(stat)]
+    if percentiles:
+        points = sums if counts is None else sums / counts
+        for stat, values in zip(percentiles, grouped_percentiles(groups, n, points,
+                                                                 [float(stat[1:]) for stat in percentiles])):
+            result[stat] = values
+    return result
+
+
+def top_k(ranking: np.ndarray, k: int, largest: bool = True) -> np.ndarray:
+    """Indices of the k largest (or smallest) entries of ranking, best first, without a full sort."""
+    k = min(k, len(ranking))
+    if k <= 0:
+        return np.empty(0, np.intp)
+    keyed = -ranking if largest else ranking
+    best = np.argpartition(keyed, k - 1)[:k]
+    return best[np.argsort(keyed[best], kind="stable")]
@@ -0,0 +1,58 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Stands in for a missing field, so a field newly set to None still counts as changed
+_MISSING = object()
+
+
+class Subscription:
+    """What one dashboard client has asked to be pushed.
+
+    agent_ids limits the stream to those agents and metrics to those
+    status fields; None means everything. Metric names are top-level
+    status fields (cpu_percent, drives, network, ...); a dotted history
+    name such as "drives./home.percent_used" selects the field it comes
+    from.
+    """
+
+    def __init__(self, agent_ids: Optional[Iterable[str]] = None, metrics: Optional[Iterable[str]] = None):
+        self.agent_ids = set(agent_ids) if agent_ids is not None else None
+        self.fields = {name.split(".", 1)[0] for name in metrics} if metrics is not None else None
+
+    @classmethod
+    def from_message(cls, message: Dict[str, Any]) -> "Subscription":
+        """A client's {"type": "subscribe", "agent_ids": [...], "metrics": [...]} message."""
+        agent_ids = message.get("agent_ids")
+        metrics = message.get("metrics")
+        for value in (agent_ids, metrics):
+            if value is not None and not (isinstance(value, list) and all(isinstance(item, str) for item in value)):
+                raise ValueError("agent_ids and metrics must be lists of strings or null")
+        return cls(agent_ids, metrics)
+
+    @property
+    def key(self) -> tuple:
+        """Equal for subscriptions that see the same messages, so those can be shared."""
+        return (
+            frozenset(self.agent_ids) if self.agent_ids is not None else None,
+            frozenset(self.fields) if self.fields is not None else None,
+        )
+
+    def wants(self, agent_id: str) -> bool:
+        return self.agent_ids is None or agent_id in self.agent_ids
+
+    def filter(self, status_data: Dict[str, Any]) -> Dict[str, Any]:
+        if self.fields is None:
+            return status_data
+        return {key: value for key, value in status_data.items() if key in self.fields}
+
+    def filter_removed(self, removed: List[str]) -> List[str]:
+        if self.fields is None:
+            return removed
+        return [key for key in removed if key in self.fields]
+
+
+def status_changes(old: Dict[str, Any], new: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+    """Top-level status fields that differ between two status dicts, and fields that went away."""
+    changed = {key: value for key, value in new.items() if old.get(key, _MISSING) != value}
+    removed = [key for key in old if key not in new]
+    return changed, removed
+
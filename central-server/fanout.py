@@ -0,0 +1,175 @@
+import asyncio
+from collections import deque
+from typing import Any, Callable, Dict, Hashable, Optional, Union
+
+from fastapi import WebSocket
+
+# What to do when a client's send queue is full
+DROP_OLDEST = "drop-oldest"
+COALESCE = "coalesce"
+POLICIES = (DROP_OLDEST, COALESCE)
+
+# A queued message: text shared by every recipient, or built when it is sent
+Outgoing = Union[str, Callable[[], str]]
+
+
+class Connection:
+    """One client: its websocket, a bounded send queue and the task draining it."""
+
+    def __init__(self, websocket: WebSocket, client_id: str, subscription: Any = None,
+                 resync: Optional[Callable[[Any], str]] = None):
+        self.websocket = websocket
+        self.client_id = client_id
+        self.subscription = subscription
+        # Builds a message bringing the client up to date, replacing whatever it missed
+        self.resync = resync
+        self.queue: deque = deque()
+        self.ready = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def resync_message(self) -> str:
+        return self.resync(self.subscription)
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "client_id": self.client_id,
+            "queued": len(self.queue),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+        }
+
+
+class ConnectionManager:
+    """Fan messages out to many websocket clients without letting one hold up the rest.
+
+    Each client has a bounded queue drained by its own writer task, so
+    publishing only appends to queues and never waits on a socket. A
+    client whose queue is full loses its oldest update (drop-oldest; a
+    queued resync is never dropped, as later updates build on it) or,
+    when it can be resynced, has its whole backlog replaced by one resync
+    message built when it is sent (coalesce), so it catches up in one
+    step however far behind it was. A send that fails or takes longer
+    than send_timeout evicts the client. Messages are serialized once
+    per distinct subscription and the same string is queued for every
+    client that shares it.
+    """
+
+    def __init__(self, max_queue: int = 256, policy: str = COALESCE, send_timeout: float = 10.0):
+        if policy not in POLICIES:
+            raise ValueError(f"policy must be one of {', '.join(POLICIES)}")
+        self.max_queue = max_queue
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.active_connections: Dict[str, Connection] = {}
+        # Totals, including clients that have since gone
+        self.evicted = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    async def connect(self, websocket: WebSocket, client_id: str, subscription: Any = None,
+                      resync: Optional[Callable[[Any], str]] = None):
+        """Accept a client; with resync, its first message is resync(subscription)."""
+        await websocket.accept()
+        connection = Connection(websocket, client_id, subscription, resync)
+        self.active_connections[client_id] = connection
+        if resync is not None:
+            self._enqueue(connection, connection.resync_message)
+        connection.task = asyncio.create_task(self._write(connection))
+
+    def disconnect(self, client_id: str):
+        connection = self.active_connections.pop(client_id, None)
+        if connection is not None and connection.task is not None and connection.task is not asyncio.current_task():
+            connection.task.cancel()
+
+    def subscribe(self, client_id: str, subscription: Any):
+        """Change what a client receives; it gets a fresh resync in place of anything still queued."""
+        connection = self.active_connections.get(client_id)
+        if connection is None:
+            return
+        connection.subscription = subscription
+        if connection.resync is not None:
+            connection.queue.clear()
+            self._enqueue(connection, connection.resync_message)
+
+    async def send_personal_message(self, message: str, client_id: str):
+        connection = self.active_connections.get(client_id)
+        if connection is not None:
+            self._enqueue(connection, message)
+
+    async def broadcast(self, message: str):
+        for connection in list(self.active_connections.values()):
+            self._enqueue(connection, message)
+
+    def publish(self, render: Callable[[Any], Optional[str]], key: Callable[[Any], Hashable] = id):
+        """Queue render(subscription) for every client, skipping those it returns None for.
+
+        Clients whose subscriptions have the same key share one rendered
+        string, so a message is built and serialized once per distinct
+        subscription rather than once per client.
+        """
+        rendered: Dict[Hashable, Optional[str]] = {}
+        for connection in list(self.active_connections.values()):
+            subscription_key = key(connection.subscription)
+            if subscription_key not in rendered:
+                rendered[subscription_key] = render(connection.subscription)
+            message = rendered[subscription_key]
+            if message is not None:
+                self._enqueue(connection, message)
+
+    def _enqueue(self, connection: Connection, message: Outgoing):
+        if len(connection.queue) >= self.max_queue:
+            if self.policy == COALESCE and connection.resync is not None:
+                connection.coalesced += len(connection.queue)
+                self.coalesced += len(connection.queue)
+                connection.queue.clear()
+                connection.queue.append(connection.resync_message)
+            else:
+                self._drop_oldest(connection)
+        connection.queue.append(message)
+        connection.ready.set()
+
+    def _drop_oldest(self, connection: Connection):
+        # Resyncs are the callables; if only those are queued, let the queue run one over
+        for index, queued in enumerate(connection.queue):
+            if not callable(queued):
+                del connection.queue[index]
+                connection.dropped += 1
+                self.dropped += 1
+                return
+
+    async def _write(self, connection: Connection):
+        try:
+            while True:
+                while not connection.queue:
+                    connection.ready.clear()
+                    await connection.ready.wait()
+                message = connection.queue.popleft()
+                if callable(message):
+                    message = message()
+                await asyncio.wait_for(connection.websocket.send_text(message), self.send_timeout)
+                connection.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Stalled past send_timeout, or the socket is gone
+            print(f"Evicting client {connection.client_id}: {type(e).__name__} {e}")
+            self.evicted += 1
+            self.disconnect(connection.client_id)
+            try:
+                await asyncio.wait_for(connection.websocket.close(code=1011), 1)
+            except Exception:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "policy": self.policy,
+            "max_queue": self.max_queue,
+            "evicted": self.evicted,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "clients": [connection.info() for connection in self.active_connections.values()],
+        }
@@ -1,29 +1,56 @@
 import asyncio
+import copy
+import fnmatch
 import json
+import math
 import os
 import sys
 from pathlib import Path
+import time
 from typing import Dict, List, Optional
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Query, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from datetime import datetime
 import uuid
+from collections import deque
+import numpy as np
 
 # Add utils directory to path
 sys.path.append(str(Path(__file__).parent.parent / "utils"))
 from network_utils import get_local_ip, find_best_ip_for_network
+from status_delta import DeltaDecoder
+from status_metrics import extract_metrics
+from wire_format import decode_message, negotiate_encoding
+from tsdb import TimeSeriesStore
+from rollups import Rollups, choose_resolution
+from aggregate import aggregate, parse_stats, top_k
+from dashboard_stream import Subscription, status_changes
+from fanout import COALESCE, ConnectionManager
+
+# How many samples to keep per agent
+SAMPLE_HISTORY = int(os.getenv("SAMPLE_HISTORY", 600))
 
 # In-memory storage for agents
 class Agent:
-    def __init__(self, agent_id: str, hostname: str, ip: str):
+    def __init__(self, agent_id: str, hostname: str, ip: str, port: int = 3000):
         self.agent_id = agent_id
         self.hostname = hostname
         self.ip = ip
+        self.port = port
         self.last_seen = datetime.utcnow()
         self.status = "online"
         self.websocket = None
         self.status_data = {}
+        self.delta_decoder = DeltaDecoder()
+        self.samples = deque(maxlen=SAMPLE_HISTORY)
+
+    def record_sample(self, status_data: dict):
+        """Keep the numeric metrics of every sample the agent sent."""
+        timestamp = status_data.get("collected_at") or datetime.utcnow().timestamp()
+        metrics = extract_metrics(status_data)
+        self.samples.append((timestamp, metrics))
+        return timestamp, metrics
 
 app = FastAPI(title="Server Monitor Central Server")
 
@@ -39,28 +66,66 @@ app.add_middleware(
 # In-memory storage for connected agents
 connected_agents: Dict[str, Agent] = {}
 
-# WebSocket connection manager
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
-
-    async def connect(self, websocket: WebSocket, client_id: str):
-        await websocket.accept()
-        self.active_connections[client_id] = websocket
+# WebSocket connection manager for dashboard clients
+manager = ConnectionManager(
+    max_queue=int(os.getenv("DASHBOARD_QUEUE_SIZE", 256)),
+    policy=os.getenv("DASHBOARD_SLOW_POLICY", COALESCE),
+    send_timeout=float(os.getenv("DASHBOARD_SEND_TIMEOUT", 10))
+)
 
-    def disconnect(self, client_id: str):
-        if client_id in self.active_connections:
-            del self.active_connections[client_id]
+# Persistent metric history: raw samples plus 1m/5m/1h min/max/sum/count rollups
+TSDB_DIR = Path(os.getenv("TSDB_DIR", "tsdb"))
+TSDB_SEGMENT_ROWS = int(os.getenv("TSDB_SEGMENT_ROWS", 1_000_000))
+tsdb = TimeSeriesStore(TSDB_DIR, compact_rows=TSDB_SEGMENT_ROWS)
+rollups = Rollups(TSDB_DIR / "rollups", compact_rows=TSDB_SEGMENT_ROWS)
+# Buffered rows are sealed into segments every interval, or sooner once this many are waiting
+TSDB_FLUSH_INTERVAL = float(os.getenv("TSDB_FLUSH_INTERVAL", 10))
+TSDB_FLUSH_ROWS = int(os.getenv("TSDB_FLUSH_ROWS", 500_000))
+tsdb_flush_requested = asyncio.Event()
+# One flush at a time: sealing numbers segments and merges share temp paths
+tsdb_flush_lock = asyncio.Lock()
+# How long each resolution is kept, in seconds
+TSDB_RETENTION = {
+    "raw": float(os.getenv("TSDB_RETENTION_RAW", 2 * 86400)),
+    "1m": float(os.getenv("TSDB_RETENTION_1M", 14 * 86400)),
+    "5m": float(os.getenv("TSDB_RETENTION_5M", 90 * 86400)),
+    "1h": float(os.getenv("TSDB_RETENTION_1H", 730 * 86400)),
+}
+# Agents sample every second by default
+RAW_SAMPLE_INTERVAL = 1.0
+# Open rollup buckets of agents that stopped sending are written out after this long
+ROLLUP_GRACE = 300
 
-    async def send_personal_message(self, message: str, client_id: str):
-        if client_id in self.active_connections:
-            await self.active_connections[client_id].send_text(message)
+def tsdb_stores() -> List[tuple]:
+    return [("raw", tsdb)] + [(tier.name, tier.store) for tier in rollups.tiers]
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections.values():
-            await connection.send_text(message)
+async def flush_tsdb():
+    """Seal the write buffers, merge small segments and drop expired ones, off the event loop."""
+    loop = asyncio.get_running_loop()
+    async with tsdb_flush_lock:
+        now = time.time()
+        rollups.close_before(now - ROLLUP_GRACE)
+        for name, store in tsdb_stores():
+            buffers = store.take_buffers()
+            if buffers:
+                store.add_segments(await loop.run_in_executor(None, store.seal_buffers, buffers))
+            for mid, run in store.compaction_plan():
+                merged = await loop.run_in_executor(None, store.merge, mid, run)
+                store.replace_segments(mid, run, merged)
+            for mid, old in store.expired(now - TSDB_RETENTION[name]):
+                store.replace_segments(mid, old, None)
 
-manager = ConnectionManager()
+async def tsdb_flusher():
+    while True:
+        try:
+            await asyncio.wait_for(tsdb_flush_requested.wait(), TSDB_FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        tsdb_flush_requested.clear()
+        try:
+            await flush_tsdb()
+        except Exception as e:
+            print(f"Metric store flush failed: {e}")
 
 # Routes
 @app.get("/")
@@ -68,20 +133,272 @@ async def root():
     """Root endpoint."""
     return {"message": "Server Monitor Central Server", "status": "running"}
 
-@app.get("/api/agents")
-async def list_agents():
-    """List all connected agents."""
-    return [
-        {
+def agent_info(agent: Agent) -> dict:
+    return {
+        "agent_id": agent.agent_id,
+        "hostname": agent.hostname,
+        "ip": agent.ip,
+        "port": agent.port,
+        "status": agent.status,
+        "last_seen": agent.last_seen.isoformat(),
+        "status_data": agent.status_data
+    }
+
+def dashboard_entry(agent: Agent, subscription: Subscription) -> dict:
+    return {**agent_info(agent), "status_data": subscription.filter(agent.status_data)}
+
+def snapshot_message(subscription: Subscription) -> str:
+    return json.dumps({
+        "type": "snapshot",
+        "agents": [dashboard_entry(agent, subscription) for agent in connected_agents.values()
+                   if subscription.wants(agent.agent_id)]
+    })
+
+def subscription_key(subscription: Subscription) -> tuple:
+    return subscription.key
+
+def publish_agent(agent: Agent):
+    """Push a (re)registered agent whole, since its address may have changed."""
+    manager.publish(lambda subscription: json.dumps({"type": "agent", "agent": dashboard_entry(agent, subscription)})
+                    if subscription.wants(agent.agent_id) else None, key=subscription_key)
+
+def publish_update(agent: Agent, previous: dict, status_changed: bool = False):
+    """Push the status fields that changed since previous, filtered per client."""
+    changed, removed = status_changes(previous, agent.status_data)
+
+    def render(subscription: Subscription) -> Optional[dict]:
+        if not subscription.wants(agent.agent_id):
+            return None
+        changes = subscription.filter(changed)
+        gone = subscription.filter_removed(removed)
+        if not (changes or gone or status_changed):
+            return None
+        return json.dumps({
+            "type": "update",
             "agent_id": agent.agent_id,
-            "hostname": agent.hostname,
-            "ip": agent.ip,
             "status": agent.status,
             "last_seen": agent.last_seen.isoformat(),
-            "status_data": agent.status_data
-        }
-        for agent in connected_agents.values()
-    ]
+            "changes": changes,
+            "removed": gone
+        })
+
+    manager.publish(render, key=subscription_key)
+
+def mark_offline(agent_id: Optional[str]):
+    agent = connected_agents.get(agent_id) if agent_id else None
+    if agent is not None and agent.status != "offline":
+        agent.status = "offline"
+        publish_update(agent, agent.status_data, status_changed=True)
+
+@app.get("/api/agents")
+async def list_agents():
+    """List all connected agents."""
+    return [agent_info(agent) for agent in connected_agents.values()]
+
+@app.get("/api/agents/{agent_id}")
+async def get_agent(agent_id: str):
+    """One agent, e.g. for another agent resolving where to send a file."""
+    if agent_id not in connected_agents:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    return agent_info(connected_agents[agent_id])
+
+async def receive_message(websocket: WebSocket) -> dict:
+    """Receive one agent message, JSON text frame or MessagePack binary frame."""
+    frame = await websocket.receive()
+    if frame["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(frame.get("code", 1000))
+    return decode_message(frame["bytes"] if frame.get("bytes") is not None else frame["text"])
+
+@app.get("/api/agents/{agent_id}/samples")
+async def list_agent_samples(agent_id: str, since: float = 0):
+    """All samples received from an agent since a unix timestamp."""
+    if agent_id not in connected_agents:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    return {
+        "agent_id": agent_id,
+        "samples": [
+            {"timestamp": timestamp, "metrics": metrics}
+            for timestamp, metrics in connected_agents[agent_id].samples
+            if timestamp >= since
+        ]
+    }
+
+@app.get("/api/dashboard-clients")
+async def list_dashboard_clients():
+    """Dashboard stream clients with their queue depth and dropped/coalesced message counts."""
+    return manager.stats()
+
+@app.get("/api/metrics")
+async def list_metrics():
+    """Metric names with stored history, and the size of each resolution."""
+    return {
+        "metrics": tsdb.metrics,
+        "series": tsdb.series,
+        "storage": {name: {**store.stats(), "retention_seconds": TSDB_RETENTION[name]} for name, store in tsdb_stores()}
+    }
+
+def select_series(patterns: Optional[List[str]]) -> Optional[List[str]]:
+    """Agent ids given outright or matching shell-style patterns (`build-*`); None selects all."""
+    if patterns is None:
+        return None
+    names = set()
+    for pattern in patterns:
+        if any(char in pattern for char in "*?["):
+            names.update(name for name in tsdb.series if fnmatch.fnmatchcase(name, pattern))
+        else:
+            names.add(pattern)
+    return sorted(names)
+
+def history_range(start: Optional[float], end: Optional[float], resolution: Optional[str], max_points: float):
+    """Fill in the default range (the last hour) and resolution of a history query."""
+    if resolution is not None and resolution not in TSDB_RETENTION:
+        raise HTTPException(status_code=400, detail=f"resolution must be one of {', '.join(TSDB_RETENTION)}")
+    now = time.time()
+    end = end if end is not None else now
+    start = start if start is not None else end - 3600
+    resolution = resolution or choose_resolution(start, end, now, RAW_SAMPLE_INTERVAL, rollups.tiers,
+                                                 TSDB_RETENTION, max_points)
+    return start, end, resolution
+
+def group_by_series(sids: np.ndarray):
+    """(series id, first, last) row ranges of rows sorted by series id."""
+    unique, firsts = np.unique(sids, return_index=True)
+    return zip(unique.tolist(), firsts.tolist(), firsts[1:].tolist() + [len(sids)])
+
+@app.get("/api/series")
+async def get_series(
+    metric: str,
+    agent_id: Optional[List[str]] = Query(None),
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    resolution: Optional[str] = None,
+    max_points: int = Query(1500, ge=1)
+):
+    """Stored history of one metric between two unix timestamps (default: the last hour).
+
+    Repeat `agent_id` to select agents, by id or shell-style pattern
+    (`build-*`); all agents by default. Unless a
+    `resolution` (raw, 1m, 5m, 1h) is given, the finest one that keeps
+    each agent under `max_points` points and still covers `start` is
+    used, so a 30-day chart reads the hourly rollups. Raw values come back
+    per agent as `timestamps` and `values`; rollups as `timestamps` (bucket
+    starts) with `min`, `max`, `avg` and `count`.
+    """
+    if metric not in tsdb.metrics:
+        raise HTTPException(status_code=404, detail="Metric not found")
+    start, end, resolution = history_range(start, end, resolution, max_points)
+    agent_id = select_series(agent_id)
+    series = {}
+    if resolution == "raw":
+        ts, sids, values = tsdb.query(metric, start, end, series=agent_id)
+        # Group rows by agent with one sort rather than a mask per agent
+        order = np.argsort(sids, kind="stable")
+        ts, sids, values = ts[order], sids[order], values[order]
+        for sid, first, last in group_by_series(sids):
+            series[tsdb.series[sid]] = {"timestamps": ts[first:last].tolist(), "values": values[first:last].tolist()}
+    else:
+        tier = rollups.get(resolution)
+        ts, sids, (mins, maxs, sums, counts) = tier.query(metric, start, end, series=agent_id)
+        for sid, first, last in group_by_series(sids):
+            series[tier.store.series[sid]] = {
+                "timestamps": ts[first:last].tolist(),
+                "min": mins[first:last].tolist(),
+                "max": maxs[first:last].tolist(),
+                "avg": (sums[first:last] / counts[first:last]).tolist(),
+                "count": counts[first:last].astype(int).tolist(),
+            }
+    return {"metric": metric, "start": start, "end": end, "resolution": resolution, "series": series}
+
+# Time windows one aggregate query may return
+MAX_AGGREGATE_STEPS = 10_000
+
+def json_number(stat: str, value: float):
+    if not math.isfinite(value):
+        return None
+    return int(value) if stat == "count" else float(value)
+
+def summarize_rows(stats: List[str], ts: np.ndarray, sids: np.ndarray, columns: tuple, names: List[str],
+                   start: float, end: float, step: Optional[float], top: Optional[int], rank: str,
+                   largest: bool) -> dict:
+    """The /api/aggregate result for the selected rows; blocking, run it in an executor."""
+    computed = stats if rank in stats else stats + [rank]
+    fleet = aggregate(stats, None, 1, *columns)
+    result = {
+        "rows": len(ts),
+        "agents": int(np.count_nonzero(np.bincount(sids, minlength=len(names)))),
+        "stats": {stat: json_number(stat, fleet[stat][0]) for stat in stats},
+    }
+    if step is not None:
+        windows = ((ts - start) // step).astype(np.intp)
+        per_window = aggregate(stats, windows, math.ceil((end - start) / step), *columns)
+        present = per_window["count"] > 0
+        result["series"] = {"timestamps": (start + np.flatnonzero(present) * step).tolist()}
+        for stat in stats:
+            result["series"][stat] = [json_number(stat, value) for value in per_window[stat][present].tolist()]
+    if top is not None:
+        per_agent = aggregate(computed, sids, len(names), *columns)
+        present = np.flatnonzero(per_agent["count"] > 0)
+        best = present[top_k(per_agent[rank][present], top, largest)]
+        result["top"] = [
+            {"agent_id": names[sid], **{stat: json_number(stat, per_agent[stat][sid]) for stat in computed}}
+            for sid in best.tolist()
+        ]
+    return result
+
+@app.get("/api/aggregate")
+async def aggregate_metric(
+    metric: str,
+    agent_id: Optional[List[str]] = Query(None),
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    stats: str = "avg,min,max",
+    step: Optional[float] = Query(None, gt=0),
+    top: Optional[int] = Query(None, ge=1),
+    rank: Optional[str] = None,
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    resolution: Optional[str] = None
+):
+    """Statistics of one metric across agents over a time range (default: the last hour).
+
+    `stats` lists avg, min, max, sum, count and percentiles such as p95,
+    computed over every selected sample with array operations. `step`
+    (seconds) adds them per time window under `series`; `top` adds the k
+    agents with the highest `rank` statistic (default the first of
+    `stats`; `order=asc` for the lowest). Agents are chosen as for
+    /api/series. Unless a `resolution` is given, the finest one that still
+    covers `start` is used (raw samples within their retention), since the
+    result is a handful of numbers rather than a chart. From rollups,
+    avg/min/max/sum/count are exact and percentiles are of per-bucket
+    averages.
+    """
+    if metric not in tsdb.metrics:
+        raise HTTPException(status_code=404, detail="Metric not found")
+    try:
+        stats = parse_stats(stats)
+        rank = parse_stats(rank)[0] if rank else stats[0]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # No point budget: the finest data that reaches back to start
+    start, end, resolution = history_range(start, end, resolution, math.inf)
+    if step is not None and (end - start) / step > MAX_AGGREGATE_STEPS:
+        raise HTTPException(status_code=400, detail=f"step gives more than {MAX_AGGREGATE_STEPS} windows")
+    agent_id = select_series(agent_id)
+    if resolution == "raw":
+        ts, sids, values = tsdb.query_columns(metric, start, end, agent_id, ordered=False)
+        columns = (values[0], values[0], values[0], None)
+        names = list(tsdb.series)
+    else:
+        tier = rollups.get(resolution)
+        # Whole buckets, so windows (and the reported start) begin at the first bucket
+        start -= start % tier.width
+        ts, sids, values = tier.rows(metric, start, end, agent_id)
+        columns = tuple(values)
+        names = list(tier.store.series)
+    # The rows are copies or views of mapped segments, safe to reduce off the event loop
+    result = await asyncio.get_running_loop().run_in_executor(
+        None, summarize_rows, stats, ts, sids, columns, names, start, end, step, top, rank, order == "desc"
+    )
+    return {"metric": metric, "start": start, "end": end, "resolution": resolution, **result}
 
 @app.websocket("/ws/register")
 async def websocket_endpoint(websocket: WebSocket):
@@ -98,39 +415,103 @@ async def websocket_endpoint(websocket: WebSocket):
             agent_id = message.get("agent_id")
             hostname = message.get("hostname", "unknown")
             ip = message.get("ip", "unknown")
+            port = message.get("port", 3000)
             
             # Register the agent
             if agent_id not in connected_agents:
-                connected_agents[agent_id] = Agent(agent_id, hostname, ip)
+                connected_agents[agent_id] = Agent(agent_id, hostname, ip, port)
             
             agent = connected_agents[agent_id]
+            # The agent may come back with a new address
+            agent.hostname, agent.ip, agent.port = hostname, ip, port
             agent.websocket = websocket
+            # The agent starts every connection with a keyframe
+            agent.delta_decoder = DeltaDecoder()
             agent.status = "online"
             agent.last_seen = datetime.utcnow()
             
-            print(f"Agent {agent_id} connected from {hostname} ({ip})")
+            # Tell the agent which wire encoding to use for its updates
+            encoding = negotiate_encoding(message.get("encodings", []))
+            await websocket.send_text(json.dumps({"type": "registered", "encoding": encoding, "batching": True,
+                                                   "deltas": True}))
+            
+            print(f"Agent {agent_id} connected from {hostname} ({ip}) using {encoding}")
+            publish_agent(agent)
             
             try:
                 while True:
                     # Wait for status updates
-                    data = await websocket.receive_text()
-                    message = json.loads(data)
+                    message = await receive_message(websocket)
                     
                     if message.get("type") == "status_update":
                         agent.last_seen = datetime.utcnow()
-                        agent.status_data = message.get("data", {})
-                        print(f"Status update from {agent_id}")
+                        # A batch carries several samples, a plain update is a batch of one
+                        updates = message["batch"] if "batch" in message else [message]
+                        # Deltas are applied to the stored status in place, so keep a
+                        # copy to diff against (only needed when dashboards listen)
+                        previous = copy.deepcopy(agent.status_data) if manager.active_connections else {}
+                        resync = False
+                        for update in updates:
+                            status_data = agent.delta_decoder.decode(update)
+                            if status_data is None:
+                                resync = True
+                                continue
+                            agent.status_data = status_data
+                            timestamp, metrics = agent.record_sample(status_data)
+                            tsdb.append(agent_id, timestamp, metrics)
+                            rollups.add(agent_id, timestamp, metrics)
+                        if tsdb.buffered >= TSDB_FLUSH_ROWS:
+                            tsdb_flush_requested.set()
+                        publish_update(agent, previous)
+                        if resync:
+                            # Missed a delta, ask the agent for a full snapshot
+                            await websocket.send_text(json.dumps({"type": "resync"}))
+                        print(f"Status update from {agent_id} ({len(updates)} samples)")
                         
             except WebSocketDisconnect:
                 print(f"Agent {agent_id} disconnected")
-                if agent_id and agent_id in connected_agents:
-                    connected_agents[agent_id].status = "offline"
+                mark_offline(agent_id)
                 
     except Exception as e:
         print(f"WebSocket error: {e}")
     finally:
-        if agent_id and agent_id in connected_agents:
-            connected_agents[agent_id].status = "offline"
+        mark_offline(agent_id)
+
+@app.websocket("/ws/dashboard")
+async def dashboard_endpoint(
+    websocket: WebSocket,
+    agent_id: Optional[List[str]] = Query(None),
+    metric: Optional[List[str]] = Query(None)
+):
+    """Push the fleet to a dashboard instead of it polling /api/agents.
+
+    The client gets a `snapshot` of every agent (as /api/agents lists
+    them), then an `update` with the status fields that changed each time
+    an agent reports, an `agent` when one (re)registers and an `update`
+    when one goes offline. Repeat `agent_id` and `metric` (top-level
+    status fields such as cpu_percent or drives) to narrow the stream, or
+    send {"type": "subscribe", "agent_ids": [...], "metrics": [...]}
+    (null for all) at any time for a new snapshot under a new filter.
+    """
+    client_id = str(uuid.uuid4())
+    # The snapshot is queued first and built when sent, so updates queued meanwhile follow it
+    await manager.connect(websocket, client_id, Subscription(agent_id, metric), resync=snapshot_message)
+    try:
+        while True:
+            message = json.loads(await websocket.receive_text())
+            if message.get("type") == "subscribe":
+                try:
+                    subscription = Subscription.from_message(message)
+                except ValueError as e:
+                    await manager.send_personal_message(json.dumps({"type": "error", "detail": str(e)}), client_id)
+                    continue
+                manager.subscribe(client_id, subscription)
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"Dashboard WebSocket error: {e}")
+    finally:
+        manager.disconnect(client_id)
 
 @app.on_event("startup")
 async def startup_event():
@@ -145,10 +526,20 @@ async def startup_event():
                 if (current_time - agent.last_seen).total_seconds() > 120  # 2 minutes
             ]
             for agent_id in disconnected_agents:
-                connected_agents[agent_id].status = "offline"
+                mark_offline(agent_id)
                 manager.disconnect(agent_id)
     
     asyncio.create_task(cleanup_disconnected_agents())
+    asyncio.create_task(tsdb_flusher())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Seal whatever is still buffered so a clean stop loses no history."""
+    rollups.close_all()
+    # Waits for a flush the flusher task may have in progress
+    await flush_tsdb()
+    for _, store in tsdb_stores():
+        store.close()
 
 if __name__ == "__main__":
     import uvicorn
@@ -165,4 +556,7 @@ if __name__ == "__main__":
     print(f"  - Network: http://{best_ip}:8080")
     print(f"  - API: http://{best_ip}:8080/api/agents")
     
-    uvicorn.run(app, host="0.0.0.0", port=8080)
+    # Per-message deflate compresses every frame once per connection, which
+    # costs more than the rest of a dashboard broadcast put together
+    uvicorn.run(app, host="0.0.0.0", port=8080,
+                ws_per_message_deflate=os.getenv("WS_PER_MESSAGE_DEFLATE", "false").lower() == "true")
@@ -0,0 +1,161 @@
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from tsdb import SID_DTYPE, TS_DTYPE, VALUE_DTYPE, TimeSeriesStore, empty_rows
+
+# Name and bucket width (seconds) of each rollup tier, finest first
+TIERS = (("1m", 60), ("5m", 300), ("1h", 3600))
+
+MIN, MAX, SUM, COUNT = range(4)
+
+
+class Rollup:
+    """One tier of min/max/sum/count buckets, kept up to date as samples arrive.
+
+    Each (series, metric) has one open bucket in memory. A sample for a
+    later bucket writes the open one to the tier's store and starts a new
+    one, so the tier costs a few dict operations per value and no reads.
+    A late sample for an already closed bucket is stored as a partial
+    bucket of its own; queries merge rows that share a bucket.
+    """
+
+    def __init__(self, name: str, width: float, store: TimeSeriesStore):
+        self.name = name
+        self.width = width
+        self.store = store
+        # series -> metric -> [bucket start, min, max, sum, count]
+        self._open: Dict[str, Dict[str, list]] = {}
+
+    def add(self, series: str, timestamp: float, metrics: Dict[str, float]):
+        bucket = timestamp - timestamp % self.width
+        entries = self._open.get(series)
+        if entries is None:
+            entries = self._open[series] = {}
+        closed = {}
+        for name, value in metrics.items():
+            entry = entries.get(name)
+            if entry is not None and entry[0] == bucket:
+                if value < entry[1]:
+                    entry[1] = value
+                if value > entry[2]:
+                    entry[2] = value
+                entry[3] += value
+                entry[4] += 1
+            elif entry is None or bucket > entry[0]:
+                if entry is not None:
+                    closed[name] = entry
+                entries[name] = [bucket, value, value, value, 1]
+            else:
+                self.store.append(series, bucket, {name: (value, value, value, 1)})
+        for name, entry in closed.items():
+            self.store.append(series, entry[0], {name: entry[1:]})
+
+    def close_before(self, timestamp: float):
+        """Write out open buckets that ended before timestamp, e.g. of agents that went quiet."""
+        for series, entries in self._open.items():
+            done = [name for name, entry in entries.items() if entry[0] + self.width <= timestamp]
+            for name in done:
+                entry = entries.pop(name)
+                self.store.append(series, entry[0], {name: entry[1:]})
+
+    def close_all(self):
+        self.close_before(float("inf"))
+
+    def open_rows(self, metric: str, start: float, end: float,
+                  series: Optional[Iterable[str]] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Open buckets of a metric in range, as rows like the store's."""
+        names = self._open.keys() if series is None else [name for name in series if name in self._open]
+        rows = [(self.store.series_id(name), self._open[name][metric]) for name in names
+                if metric in self._open[name] and start <= self._open[name][metric][0] < end]
+        if not rows:
+            return empty_rows(4)
+        return (np.array([entry[0] for _, entry in rows], TS_DTYPE),
+                np.array([sid for sid, _ in rows], SID_DTYPE),
+                np.array([entry[1:] for _, entry in rows], VALUE_DTYPE).T)
+
+    def rows(self, metric: str, start: float, end: float,
+             series: Optional[Iterable[str]] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Stored and open buckets of a metric starting in [start, end), unordered.
+
+        A bucket may come back in several partial rows; their min, max, sum
+        and count still combine to the bucket's, so reductions can skip
+        merging them.
+        """
+        series = list(series) if series is not None else None
+        start -= start % self.width
+        stored = self.store.query_columns(metric, start, end, series, ordered=False)
+        pending = self.open_rows(metric, start, end, series)
+        ts = np.concatenate([stored[0], pending[0]])
+        sids = np.concatenate([stored[1], pending[1]])
+        values = np.concatenate([stored[2], pending[2]], axis=1)
+        return ts, sids, values
+
+    def query(self, metric: str, start: float, end: float,
+              series: Optional[Iterable[str]] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Buckets of a metric starting in [start, end), one row per (series, bucket).
+
+        Rows are sorted by series id, then bucket; values are (4, rows):
+        min, max, sum, count.
+        """
+        return merge_buckets(*self.rows(metric, start, end, series))
+
+
+def merge_buckets(ts: np.ndarray, sids: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Combine rows for the same (series, bucket) into one, sorted by series then bucket."""
+    if not len(ts):
+        return ts, sids, values
+    order = np.lexsort((ts, sids))
+    ts, sids, values = ts[order], sids[order], values[:, order]
+    first = np.empty(len(ts), bool)
+    first[0] = True
+    first[1:] = (ts[1:] != ts[:-1]) | (sids[1:] != sids[:-1])
+    if first.all():
+        return ts, sids, values
+    starts = np.flatnonzero(first)
+    merged = np.stack([
+        np.minimum.reduceat(values[MIN], starts),
+        np.maximum.reduceat(values[MAX], starts),
+        np.add.reduceat(values[SUM], starts),
+        np.add.reduceat(values[COUNT], starts),
+    ])
+    return ts[starts], sids[starts], merged
+
+
+class Rollups:
+    """The rollup tiers of a metric store, each in its own TimeSeriesStore under directory/<tier>."""
+
+    def __init__(self, directory: Path, tiers=TIERS, **store_options):
+        self.tiers: List[Rollup] = [
+            Rollup(name, width, TimeSeriesStore(directory / name, value_columns=4, **store_options))
+            for name, width in tiers
+        ]
+
+    def add(self, series: str, timestamp: float, metrics: Dict[str, float]):
+        for tier in self.tiers:
+            tier.add(series, timestamp, metrics)
+
+    def get(self, name: str) -> Optional[Rollup]:
+        return next((tier for tier in self.tiers if tier.name == name), None)
+
+    def close_before(self, timestamp: float):
+        for tier in self.tiers:
+            tier.close_before(timestamp)
+
+    def close_all(self):
+        for tier in self.tiers:
+            tier.close_all()
+
+
+def choose_resolution(start: float, end: float, now: float, raw_interval: float, tiers: List[Rollup],
+                      retention: Dict[str, float], max_points: int) -> str:
+    """Finest resolution that keeps a series under max_points and still holds data back to start.
+
+    Falls back to the coarsest tier for ranges that fit nowhere.
+    """
+    candidates = [("raw", raw_interval)] + [(tier.name, tier.width) for tier in tiers]
+    for name, width in candidates:
+        if (end - start) / width <= max_points and start >= now - retention.get(name, float("inf")):
+            return name
+    return candidates[-1][0]
@@ -0,0 +1,441 @@
+import json
+import math
+import mmap
+import os
+import struct
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+MAGIC = b"SMTSEG01"
+# magic, row count, min timestamp, max timestamp, value columns (0 meaning 1), padded to 64 bytes
+HEADER = struct.Struct("<8sQddI28x")
+
+TS_DTYPE = np.dtype("<f8")
+SID_DTYPE = np.dtype("<u4")
+VALUE_DTYPE = np.dtype("<f8")
+
+
+def _align8(n: int) -> int:
+    return n + -n % 8
+
+
+def write_json_atomic(path: Path, data):
+    """Replace a small JSON file so that a crash leaves either the old or the new content."""
+    temp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(temp_path, "w") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def fsync_dir(path: Path):
+    """Make a rename in a directory durable; not possible (nor needed) on Windows."""
+    if os.name == "nt":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Segment:
+    """An immutable, sealed run of (timestamp, series id, value...) rows for one metric.
+
+    Stored as one file: a 64-byte header followed by the timestamp, series
+    id and value columns, each contiguous and sorted by timestamp. Values
+    are a (columns, count) float64 block, one column for raw samples. Columns are memory-mapped on
+    first use, so a range query touches only the pages it reads. Files are
+    named after the range of flush sequence numbers they hold,
+    `<first>-<last>.seg`; a merged segment covers the ones it replaced.
+    """
+
+    def __init__(self, path: Path, count: int, min_ts: float, max_ts: float, value_columns: int = 1):
+        self.path = path
+        self.first_seq, self.last_seq = (int(part) for part in path.stem.split("-"))
+        self.count = count
+        self.min_ts = min_ts
+        self.max_ts = max_ts
+        self.value_columns = value_columns
+        self._map: Optional[mmap.mmap] = None
+        self._columns: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+
+    @staticmethod
+    def layout(count: int, value_columns: int = 1) -> Tuple[int, int, int, int]:
+        """Offsets of the timestamp, series id and value columns, and the file size."""
+        ts_offset = HEADER.size
+        sid_offset = ts_offset + count * TS_DTYPE.itemsize
+        value_offset = _align8(sid_offset + count * SID_DTYPE.itemsize)
+        return ts_offset, sid_offset, value_offset, value_offset + value_columns * count * VALUE_DTYPE.itemsize
+
+    @property
+    def nbytes(self) -> int:
+        return self.layout(self.count, self.value_columns)[3]
+
+    @classmethod
+    def open(cls, path: Path) -> "Segment":
+        with open(path, "rb") as f:
+            magic, count, min_ts, max_ts, value_columns = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a segment")
+            size = os.fstat(f.fileno()).st_size
+        value_columns = value_columns or 1
+        if size != cls.layout(count, value_columns)[3]:
+            raise ValueError(f"{path} is truncated")
+        return cls(path, count, min_ts, max_ts, value_columns)
+
+    @classmethod
+    def write(cls, path: Path, ts: np.ndarray, sids: np.ndarray, values: np.ndarray) -> "Segment":
+        """Seal rows sorted by timestamp: write to a temp file, fsync, then rename into place.
+
+        values is (columns, count), or 1-D for a single column.
+        """
+        count = len(ts)
+        values = np.atleast_2d(values)
+        ts_offset, sid_offset, value_offset, size = cls.layout(count, len(values))
+        temp_path = path.with_suffix(".tmp")
+        with open(temp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, count, float(ts[0]), float(ts[-1]), len(values)))
+            f.write(ts.astype(TS_DTYPE, copy=False).tobytes())
+            f.write(sids.astype(SID_DTYPE, copy=False).tobytes())
+            f.write(bytes(value_offset - sid_offset - count * SID_DTYPE.itemsize))
+            f.write(np.ascontiguousarray(values, VALUE_DTYPE).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+        return cls(path, count, float(ts[0]), float(ts[-1]), len(values))
+
+    def columns(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if self._columns is None:
+            with open(self.path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            ts_offset, sid_offset, value_offset, _ = self.layout(self.count, self.value_columns)
+            self._columns = (
+                np.frombuffer(self._map, TS_DTYPE, self.count, ts_offset),
+                np.frombuffer(self._map, SID_DTYPE, self.count, sid_offset),
+                np.frombuffer(self._map, VALUE_DTYPE, self.value_columns * self.count,
+                              value_offset).reshape(self.value_columns, self.count),
+            )
+        return self._columns
+
+    def range(self, start: float, end: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Views of the rows with start <= timestamp < end."""
+        ts, sids, values = self.columns()
+        low, high = np.searchsorted(ts, [start, end], side="left")
+        return ts[low:high], sids[low:high], values[:, low:high]
+
+    def close(self):
+        # Views handed out keep the map alive; let the GC unmap it once they are gone
+        self._columns = None
+        self._map = None
+
+
+def empty_rows(value_columns: int = 1) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    return np.empty(0, TS_DTYPE), np.empty(0, SID_DTYPE), np.empty((value_columns, 0), VALUE_DTYPE)
+
+
+class WriteBuffer:
+    """Rows of one metric not yet sealed into a segment, in compact arrays."""
+
+    def __init__(self, value_columns: int = 1):
+        self.ts = array("d")
+        self.sids = array("I")
+        self.values = [array("d") for _ in range(value_columns)]
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def append(self, timestamp: float, sid: int, value: Union[float, Sequence[float]]):
+        self.ts.append(timestamp)
+        self.sids.append(sid)
+        if len(self.values) == 1:
+            self.values[0].append(value)
+        else:
+            for column, item in zip(self.values, value):
+                column.append(item)
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Rows sorted by timestamp (agents' batches can arrive out of order)."""
+        if not len(self.ts):
+            return empty_rows(len(self.values))
+        order = np.argsort(np.frombuffer(self.ts, TS_DTYPE), kind="stable")
+        return (np.frombuffer(self.ts, TS_DTYPE)[order],
+                np.frombuffer(self.sids, np.uint32)[order],
+                np.stack([np.frombuffer(column, VALUE_DTYPE)[order] for column in self.values]))
+
+    def range(self, start: float, end: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        ts, sids, values = self.arrays()
+        mask = (ts >= start) & (ts < end)
+        return ts[mask], sids[mask], values[:, mask]
+
+
+class TimeSeriesStore:
+    """Append-only metric history on disk, one directory of columnar segments per metric.
+
+    Rows are (timestamp, series id, value), a series being one agent; a
+    store created with value_columns > 1 keeps several values per row
+    (the rollup tiers keep min, max, sum and count).
+    Appends go to an in-memory write buffer per metric; flush() seals each
+    non-empty buffer into a new segment (temp file, fsync, rename), so a
+    crash loses at most the rows buffered since the last flush and never
+    leaves a partial segment behind. Series and metric names are mapped to
+    small integer ids kept in series.json and metrics.json.
+
+    Not thread-safe: append and query from the event loop, and run the
+    blocking part of a flush (seal_buffers) in an executor between
+    take_buffers() and add_segments().
+    """
+
+    def __init__(self, directory: Path, value_columns: int = 1, compact_rows: int = 1_000_000,
+                 merge_factor: int = 8):
+        self.directory = directory
+        self.value_columns = value_columns
+        # Segments are merged up to compact_rows rows, merge_factor similar-sized ones at a time
+        self.compact_rows = compact_rows
+        self.merge_factor = merge_factor
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.series: List[str] = self._load_names("series.json")
+        self.metrics: List[str] = self._load_names("metrics.json")
+        self._series_ids = {name: sid for sid, name in enumerate(self.series)}
+        self._metric_ids = {name: mid for mid, name in enumerate(self.metrics)}
+        self.segments: Dict[int, List[Segment]] = {}
+        self._next_seq: Dict[int, int] = {}
+        self._buffers: Dict[int, WriteBuffer] = {}
+        # Buffers taken by a flush that is still writing them
+        self._sealing: Dict[int, WriteBuffer] = {}
+        self.buffered = 0
+        for mid in range(len(self.metrics)):
+            self._load_segments(mid)
+
+    def _load_names(self, filename: str) -> List[str]:
+        path = self.directory / filename
+        return json.loads(path.read_text()) if path.exists() else []
+
+    def metric_dir(self, mid: int) -> Path:
+        return self.directory / f"{mid:05d}"
+
+    def _load_segments(self, mid: int):
+        directory = self.metric_dir(mid)
+        directory.mkdir(exist_ok=True)
+        segments = []
+        for path in directory.iterdir():
+            if path.suffix == ".tmp":
+                # A flush or merge interrupted before its rename
+                path.unlink()
+                continue
+            if path.suffix != ".seg":
+                continue
+            try:
+                segments.append(Segment.open(path))
+            except ValueError as e:
+                print(f"Skipping segment: {e}")
+        # Widest first, so segments a merge replaced (left over by a crash
+        # before they were deleted) are found inside an earlier range
+        segments.sort(key=lambda s: (s.first_seq, -s.last_seq))
+        live = []
+        for segment in segments:
+            if live and segment.last_seq <= live[-1].last_seq:
+                os.unlink(segment.path)
+                continue
+            live.append(segment)
+        self._next_seq[mid] = live[-1].last_seq + 1 if live else 0
+        live.sort(key=lambda s: s.min_ts)
+        self.segments[mid] = live
+
+    def series_id(self, name: str) -> int:
+        sid = self._series_ids.get(name)
+        if sid is None:
+            sid = len(self.series)
+            self.series.append(name)
+            self._series_ids[name] = sid
+            write_json_atomic(self.directory / "series.json", self.series)
+        return sid
+
+    def metric_id(self, name: str) -> int:
+        mid = self._metric_ids.get(name)
+        if mid is None:
+            mid = len(self.metrics)
+            self.metrics.append(name)
+            self._metric_ids[name] = mid
+            self.segments[mid] = []
+            self._next_seq[mid] = 0
+            self.metric_dir(mid).mkdir(exist_ok=True)
+            write_json_atomic(self.directory / "metrics.json", self.metrics)
+        return mid
+
+    def append(self, series: str, timestamp: float, metrics: Dict[str, Union[float, Sequence[float]]]):
+        """Buffer one sample's metrics for a series."""
+        sid = self._series_ids.get(series)
+        if sid is None:
+            sid = self.series_id(series)
+        for name, value in metrics.items():
+            mid = self._metric_ids.get(name)
+            if mid is None:
+                mid = self.metric_id(name)
+            buffer = self._buffers.get(mid)
+            if buffer is None:
+                buffer = self._buffers[mid] = WriteBuffer(self.value_columns)
+            buffer.append(timestamp, sid, value)
+        self.buffered += len(metrics)
+
+    def take_buffers(self) -> Dict[int, WriteBuffer]:
+        """Swap out the write buffers for sealing; they stay visible to queries until sealed."""
+        taken = {mid: buffer for mid, buffer in self._buffers.items() if len(buffer)}
+        self._sealing.update(taken)
+        self._buffers = {}
+        self.buffered = 0
+        return taken
+
+    def seal_buffers(self, buffers: Dict[int, WriteBuffer]) -> Dict[int, Segment]:
+        """Write each buffer as a new segment; blocking."""
+        sealed = {}
+        for mid, buffer in buffers.items():
+            seq = self._next_seq[mid]
+            self._next_seq[mid] = seq + 1
+            sealed[mid] = Segment.write(self.metric_dir(mid) / f"{seq:010d}-{seq:010d}.seg", *buffer.arrays())
+            fsync_dir(self.metric_dir(mid))
+        return sealed
+
+    def add_segments(self, sealed: Dict[int, Segment]):
+        for mid, segment in sealed.items():
+            segments = self.segments[mid]
+            segments.append(segment)
+            if len(segments) > 1 and segment.min_ts < segments[-2].min_ts:
+                segments.sort(key=lambda s: s.min_ts)
+            self._sealing.pop(mid, None)
+
+    def flush(self):
+        """Seal every buffered row, blocking; used at shutdown and by tools."""
+        self.add_segments(self.seal_buffers(self.take_buffers()))
+
+    def compaction_plan(self) -> List[Tuple[int, List[Segment]]]:
+        """Runs of segments to merge: merge_factor or more consecutive ones of the same size class.
+
+        Size classes are powers of merge_factor, so each row is rewritten
+        about log(compact_rows / flush size) times in all. Only runs that
+        are consecutive in sequence order are merged, which keeps every
+        segment's range covering exactly what it holds.
+        """
+        plans = []
+        for mid, segments in self.segments.items():
+            run: List[Segment] = []
+            run_class = None
+            for segment in sorted(segments, key=lambda s: s.first_seq) + [None]:
+                size_class = None
+                if segment is not None and segment.count < self.compact_rows:
+                    size_class = int(math.log(max(segment.count, 1), self.merge_factor))
+                if size_class is None or size_class != run_class or (
+                        run and sum(s.count for s in run) + segment.count > self.compact_rows):
+                    if len(run) >= self.merge_factor:
+                        plans.append((mid, run))
+                    run = []
+                if size_class is not None:
+                    run.append(segment)
+                run_class = size_class
+        return plans
+
+    def merge(self, mid: int, run: List[Segment]) -> Segment:
+        """Write the rows of a run of segments as one segment; blocking."""
+        columns = [s.columns() for s in run]
+        ts = np.concatenate([c[0] for c in columns])
+        sids = np.concatenate([c[1] for c in columns])
+        values = np.concatenate([c[2] for c in columns], axis=1)
+        order = np.argsort(ts, kind="stable")
+        path = self.metric_dir(mid) / f"{run[0].first_seq:010d}-{run[-1].last_seq:010d}.seg"
+        merged = Segment.write(path, ts[order], sids[order], values[:, order])
+        fsync_dir(self.metric_dir(mid))
+        return merged
+
+    def replace_segments(self, mid: int, old: List[Segment], new: Optional[Segment]):
+        """Swap merged (or expired) segments out and delete their files."""
+        gone = {id(segment) for segment in old}
+        segments = [segment for segment in self.segments[mid] if id(segment) not in gone]
+        if new is not None:
+            segments.append(new)
+            segments.sort(key=lambda s: s.min_ts)
+        self.segments[mid] = segments
+        for segment in old:
+            segment.close()
+            try:
+                os.unlink(segment.path)
+            except OSError:
+                # Still mapped on Windows; the next start drops it as covered
+                pass
+
+    def compact(self):
+        """Merge small segments, blocking; used by tools (the server runs the steps itself)."""
+        for mid, run in self.compaction_plan():
+            self.replace_segments(mid, run, self.merge(mid, run))
+
+    def expired(self, before: float) -> List[Tuple[int, List[Segment]]]:
+        """Segments holding nothing newer than `before`, per metric, for replace_segments(mid, old, None).
+
+        Retention works on whole segments, so rows up to a segment's span
+        older than `before` can outlive it until the segment's newest row
+        expires.
+        """
+        return [(mid, old) for mid, segments in self.segments.items()
+                for old in [[segment for segment in segments if segment.max_ts < before]] if old]
+
+    def query(self, metric: str, start: float = 0.0, end: float = float("inf"),
+              series: Optional[Iterable[str]] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Rows of a metric with start <= timestamp < end, sorted by timestamp.
+
+        Only segments overlapping the range are mapped and only their rows in
+        range are copied. `series` restricts the result to those names.
+        Values are 1-D, or (value_columns, rows) for a multi-column store.
+        """
+        ts, sids, values = self.query_columns(metric, start, end, series)
+        return ts, sids, values[0] if self.value_columns == 1 else values
+
+    def query_columns(self, metric: str, start: float = 0.0, end: float = float("inf"),
+                      series: Optional[Iterable[str]] = None,
+                      ordered: bool = True) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """query() with values always (value_columns, rows).
+
+        ordered=False skips sorting the rows by timestamp, for callers that
+        only reduce them.
+        """
+        mid = self._metric_ids.get(metric)
+        if mid is None:
+            return empty_rows(self.value_columns)
+        parts = [segment.range(start, end) for segment in self.segments[mid]
+                 if segment.max_ts >= start and segment.min_ts < end]
+        for pending in (self._sealing.get(mid), self._buffers.get(mid)):
+            if pending is not None and len(pending):
+                parts.append(pending.range(start, end))
+        if series is not None:
+            # Filter each part before concatenating, so one agent doesn't copy the fleet
+            wanted = np.array([self._series_ids[name] for name in series if name in self._series_ids], SID_DTYPE)
+            masks = [np.isin(sids, wanted) for _, sids, _ in parts]
+            parts = [(ts[mask], sids[mask], values[:, mask]) for (ts, sids, values), mask in zip(parts, masks)]
+        parts = [part for part in parts if len(part[0])]
+        if not parts:
+            return empty_rows(self.value_columns)
+        ts = np.concatenate([part[0] for part in parts])
+        sids = np.concatenate([part[1] for part in parts])
+        values = np.concatenate([part[2] for part in parts], axis=1)
+        if ordered and len(parts) > 1:
+            order = np.argsort(ts, kind="stable")
+            ts, sids, values = ts[order], sids[order], values[:, order]
+        return ts, sids, values
+
+    def stats(self) -> Dict[str, int]:
+        segments = [segment for segments in self.segments.values() for segment in segments]
+        return {
+            "series": len(self.series),
+            "metrics": len(self.metrics),
+            "segments": len(segments),
+            "rows": sum(segment.count for segment in segments),
+            "bytes": sum(segment.nbytes for segment in segments),
+            "buffered_rows": self.buffered + sum(len(buffer) for buffer in self._sealing.values()),
+        }
+
+    def close(self):
+        for segments in self.segments.values():
+            for segment in segments:
+                segment.close()
@@ -1,7 +1,47 @@
 import { useState, useEffect } from 'react';
 import Dashboard from './components/Dashboard';
 import Sidebar from './components/Sidebar';
-import { Agent } from './types';
+import { Agent, DashboardMessage } from './types';
+
+// Every status field Dashboard and its tabs read; the stream leaves out the rest
+// (network counters, collection timestamps), so add new fields here when a component uses them
+const DASHBOARD_METRICS = [
+  'cpu_percent',
+  'memory_percent',
+  'memory_used_mb',
+  'memory_total_mb',
+  'disk_percent',
+  'disk_used_gb',
+  'disk_total_gb',
+  'uptime_seconds',
+  'drives',
+  'temperatures',
+];
+
+function applyMessage(agents: Agent[], message: DashboardMessage): Agent[] {
+  switch (message.type) {
+    case 'snapshot':
+      return message.agents;
+    case 'agent':
+      return agents.some(agent => agent.agent_id === message.agent.agent_id)
+        ? agents.map(agent => agent.agent_id === message.agent.agent_id ? message.agent : agent)
+        : [...agents, message.agent];
+    case 'update':
+      return agents.map(agent => {
+        if (agent.agent_id !== message.agent_id) return agent;
+        const statusData: Record<string, unknown> = { ...agent.status_data, ...message.changes };
+        message.removed.forEach(key => delete statusData[key]);
+        return {
+          ...agent,
+          status: message.status,
+          last_seen: message.last_seen,
+          status_data: statusData as Agent['status_data'],
+        };
+      });
+    default:
+      return agents;
+  }
+}
 
 function App() {
   const [agents, setAgents] = useState<Agent[]>([]);
@@ -9,28 +49,44 @@ function App() {
   const [isLoading, setIsLoading] = useState(true);
 
   useEffect(() => {
-    const fetchAgents = async () => {
-      try {
-        setIsLoading(true);
-        const response = await fetch('/api/agents');
-        if (!response.ok) throw new Error('Failed to fetch agents');
-        const data = await response.json();
-        setAgents(data);
-        if (data.length > 0 && !selectedAgent) {
-          setSelectedAgent(data[0].agent_id);
+    // The central server sends a snapshot, then each agent's changes as they arrive
+    let socket: WebSocket | null = null;
+    let retry: ReturnType<typeof setTimeout> | undefined;
+    let delay = 1000;
+    let closed = false;
+
+    const connect = () => {
+      const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+      const params = DASHBOARD_METRICS.map(metric => `metric=${encodeURIComponent(metric)}`).join('&');
+      socket = new WebSocket(`${protocol}//${window.location.host}/ws/dashboard?${params}`);
+      socket.onmessage = (event) => {
+        const message: DashboardMessage = JSON.parse(event.data);
+        if (message.type === 'error') {
+          console.error('Dashboard stream error:', message.detail);
+          return;
         }
-      } catch (error) {
-        console.error('Error fetching agents:', error);
-      } finally {
-        setIsLoading(false);
-      }
+        if (message.type === 'snapshot') {
+          delay = 1000;
+          setIsLoading(false);
+          setSelectedAgent(current => current ?? message.agents[0]?.agent_id ?? null);
+        }
+        setAgents(current => applyMessage(current, message));
+      };
+      socket.onclose = () => {
+        if (closed) return;
+        // Reconnect with backoff; the next snapshot covers anything missed meanwhile
+        retry = setTimeout(connect, delay);
+        delay = Math.min(delay * 2, 30000);
+      };
     };
 
-    fetchAgents();
-    const interval = setInterval(fetchAgents, 30000); // Update every 30 seconds
-
-    return () => clearInterval(interval);
-  }, [selectedAgent]);
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(retry);
+      socket?.close();
+    };
+  }, []);
 
   return (
     <div className="flex h-screen bg-gray-900">
@@ -15,33 +15,61 @@ interface FileBrowserProps {
   agentIp: string;
 }
 
+const PAGE_SIZE = 500;
+
 const FileBrowser: React.FC<FileBrowserProps> = ({ agentId, agentIp }) => {
   const [currentPath, setCurrentPath] = useState('C:\\');
   const [files, setFiles] = useState<FileItem[]>([]);
+  const [total, setTotal] = useState(0);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [loading, setLoading] = useState(false);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState<string | null>(null);
 
+  const fetchPage = async (path: string, cursor: string | null) => {
+    const params = new URLSearchParams({ path, limit: String(PAGE_SIZE) });
+    if (cursor) params.set('cursor', cursor);
+    const response = await fetch(`http://${agentIp}:3000/api/files?${params}`);
+    if (!response.ok) {
+      throw new Error(`Failed to fetch files: ${response.statusText}`);
+    }
+    return response.json();
+  };
+
   const fetchFiles = async (path: string) => {
     setLoading(true);
     setError(null);
     
     try {
-      const response = await fetch(`http://${agentIp}:3000/api/files?path=${encodeURIComponent(path)}`);
-      if (!response.ok) {
-        throw new Error(`Failed to fetch files: ${response.statusText}`);
-      }
-      
-      const data = await response.json();
+      const data = await fetchPage(path, null);
       setFiles(data.items || []);
+      setTotal(data.total ?? (data.items || []).length);
+      setNextCursor(data.next_cursor ?? null);
       setCurrentPath(data.path || path);
     } catch (err) {
       setError(err instanceof Error ? err.message : 'Failed to load files');
       setFiles([]);
+      setNextCursor(null);
     } finally {
       setLoading(false);
     }
   };
 
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    
+    try {
+      const data = await fetchPage(currentPath, nextCursor);
+      setFiles(prev => [...prev, ...(data.items || [])]);
+      setNextCursor(data.next_cursor ?? null);
+    } catch (err) {
+      setError(err instanceof Error ? err.message : 'Failed to load files');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
     fetchFiles(currentPath);
   }, [agentId, agentIp]);
@@ -152,6 +180,15 @@ const FileBrowser: React.FC<FileBrowserProps> = ({ agentId, agentIp }) => {
                   </div>
                 </div>
               ))}
+              {nextCursor && (
+                <button
+                  onClick={loadMore}
+                  disabled={loadingMore}
+                  className="w-full mt-2 px-4 py-2 bg-gray-700 hover:bg-gray-600 text-white rounded transition-colors disabled:opacity-50"
+                >
+                  {loadingMore ? 'Loading...' : `Load more (${files.length} of ${total})`}
+                </button>
+              )}
             </div>
           )}
         </div>
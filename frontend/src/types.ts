@@ -16,6 +16,20 @@ export interface Agent {
   };
 }
 
+// Messages pushed by the central server's /ws/dashboard stream
+export type DashboardMessage =
+  | { type: 'snapshot'; agents: Agent[] }
+  | { type: 'agent'; agent: Agent }
+  | {
+      type: 'update';
+      agent_id: string;
+      status: Agent['status'];
+      last_seen: string;
+      changes: Partial<Agent['status_data']>;
+      removed: string[];
+    }
+  | { type: 'error'; detail: string };
+
 export interface SystemInfo {
   hostname: string;
   os: string;
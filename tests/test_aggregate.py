@@ -0,0 +1,22 @@
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+# main.py opens its metric store on import
+os.environ.setdefault("TSDB_DIR", tempfile.mkdtemp(prefix="tsdb-test-"))
+sys.path.append(str(Path(__file__).parent.parent / "central-server"))
+import main  # noqa: E402
+
+
+def test_default_resolution_reads_raw_samples():
+    now = time.time()
+    for i in range(100):
+        main.tsdb.append("aggregate-agent", now - 600 + i * 5, {"aggregate_test": float(i)})
+    with TestClient(main.app) as client:
+        result = client.get("/api/aggregate", params={"metric": "aggregate_test", "stats": "p95,max,count"}).json()
+    assert result["resolution"] == "raw"
+    assert result["stats"] == {"p95": 94.05, "max": 99.0, "count": 100}
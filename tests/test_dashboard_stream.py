@@ -0,0 +1,58 @@
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+# main.py opens its metric store on import
+os.environ.setdefault("TSDB_DIR", tempfile.mkdtemp(prefix="tsdb-test-"))
+sys.path.append(str(Path(__file__).parent.parent / "central-server"))
+import main  # noqa: E402
+
+
+def register(ws, agent_id: str):
+    ws.send_text(json.dumps({"type": "register", "agent_id": agent_id, "hostname": "host",
+                             "ip": "127.0.0.1", "encodings": ["json"]}))
+    assert ws.receive_json()["type"] == "registered"
+
+
+def send_batch(ws, agent_id: str, updates: list):
+    ws.send_text(json.dumps({"type": "status_update", "agent_id": agent_id, "batch": updates}))
+
+
+def test_delta_batch_reaches_dashboard():
+    with TestClient(main.app) as client:
+        with client.websocket_connect("/ws/register") as agent:
+            register(agent, "delta-agent")
+            with client.websocket_connect("/ws/dashboard?agent_id=delta-agent") as dashboard:
+                assert dashboard.receive_json()["type"] == "snapshot"
+
+                status = {"cpu_percent": 10.0, "memory_percent": 40.0,
+                          "drives": [{"mountpoint": "/", "percent_used": 50.0}], "collected_at": time.time()}
+                send_batch(agent, "delta-agent", [{"mode": "full", "seq": 1, "data": status}])
+                update = dashboard.receive_json()
+                assert update["type"] == "update"
+                assert update["changes"]["cpu_percent"] == 10.0
+
+                # Deltas change the stored status in place, nested fields included
+                send_batch(agent, "delta-agent", [{"mode": "delta", "seq": 2, "delta": {
+                    "set": [[["cpu_percent"], 55.0], [["drives", 0, "percent_used"], 51.0]], "unset": []}}])
+                update = dashboard.receive_json()
+                assert update["type"] == "update"
+                assert update["changes"] == {"cpu_percent": 55.0,
+                                             "drives": [{"mountpoint": "/", "percent_used": 51.0}]}
+                assert update["removed"] == []
+
+
+def test_metric_filter_limits_fields():
+    with TestClient(main.app) as client:
+        with client.websocket_connect("/ws/register") as agent:
+            register(agent, "filter-agent")
+            with client.websocket_connect("/ws/dashboard?agent_id=filter-agent&metric=memory_percent") as dashboard:
+                assert dashboard.receive_json()["type"] == "snapshot"
+                send_batch(agent, "filter-agent", [{"mode": "full", "seq": 1,
+                                                    "data": {"cpu_percent": 1.0, "memory_percent": 2.0}}])
+                assert dashboard.receive_json()["changes"] == {"memory_percent": 2.0}
@@ -0,0 +1,16 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "central-server"))
+from fanout import DROP_OLDEST, Connection, ConnectionManager  # noqa: E402
+
+
+def test_drop_oldest_keeps_resync():
+    manager = ConnectionManager(max_queue=3, policy=DROP_OLDEST)
+    connection = Connection(None, "client", resync=lambda subscription: "snapshot")
+    manager._enqueue(connection, connection.resync_message)
+    for message in ("one", "two", "three", "four"):
+        manager._enqueue(connection, message)
+
+    assert [m if isinstance(m, str) else m() for m in connection.queue] == ["snapshot", "three", "four"]
+    assert connection.dropped == manager.dropped == 2
@@ -0,0 +1,39 @@
+import io
+import os
+import sys
+import tarfile
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "agent"))
+from tar_stream import TarExtractor, iter_tar  # noqa: E402
+
+
+def test_hard_links_round_trip(tmp_path):
+    source = tmp_path / "src"
+    source.mkdir()
+    (source / "a").write_bytes(b"hello" * 1000)
+    os.link(source / "a", source / "b")
+
+    data = b"".join(iter_tar(str(source)))
+    assert all(not member.islnk() for member in tarfile.open(fileobj=io.BytesIO(data)))
+
+    result = TarExtractor(str(tmp_path / "out")).extract(io.BytesIO(data))
+    assert result["skipped"] == []
+    assert (tmp_path / "out" / "src" / "b").read_bytes() == b"hello" * 1000
+
+
+def test_hard_link_members_stay_inside(tmp_path):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w", format=tarfile.GNU_FORMAT) as archive:
+        original = tarfile.TarInfo("x/a")
+        original.size = 5
+        archive.addfile(original, io.BytesIO(b"hello"))
+        for name, target in (("x/b", "x/a"), ("x/evil", "../../etc/passwd")):
+            link = tarfile.TarInfo(name)
+            link.type = tarfile.LNKTYPE
+            link.linkname = target
+            archive.addfile(link)
+
+    result = TarExtractor(str(tmp_path / "out")).extract(io.BytesIO(buffer.getvalue()))
+    assert (tmp_path / "out" / "x" / "b").read_bytes() == b"hello"
+    assert result["skipped"] == [{"name": "x/evil", "reason": "link outside destination"}]
@@ -0,0 +1,137 @@
+import copy
+from typing import Any, Dict, List, Optional
+
+# Changes smaller than these (by leaf key name) are not worth sending. The
+# comparison is against the value the receiver already has, so skipped
+# changes never accumulate into drift.
+DEFAULT_DEADBANDS: Dict[str, float] = {
+    "cpu_percent": 0.5,
+    "memory_percent": 0.2,
+    "memory_used_mb": 16,
+    "disk_percent": 0.1,
+    "disk_used_gb": 0.05,
+    "used_gb": 0.05,
+    "free_gb": 0.05,
+    "percent_used": 0.1,
+    "current": 0.5,
+    "bytes_sent": 1024 * 1024,
+    "bytes_recv": 1024 * 1024,
+    "bytes_sent_per_sec": 1024,
+    "bytes_recv_per_sec": 1024,
+    "uptime_seconds": 60,
+}
+
+_MISSING = object()
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def diff_status(base: Any, current: Any, deadbands: Optional[Dict[str, float]] = None,
+                path: Optional[List[Any]] = None, changes: Optional[Dict[str, list]] = None) -> Dict[str, list]:
+    """Describe how to turn base into current.
+
+    Returns {"set": [[path, value], ...], "unset": [path, ...]} where a path is
+    a list of dict keys and list indexes. Dicts and equal-length lists are
+    diffed element by element, anything else is replaced whole.
+    """
+    deadbands = DEFAULT_DEADBANDS if deadbands is None else deadbands
+    path = [] if path is None else path
+    changes = {"set": [], "unset": []} if changes is None else changes
+
+    if isinstance(base, dict) and isinstance(current, dict):
+        for key, value in current.items():
+            old = base.get(key, _MISSING)
+            if old is _MISSING:
+                changes["set"].append([path + [key], value])
+            else:
+                diff_status(old, value, deadbands, path + [key], changes)
+        for key in base:
+            if key not in current:
+                changes["unset"].append(path + [key])
+    elif isinstance(base, list) and isinstance(current, list) and len(base) == len(current):
+        for index, (old, value) in enumerate(zip(base, current)):
+            diff_status(old, value, deadbands, path + [index], changes)
+    elif _is_number(base) and _is_number(current):
+        deadband = deadbands.get(path[-1], 0) if path and isinstance(path[-1], str) else 0
+        if abs(current - base) > deadband:
+            changes["set"].append([path, current])
+    elif base != current:
+        changes["set"].append([path, current])
+    return changes
+
+
+def apply_status_delta(target: Dict[str, Any], delta: Dict[str, list]) -> Dict[str, Any]:
+    """Apply a diff_status() result to target in place and return it."""
+    for path, value in delta.get("set", []):
+        if not path:
+            target = value
+            continue
+        parent = target
+        for key in path[:-1]:
+            parent = parent[key]
+        parent[path[-1]] = value
+    for path in delta.get("unset", []):
+        parent = target
+        for key in path[:-1]:
+            parent = parent[key]
+        parent.pop(path[-1], None)
+    return target
+
+
+class DeltaEncoder:
+    """Agent side: send a keyframe, then only what changed since.
+
+    A full snapshot goes out on the first update of a connection, every
+    keyframe_interval updates and whenever the receiver asks to resync.
+    """
+
+    def __init__(self, keyframe_interval: int = 10, deadbands: Optional[Dict[str, float]] = None):
+        self.keyframe_interval = keyframe_interval
+        self.deadbands = DEFAULT_DEADBANDS if deadbands is None else deadbands
+        self.seq = 0
+        self.sent: Optional[Dict[str, Any]] = None
+        self._since_keyframe = 0
+
+    def force_keyframe(self):
+        self.sent = None
+
+    def encode(self, status: Dict[str, Any]) -> Dict[str, Any]:
+        self.seq += 1
+        if self.sent is None or self._since_keyframe + 1 >= self.keyframe_interval:
+            self.sent = copy.deepcopy(status)
+            self._since_keyframe = 0
+            return {"mode": "full", "seq": self.seq, "data": status}
+
+        delta = diff_status(self.sent, status, self.deadbands)
+        # Track what the receiver will hold, not the raw sample
+        self.sent = apply_status_delta(self.sent, copy.deepcopy(delta))
+        self._since_keyframe += 1
+        return {"mode": "delta", "seq": self.seq, "delta": delta}
+
+
+class DeltaDecoder:
+    """Central side: rebuild the full status from keyframes and deltas."""
+
+    def __init__(self):
+        self.seq: Optional[int] = None
+        self.status: Optional[Dict[str, Any]] = None
+
+    def decode(self, message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Return the reconstructed status, or None if a resync is needed."""
+        mode = message.get("mode", "full")
+        seq = message.get("seq")
+        if mode == "full":
+            self.status = message.get("data", {})
+            self.seq = seq
+            return self.status
+
+        if self.status is None or seq is None or self.seq is None or seq != self.seq + 1:
+            # A delta was lost or arrived before any keyframe
+            self.status = None
+            self.seq = None
+            return None
+        self.status = apply_status_delta(self.status, message.get("delta", {}))
+        self.seq = seq
+        return self.status
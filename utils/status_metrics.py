@@ -0,0 +1,23 @@
+from typing import Any, Dict
+
+
+def extract_metrics(status: Dict[str, Any]) -> Dict[str, float]:
+    """Flatten the numeric values worth keeping history for out of a (partial) status dict.
+
+    Names are dotted paths, e.g. "cpu_percent", "network.bytes_recv_per_sec",
+    "temperatures.coretemp_Package id 0", "drives./home.percent_used".
+    """
+    metrics = {}
+    for key in ("cpu_percent", "memory_percent", "disk_percent"):
+        if status.get(key) is not None:
+            metrics[key] = status[key]
+    for key, value in (status.get("network") or {}).items():
+        if key.endswith("_per_sec") and value is not None:
+            metrics[f"network.{key}"] = value
+    for name, sensor in (status.get("temperatures") or {}).items():
+        if sensor.get("current") is not None:
+            metrics[f"temperatures.{name}"] = sensor["current"]
+    for drive in status.get("drives") or []:
+        if drive.get("percent_used") is not None:
+            metrics[f"drives.{drive['mountpoint']}.percent_used"] = drive["percent_used"]
+    return metrics
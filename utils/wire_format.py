@@ -0,0 +1,40 @@
+import json
+from typing import Any, Dict, List, Union
+
+try:
+    import msgpack
+except ImportError:  # Optional, JSON is always available
+    msgpack = None
+
+JSON = "json"
+MSGPACK = "msgpack"
+
+
+def supported_encodings() -> List[str]:
+    """Encodings this process can speak, most preferred first."""
+    return [MSGPACK, JSON] if msgpack is not None else [JSON]
+
+
+def negotiate_encoding(offered: List[str]) -> str:
+    """Pick the first encoding the peer offered that we support, JSON otherwise."""
+    supported = supported_encodings()
+    for encoding in offered or []:
+        if encoding in supported:
+            return encoding
+    return JSON
+
+
+def encode_message(message: Dict[str, Any], encoding: str = JSON) -> Union[str, bytes]:
+    """Serialize a message: JSON goes out as a text frame, MessagePack as a binary frame."""
+    if encoding == MSGPACK:
+        return msgpack.packb(message, use_bin_type=True)
+    return json.dumps(message)
+
+
+def decode_message(data: Union[str, bytes]) -> Dict[str, Any]:
+    """Deserialize a frame; binary frames are MessagePack, text frames are JSON."""
+    if isinstance(data, (bytes, bytearray)):
+        if msgpack is None:
+            raise ValueError("Received a binary frame but msgpack is not installed")
+        return msgpack.unpackb(data, raw=False)
+    return json.loads(data)